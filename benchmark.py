@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for Discord Tray Manager
+Measures monitor cycle cost on the simulated desktop and fails on regressions
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+from desktop_backend import SimulatedDesktop
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH = os.path.join(BASE_DIR, 'config.json')
+BASELINE_PATH = os.path.join(BASE_DIR, 'benchmark_baseline.json')
+
+def create_manager(backend):
+    """Create a DiscordTrayManager on the given backend with logging silenced"""
+    from discord_tray_manager import DiscordTrayManager
+    return DiscordTrayManager(CONFIG_PATH, backend)
+
+def time_cycles(manager, cycles, before_cycle=None, warmup=5):
+    """Seconds per run_cycle() call averaged over the best FULL_SCAN_INTERVAL period, excluding
+    before_cycle and warm-up.
+
+    Every period of FULL_SCAN_INTERVAL cycles holds one full registry rescan, so
+    it is part of the result; a best-of single cycle would always miss it.
+    """
+    from state_cache import FULL_SCAN_INTERVAL
+
+    periods = max(1, -(-cycles // FULL_SCAN_INTERVAL))
+    for _ in range(warmup):
+        if before_cycle:
+            before_cycle()
+        manager.run_cycle()
+    totals = []
+    for _ in range(periods):
+        total = 0.0
+        for _ in range(FULL_SCAN_INTERVAL):
+            if before_cycle:
+                before_cycle()
+            start = time.perf_counter()
+            manager.run_cycle()
+            total += time.perf_counter() - start
+        totals.append(total)
+    # The best period is the least disturbed by scheduler noise on sub-millisecond cycles
+    return min(totals) / FULL_SCAN_INTERVAL
+
+def cycle_scenario(processes=200, windows=300, registry_keys=100, fix=False, subscribers=0, monitors=1,
+                   startallback=False):
+    """Scenario timing a full cycle on a desktop of the given size, optionally with never-drained event subscribers"""
+    def run(cycles):
+        desktop = SimulatedDesktop.generate(processes, windows, registry_keys, promoted=not fix, monitors=monitors,
+                                            startallback=startallback)
+        manager = create_manager(desktop)
+        for i in range(subscribers):
+            manager.events.subscribe(f"stalled{i}", maxsize=16)
+        return time_cycles(manager, cycles, desktop.demote if fix else None)
+    return run
+
+def steady_state_scenario(windows=10000, periods=2):
+    """Scenario timing the mean cycle while Discord idles, with one check_interval passing per cycle.
+
+    Spans `periods` call title scans so the window enumeration they cost is
+    averaged in rather than left out like in a best-of time.
+    """
+    def run(cycles):
+        desktop = SimulatedDesktop.generate(windows=windows, promoted=True)
+        manager = create_manager(desktop)
+        scan_cycles = max(1, int(manager.call_scan_interval / manager.check_interval))
+        count = max(cycles, scan_cycles * periods)
+        manager.run_cycle()
+        total = 0.0
+        for _ in range(count):
+            # As if a full check interval had gone by since the last cycle
+            manager.last_call_scan -= manager.check_interval
+            start = time.perf_counter()
+            manager.run_cycle()
+            total += time.perf_counter() - start
+        return total / count
+    return run
+
+def first_cycle_scenario(warm, registry_keys=1000):
+    """Scenario timing the first cycle of a fresh monitor, with or without a warm state cache"""
+    from state_cache import StateCache
+
+    def run(cycles):
+        desktop = SimulatedDesktop.generate(registry_keys=registry_keys, promoted=True)
+        # A cache as a previous session would have left it
+        warm_cache = StateCache(['Discord.exe_7654321'])
+        samples = []
+        for _ in range(cycles):
+            manager = create_manager(desktop)
+            if warm:
+                manager.tray_manager.cache = warm_cache.copy()
+            start = time.perf_counter()
+            manager.run_cycle()
+            samples.append(time.perf_counter() - start)
+        return min(samples)
+    return run
+
+def profiles_scenario(profiles, registry_keys=1000):
+    """Scenario timing a full cycle with Discord plus profiles - 1 extra target apps, all visible"""
+    def run(cycles):
+        desktop = SimulatedDesktop.generate(registry_keys=registry_keys, promoted=True)
+        targets = []
+        for i in range(1, profiles):
+            name = f"Target{i:03d}"
+            desktop.add_process(f"{name}.exe")
+            desktop.add_window(f"{name}Window", f"{name} main window")
+            desktop.add_notify_icon(f"{name}.exe_{i}", ExecutablePath=f"C:\\Apps\\{name}.exe", IsPromoted=1)
+            targets.append({'name': name})
+        manager = create_manager(desktop)
+        manager.set_targets(targets)
+        return time_cycles(manager, cycles)
+    return run
+
+def sessions_scenario(sessions, fix=False, registry_keys=50):
+    """Scenario timing a multi-session cycle over fake sessions, each with its own simulated hive"""
+    from session_monitor import SessionMonitor, FakeSessionSource
+    from target_profiles import discord_profile
+
+    def run(cycles):
+        processes = SimulatedDesktop()
+        source = FakeSessionSource()
+        hives = {}
+        for session_id in range(1, sessions + 1):
+            sid = f"S-1-5-21-1000-{session_id}"
+            source.add_session(session_id, f"CORP\\user{session_id}", sid)
+            for i in range(20):
+                processes.add_process(f"process{i}.exe", session_id)
+            for _ in range(3):
+                processes.add_process("Discord.exe", session_id)
+            hive = hives[sid] = SimulatedDesktop()
+            for i in range(registry_keys):
+                hive.add_notify_icon(f"{1000000 + i}", IsPromoted=i % 2)
+            hive.add_notify_icon("Discord.exe_7654321", IsPromoted=1)
+        monitor = SessionMonitor(source, processes, hives.__getitem__, discord_profile(["Discord.exe"]))
+
+        def demote_all():
+            for hive in hives.values():
+                hive.demote()
+
+        return time_cycles(monitor, cycles, demote_all if fix else None)
+    return run
+
+def fix_latency_scenario(concurrent, message_latency=0.02, registry_latency=0.002, max_cycles=10):
+    """Scenario timing a first fix on a StartAllBack desktop with slow windows, strategies sequential or concurrent"""
+    from fix_runner import ConcurrentFixRunner
+    from tray_icon_helper import FIX_STRATEGIES, STRATEGY_CONFLICTS
+
+    def run(cycles):
+        desktop = SimulatedDesktop.generate(startallback=True, message_latency=message_latency,
+                                            registry_latency=registry_latency)
+        manager = create_manager(desktop)
+        tray_manager = manager.tray_manager
+        runner = None
+        if concurrent:
+            runner = tray_manager.fix_runner = ConcurrentFixRunner(tray_manager.run_fix_strategy, tray_manager.fix_cancel,
+                                                                   STRATEGY_CONFLICTS, manager.metrics,
+                                                                   len(FIX_STRATEGIES), tray_manager.is_promoted_now)
+
+        def demote():
+            # Strategies still finishing from the last fix are not part of the next one
+            if runner:
+                runner.wait_idle()
+            desktop.demote()
+            tray_manager.cache.set_last_strategy(None)
+
+        try:
+            # Every cycle sleeps through the injected delays, so a few are enough
+            return time_cycles(manager, min(cycles, max_cycles), demote, warmup=1)
+        finally:
+            if runner:
+                runner.close()
+    return run
+
+# One quiet cycle at DEBUG level, as the monitor logs it
+QUIET_CYCLE_LINES = [
+    ('DEBUG', "=== Starting Discord tray check cycle ==="),
+    ('DEBUG', "Found 2 running Discord processes"),
+    ('INFO', "Discord is running, checking tray icon status..."),
+    ('DEBUG', "Enumerated 120 NotifyIconSettings registry keys"),
+    ('DEBUG', "Discord is promoted in registry: Discord.exe_7654321"),
+    ('INFO', "Discord tray icon visibility check result: True"),
+    ('DEBUG', "=== Discord tray check cycle complete ==="),
+]
+
+INCIDENT_LINES = [
+    ('WARNING', "Discord tray issue detected: Icon not visible"),
+    ('INFO', "Attempting to fix Discord tray icon..."),
+    ('INFO', "Step 1: Checking for StartAllBack..."),
+    ('INFO', "StartAllBack promotion result: False"),
+    ('INFO', "Step 2: Trying standard Windows Shell API approach..."),
+    ('INFO', "Shell API promotion result: {ok}"),
+]
+
+def write_synthetic_log(path, megabytes, incident_every=500):
+    """Write a debug-level log of roughly the given size with an incident every few hundred cycles"""
+    from datetime import datetime, timedelta
+
+    clock = datetime(2026, 1, 1)
+    target = megabytes * 1024 * 1024
+    written = 0
+    cycle = 0
+    with open(path, 'w', newline='\n') as f:
+        while written < target:
+            lines = list(QUIET_CYCLE_LINES)
+            if cycle % incident_every == incident_every - 1:
+                ok = cycle % (3 * incident_every) != 3 * incident_every - 1
+                lines += [(level, text.format(ok=ok)) for level, text in INCIDENT_LINES]
+                lines.append(('INFO', "Successfully applied fix") if ok else ('WARNING', "Fix attempt failed (1/5)"))
+            stamp = f"{clock:%Y-%m-%d %H:%M:%S},{cycle % 1000:03d}"
+            block = ''.join(f"{stamp} - {level} - {text}\n" for level, text in lines)
+            f.write(block)
+            written += len(block)
+            clock += timedelta(seconds=30)
+            cycle += 1
+
+def log_analysis_scenario(megabytes):
+    """Scenario timing a streaming analysis of a synthetic debug log"""
+    import tempfile
+    from log_analyzer import analyze_log
+
+    def run(cycles):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'discord_tray_manager.log')
+            write_synthetic_log(path, megabytes)
+            # Whole-file runs are long, a few are enough for a stable minimum
+            samples = []
+            for _ in range(max(1, min(cycles, 5))):
+                start = time.perf_counter()
+                analyze_log(path)
+                samples.append(time.perf_counter() - start)
+            return min(samples)
+    return run
+
+def decision_scenario(batch=1000):
+    """Scenario timing the pure decision core over a batch of synthetic snapshots"""
+    from monitor_core import Snapshot, INITIAL_STATE, ACTION_FIX, decide, apply_fix_result
+
+    # Deterministic mix: not running, visible, and hidden icons whose fix alternates
+    snapshots = [Snapshot(i % 7 != 0, i % 3 != 0) for i in range(batch)]
+
+    def run(cycles):
+        samples = []
+        for _ in range(cycles):
+            state = INITIAL_STATE
+            start = time.perf_counter()
+            for i, snapshot in enumerate(snapshots):
+                state, actions = decide(snapshot, state)
+                if ACTION_FIX in actions:
+                    state, actions = apply_fix_result(state, i & 1)
+            samples.append(time.perf_counter() - start)
+        return min(samples)
+    return run
+
+def check_startup_scenario(runs=10):
+    """Scenario timing tray_check.py end to end in a fresh interpreter, imports included"""
+    import subprocess
+
+    command = [sys.executable, os.path.join(BASE_DIR, 'tray_check.py'), '--simulate']
+
+    def run(cycles):
+        samples = []
+        for _ in range(max(1, min(cycles, runs))):
+            start = time.perf_counter()
+            subprocess.run(command, stdout=subprocess.DEVNULL, cwd=BASE_DIR)
+            samples.append(time.perf_counter() - start)
+        return min(samples)
+    return run
+
+def memory_scenario(cycles=10000, warmup=1500, fix_every=10):
+    """Scenario measuring the monitor's steady-state heap and what each cycle leaves behind.
+
+    Returns (traced bytes held by the monitor after warm-up, allocated blocks
+    retained per cycle over `cycles` more). The warm-up fills the bounded
+    buffers (rolling histograms, event queues); after it a cycle that kept even
+    one object would add `cycles` blocks. Every `fix_every`-th cycle also fixes.
+    """
+    import gc
+    import tracemalloc
+
+    def run():
+        # Imported first, the monitor's footprint should not include its code
+        import discord_tray_manager
+        desktop = SimulatedDesktop.generate(promoted=True)
+
+        def run_cycles(count):
+            for i in range(count):
+                if i % fix_every == 0:
+                    desktop.demote()
+                manager.run_cycle()
+
+        tracemalloc.start(1)
+        try:
+            gc.collect()
+            before = tracemalloc.get_traced_memory()[0]
+            manager = create_manager(desktop)
+            run_cycles(warmup)
+            gc.collect()
+            footprint = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+
+        # Untraced, block counts are enough to see growth and keep 10k cycles quick
+        gc.collect()
+        blocks = sys.getallocatedblocks()
+        run_cycles(cycles)
+        gc.collect()
+        return footprint, (sys.getallocatedblocks() - blocks) / cycles
+    return run
+
+SCENARIOS = {
+    'check_baseline': cycle_scenario(),
+    'check_processes_1k': cycle_scenario(processes=1000),
+    'check_processes_10k': cycle_scenario(processes=10000),
+    'check_windows_1k': cycle_scenario(windows=1000),
+    'check_windows_10k': cycle_scenario(windows=10000),
+    'check_registry_1k': cycle_scenario(registry_keys=1000),
+    'check_registry_10k': cycle_scenario(registry_keys=10000),
+    'fix_baseline': cycle_scenario(fix=True),
+    'fix_stalled_subscribers': cycle_scenario(fix=True, subscribers=10),
+    'fix_windows_10k': cycle_scenario(windows=10000, fix=True),
+    'fix_registry_10k': cycle_scenario(registry_keys=10000, fix=True),
+    'fix_monitors_4': cycle_scenario(fix=True, monitors=4),
+    'fix_startallback_monitors_4': cycle_scenario(fix=True, monitors=4, startallback=True),
+    'fix_slow_windows_sequential': fix_latency_scenario(False),
+    'fix_slow_windows_concurrent': fix_latency_scenario(True),
+    'steady_state_windows_10k': steady_state_scenario(),
+    'first_cycle_cold_10k': first_cycle_scenario(False, registry_keys=10000),
+    'first_cycle_warm_10k': first_cycle_scenario(True, registry_keys=10000),
+    'profiles_1': profiles_scenario(1),
+    'profiles_10': profiles_scenario(10),
+    'profiles_100': profiles_scenario(100),
+    'sessions_50': sessions_scenario(50),
+    'sessions_500': sessions_scenario(500),
+    'sessions_500_fix': sessions_scenario(500, fix=True),
+    'analyze_log_64mb': log_analysis_scenario(64),
+    'decide_1k_snapshots': decision_scenario(),
+    'check_startup': check_startup_scenario(),
+}
+
+MEMORY_SCENARIOS = {
+    'memory_10k_cycles': memory_scenario(),
+}
+
+# Steady-state heap ceilings in KB, and the retained blocks per cycle still counted as no growth
+MEMORY_CEILINGS_KB = {
+    'memory_10k_cycles': 1024,
+}
+MAX_BLOCKS_PER_CYCLE = 0.01
+
+# Hard ceilings in ms regardless of the baseline, the probe must stay cheap enough to run from RMM agents
+LIMITS_MS = {
+    'check_startup': 100,
+}
+
+def calibrate(rounds=20):
+    """Best-of time of a fixed pure-Python workload, used to normalise for machine speed"""
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        total = 0
+        for i in range(20000):
+            total += i % 7
+        samples.append(time.perf_counter() - start)
+    return min(samples) * 1000
+
+def load_baseline():
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH, 'r') as f:
+        return json.load(f)
+
+def save_baseline(results):
+    baseline = load_baseline()
+    baseline.update(results)
+    with open(BASELINE_PATH, 'w') as f:
+        json.dump(baseline, f, indent=4, sort_keys=True)
+        f.write('\n')
+    print(f"Baseline written to {BASELINE_PATH}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Discord Tray Manager benchmark suite')
+    parser.add_argument('scenarios', nargs='*', help='Scenarios to run (default: all)')
+    parser.add_argument('--cycles', type=int, default=200, help='Cycles per scenario (default: 200)')
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help='Fail when a result exceeds baseline x tolerance (default: 1.5)')
+    parser.add_argument('--update-baseline', action='store_true', help='Store the results as the new baseline')
+    parser.add_argument('--list', action='store_true', help='List available scenarios')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name in list(SCENARIOS) + list(MEMORY_SCENARIOS):
+            print(name)
+        return 0
+
+    # Silence the monitor's logging before it configures its own handlers
+    logging.basicConfig(level=logging.CRITICAL, handlers=[logging.NullHandler()])
+
+    names = args.scenarios or list(SCENARIOS) + list(MEMORY_SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS and name not in MEMORY_SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+
+    baseline = load_baseline()
+    reference_calibration = baseline.get('_calibration_ms')
+    results = {}
+    calibrations = []
+    regressions = []
+
+    print("Discord Tray Manager - Benchmarks")
+    print("=" * 60)
+
+    for name in names:
+        if name in MEMORY_SCENARIOS:
+            # Absolute limits, memory does not scale with machine speed and is not stored in the baseline
+            footprint, growth = MEMORY_SCENARIOS[name]()
+            ceiling = MEMORY_CEILINGS_KB[name]
+            verdict = 'ok' if footprint <= ceiling * 1024 and growth <= MAX_BLOCKS_PER_CYCLE else 'REGRESSION'
+            if verdict == 'REGRESSION':
+                regressions.append(name)
+            print(f"{name:<28} {footprint / 1024:10.1f} KB   ceiling {ceiling:7d} KB   "
+                  f"{growth:+.4f} blocks/cycle  {verdict}")
+            continue
+        # Calibrate right before each scenario so slow phases on a shared machine cancel out
+        calibration = calibrate()
+        calibrations.append(calibration)
+        ms = SCENARIOS[name](args.cycles) * 1000
+        results[name] = round(ms, 4)
+
+        reference = baseline.get(name)
+        if reference and reference_calibration:
+            ratio = (ms / calibration) / (reference / reference_calibration)
+            verdict = 'REGRESSION' if ratio > args.tolerance else 'ok'
+            if verdict == 'REGRESSION':
+                regressions.append(name)
+            print(f"{name:<28} {ms:10.3f} ms   baseline {reference:10.3f} ms   x{ratio:5.2f}  {verdict}")
+        else:
+            print(f"{name:<28} {ms:10.3f} ms   (no baseline)")
+        limit = LIMITS_MS.get(name)
+        if limit and ms > limit:
+            if name not in regressions:
+                regressions.append(name)
+            print(f"{name:<28} exceeds its {limit} ms limit")
+
+    if calibrations:
+        results['_calibration_ms'] = round(min(calibrations), 4)
+
+    if args.update_baseline:
+        save_baseline(results)
+        return 0
+
+    if regressions:
+        print(f"\n{len(regressions)} scenario(s) regressed beyond x{args.tolerance}: {', '.join(regressions)}")
+        return 1
+
+    print("\nNo regressions")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+Call Burst - Faster checks while a Discord voice call is active
+
+Discord swaps its tray icon when a call starts and ends, which is when it most
+often goes missing. CallDetector infers call state from signals the monitor
+already has: the number of Discord processes (calls spin up extra helpers)
+and Discord window titles. BurstSchedule shortens the check interval while a
+call is on, caps the extra cycles per call and reports their cost.
+"""
+
+import re
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CALL_TITLE_PATTERNS = [r'voice connected', r'\bcall with\b', r'\bin a call\b', r'\bstage\b']
+
+# Cycles after Discord starts before its process count is trusted, it keeps spawning helpers while loading
+SETTLE_CYCLES = 3
+
+class CallDetector:
+    """Decides whether a call is active from process counts and window titles"""
+
+    def __init__(self, title_patterns=DEFAULT_CALL_TITLE_PATTERNS, process_delta=2):
+        self.title_regex = re.compile('|'.join(f'(?:{p})' for p in title_patterns), re.IGNORECASE) if title_patterns else None
+        self.process_delta = process_delta
+        self.baseline = None
+        self.running_cycles = 0
+        self.call_windows = []
+
+    def update_windows(self, windows):
+        """Refresh the matching call windows from a Discord window list"""
+        if self.title_regex:
+            self.call_windows = [w for w in windows if self.title_regex.search(w['title'])]
+
+    def detect(self, process_count):
+        """Return the reasons a call looks active (empty if none)"""
+        if not process_count:
+            self.baseline = None
+            self.running_cycles = 0
+            self.call_windows = []
+            return []
+
+        reasons = [f"window '{w['title']}'" for w in self.call_windows]
+        self.running_cycles += 1
+        if self.running_cycles <= SETTLE_CYCLES:
+            return reasons
+
+        # The quietest Discord seen since it settled is the no-call baseline
+        self.baseline = process_count if self.baseline is None else min(self.baseline, process_count)
+        if self.process_delta and process_count >= self.baseline + self.process_delta:
+            reasons.append(f"{process_count} Discord processes (baseline {self.baseline})")
+        return reasons
+
+class BurstSchedule:
+    """Tracks call state transitions and picks the next check interval"""
+
+    def __init__(self, normal_interval, burst_interval, max_burst_cycles, metrics, clock=time.monotonic):
+        self.normal_interval = normal_interval
+        self.burst_interval = burst_interval
+        self.max_burst_cycles = max_burst_cycles
+        self.metrics = metrics
+        self.clock = clock
+        self.in_call = False
+        self.call_started = None
+        self.burst_cycles = 0
+        self.burst_seconds = 0.0
+
+    def update(self, reasons):
+        """Apply this cycle's detection result"""
+        if reasons and not self.in_call:
+            self.in_call = True
+            self.call_started = self.clock()
+            self.burst_cycles = 0
+            self.burst_seconds = 0.0
+            self.metrics.increment('calls_detected')
+            logger.info(f"Voice call detected ({', '.join(reasons)}), checking every {self.burst_interval}s")
+        elif not reasons and self.in_call:
+            self.in_call = False
+            self.report()
+
+    def record_cycle(self, seconds):
+        """Account for one cycle run on the burst schedule"""
+        if not self.in_call or self.burst_cycles >= self.max_burst_cycles:
+            return
+        self.burst_cycles += 1
+        self.burst_seconds += seconds
+        self.metrics.increment('burst_cycles')
+        self.metrics.observe('burst_cycle', seconds)
+        if self.burst_cycles == self.max_burst_cycles:
+            logger.info(f"Burst cap of {self.max_burst_cycles} cycles reached, back to the normal interval for this call")
+
+    def interval(self):
+        """Seconds until the next check"""
+        if self.in_call and self.burst_cycles < self.max_burst_cycles:
+            return min(self.burst_interval, self.normal_interval)
+        return self.normal_interval
+
+    def extra_cycles(self):
+        """Burst cycles beyond what the normal schedule would have run during the call"""
+        duration = self.clock() - self.call_started if self.call_started is not None else 0.0
+        normal_cycles = int(duration / self.normal_interval) if self.normal_interval else 0
+        return max(self.burst_cycles - normal_cycles, 0)
+
+    def report(self):
+        duration = self.clock() - self.call_started
+        extra = self.extra_cycles()
+        self.metrics.increment('burst_extra_cycles', extra)
+        logger.info(f"Voice call ended after {duration:.0f}s: {self.burst_cycles} burst cycles "
+                    f"({extra} more than the normal schedule), {self.burst_seconds * 1000:.1f} ms spent in them")
@@ -0,0 +1,186 @@
+"""
+Change Events - Typed changes between consecutive monitor snapshots on an in-process bus
+
+SnapshotDiffer compares what each cycle observed with the previous cycle and
+publishes a ChangeEvent per difference: Discord starting or stopping, Discord
+windows appearing or closing, an IsPromoted value flipping, the taskbar being
+recreated and the monitor state changing. EventBus hands every event to each
+subscriber's own bounded queue; a full queue drops its oldest event, so a slow
+consumer never stalls the monitor thread.
+"""
+
+import time
+import logging
+import threading
+from collections import deque, namedtuple
+
+from cycle_metrics import NULL_METRICS
+from tray_status import STATUS_TEXT
+
+logger = logging.getLogger(__name__)
+
+EVENT_DISCORD_STARTED = 'discord_started'
+EVENT_DISCORD_STOPPED = 'discord_stopped'
+EVENT_WINDOW_APPEARED = 'window_appeared'
+EVENT_WINDOW_CLOSED = 'window_closed'
+EVENT_PROMOTION_CHANGED = 'promotion_changed'
+EVENT_TRAY_RECREATED = 'tray_recreated'
+EVENT_STATUS_CHANGED = 'status_changed'
+
+DEFAULT_QUEUE_SIZE = 256
+
+# `subject` is what changed (a window handle, a registry key), `old`/`new` its values
+ChangeEvent = namedtuple('ChangeEvent', ['kind', 'subject', 'old', 'new', 'time'])
+
+class Subscription:
+    """One subscriber's bounded queue; when full the oldest event makes room"""
+
+    def __init__(self, name, kinds=None, maxsize=DEFAULT_QUEUE_SIZE):
+        self.name = name
+        self.kinds = frozenset(kinds) if kinds else None
+        self.queue = deque(maxlen=maxsize)
+        self.dropped = 0
+        self.closed = False
+        self._ready = threading.Condition()
+
+    def wants(self, event):
+        return self.kinds is None or event.kind in self.kinds
+
+    def put(self, event):
+        """Queue an event, returns True if an older one had to be dropped"""
+        with self._ready:
+            dropped = len(self.queue) == self.queue.maxlen
+            if dropped:
+                self.dropped += 1
+            self.queue.append(event)
+            self._ready.notify()
+        return dropped
+
+    def get(self, timeout=None):
+        """Next event, or None once closed or after `timeout` seconds without one"""
+        with self._ready:
+            if not self.queue and not self.closed:
+                self._ready.wait(timeout)
+            return self.queue.popleft() if self.queue else None
+
+    def drain(self):
+        """Return and clear every queued event"""
+        with self._ready:
+            events = list(self.queue)
+            self.queue.clear()
+        return events
+
+    def close(self):
+        with self._ready:
+            self.closed = True
+            self._ready.notify_all()
+
+class EventBus:
+    """Publishes change events to every interested subscription"""
+
+    def __init__(self, metrics=NULL_METRICS, queue_size=DEFAULT_QUEUE_SIZE, clock=time.time):
+        self.metrics = metrics
+        self.queue_size = queue_size
+        self.clock = clock
+        self.subscriptions = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, name, kinds=None, maxsize=None):
+        subscription = Subscription(name, kinds, maxsize or self.queue_size)
+        with self._lock:
+            self.subscriptions = self.subscriptions + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self.subscriptions = [s for s in self.subscriptions if s is not subscription]
+        subscription.close()
+
+    def listen(self, name, callback, kinds=None):
+        """Subscribe and call callback(event) for each event on a daemon thread"""
+        subscription = self.subscribe(name, kinds)
+
+        def run():
+            while not subscription.closed or subscription.queue:
+                event = subscription.get()
+                if event is None:
+                    continue
+                try:
+                    callback(event)
+                except Exception as e:
+                    logger.error(f"Error in {name} event subscriber: {e}")
+
+        threading.Thread(target=run, name=f'events-{name}', daemon=True).start()
+        return subscription
+
+    def publish(self, kind, subject=None, old=None, new=None):
+        # The list is replaced, never mutated, so it can be read without the lock
+        subscriptions = self.subscriptions
+        if not subscriptions:
+            return
+        event = ChangeEvent(kind, subject, old, new, self.clock())
+        self.metrics.increment('events_published')
+        for subscription in subscriptions:
+            if subscription.wants(event) and subscription.put(event):
+                self.metrics.increment('events_dropped')
+
+    def close(self):
+        with self._lock:
+            subscriptions, self.subscriptions = self.subscriptions, []
+        for subscription in subscriptions:
+            subscription.close()
+
+class SnapshotDiffer:
+    """Turns consecutive cycle observations into change events.
+
+    Parts a cycle did not observe are passed as None and keep their previous
+    value, so nothing is polled just to produce events.
+    """
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.running = None
+        self.windows = None
+        self.promotion = {}
+
+    def update(self, running, windows=None, promotion=None):
+        bus = self.bus
+        if running != self.running:
+            bus.publish(EVENT_DISCORD_STARTED if running else EVENT_DISCORD_STOPPED, old=self.running, new=running)
+            self.running = running
+
+        if windows is not None:
+            current = {w['hwnd']: w['title'] for w in windows}
+            if self.windows is not None:
+                for hwnd in current.keys() - self.windows.keys():
+                    bus.publish(EVENT_WINDOW_APPEARED, hwnd, new=current[hwnd])
+                for hwnd in self.windows.keys() - current.keys():
+                    bus.publish(EVENT_WINDOW_CLOSED, hwnd, old=self.windows[hwnd])
+            self.windows = current
+
+        if promotion:
+            previous = self.promotion
+            for subkey, value in promotion.items():
+                # A key seen for the first time is the baseline, not a change
+                if subkey in previous and previous[subkey] != value:
+                    bus.publish(EVENT_PROMOTION_CHANGED, subkey, previous[subkey], value)
+            previous.update(promotion)
+
+def describe_event(event):
+    """One log line for a change event"""
+    if event.kind in (EVENT_DISCORD_STARTED, EVENT_DISCORD_STOPPED):
+        return "Discord started" if event.new else "Discord stopped"
+    if event.kind == EVENT_WINDOW_APPEARED:
+        return f"Discord window appeared: {event.new!r} (hwnd={event.subject})"
+    if event.kind == EVENT_WINDOW_CLOSED:
+        return f"Discord window closed: {event.old!r} (hwnd={event.subject})"
+    if event.kind == EVENT_PROMOTION_CHANGED:
+        return f"IsPromoted for {event.subject} changed: {event.old} -> {event.new}"
+    if event.kind == EVENT_TRAY_RECREATED:
+        return "Taskbar recreated"
+    if event.kind == EVENT_STATUS_CHANGED:
+        return f"Monitor state: {STATUS_TEXT.get(event.new, event.new)}"
+    return f"{event.kind}: {event.subject} {event.old} -> {event.new}"
+
+def log_change_event(event):
+    logger.info(describe_event(event))
@@ -0,0 +1,149 @@
+"""
+Control Channel - One monitor per user, and a local channel for asking it things
+
+The first instance binds a per-user named pipe (a Unix socket off Windows)
+with multiprocessing.connection. Holding that address is the single-instance
+lock: a second launch finds it taken and exits instead of starting another
+monitor. Scripts send commands (status, check-now, reload-config, metrics,
+stop) over the same channel with send_command(); replies are built from state
+the monitor already holds and never start a scan. Connections authenticate
+with a random key kept in the user's app data folder.
+"""
+
+import os
+import sys
+import time
+import getpass
+import logging
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+
+from cycle_metrics import NULL_METRICS
+
+logger = logging.getLogger(__name__)
+
+COMMAND_STATUS = 'status'
+COMMAND_CHECK_NOW = 'check-now'
+COMMAND_RELOAD_CONFIG = 'reload-config'
+COMMAND_METRICS = 'metrics'
+COMMAND_STOP = 'stop'
+CONTROL_COMMANDS = (COMMAND_STATUS, COMMAND_CHECK_NOW, COMMAND_RELOAD_CONFIG, COMMAND_METRICS, COMMAND_STOP)
+
+AUTHKEY_SIZE = 32
+
+def control_address(directory):
+    """Named pipe per user on Windows, a socket in the app data folder elsewhere"""
+    if sys.platform == 'win32':
+        return rf'\\.\pipe\DiscordTrayManager-{getpass.getuser()}'
+    return os.path.join(directory, 'discord_tray_manager.sock')
+
+def load_authkey(directory):
+    """Read the channel key, creating it readable by this user only on first use"""
+    path = os.path.join(directory, 'discord_tray_manager.key')
+    try:
+        with open(path, 'rb') as f:
+            key = f.read()
+        if len(key) >= AUTHKEY_SIZE:
+            return key
+    except FileNotFoundError:
+        pass
+    key = os.urandom(AUTHKEY_SIZE)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    return key
+
+def send_command(address, authkey, command):
+    """Send one command to the running instance and return its reply dict.
+
+    Raises OSError (FileNotFoundError, ConnectionRefusedError) if no instance is running.
+    """
+    with Client(address, authkey=authkey) as conn:
+        conn.send({'command': command})
+        return conn.recv()
+
+class ControlServer:
+    """Holds the instance lock and answers commands on a background thread"""
+
+    def __init__(self, listener, address, authkey, metrics=NULL_METRICS):
+        self.listener = listener
+        self.address = address
+        self.authkey = authkey
+        self.metrics = metrics
+        self.commands = {}
+        self.closed = False
+        self._thread = None
+
+    @classmethod
+    def acquire(cls, address, authkey, metrics=NULL_METRICS):
+        """Bind the channel, or return None if another instance already holds it"""
+        if not address.startswith('\\\\') and os.path.exists(address):
+            try:
+                send_command(address, authkey, COMMAND_STATUS)
+                return None
+            except AuthenticationError:
+                return None
+            except (OSError, EOFError):
+                # Left behind by an instance that crashed
+                logger.info(f"Removing stale control socket {address}")
+                os.unlink(address)
+        try:
+            listener = Listener(address, authkey=authkey)
+        except OSError as e:
+            logger.debug(f"Control channel {address} is taken: {e}")
+            return None
+        return cls(listener, address, authkey, metrics)
+
+    def start(self, commands):
+        """Serve {command: handler()} until close(), each handler returns a JSON-style reply"""
+        self.commands = commands
+        self._thread = threading.Thread(target=self._run, name='control-channel', daemon=True)
+        self._thread.start()
+        logger.info(f"Control channel listening on {self.address}")
+
+    def _run(self):
+        while not self.closed:
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError, AuthenticationError) as e:
+                if self.closed:
+                    break
+                logger.warning(f"Rejected control connection: {e}")
+                continue
+            with conn:
+                try:
+                    self.handle(conn)
+                except (OSError, EOFError) as e:
+                    logger.debug(f"Control client went away: {e}")
+
+    def handle(self, conn):
+        request = conn.recv()
+        start = time.perf_counter()
+        command = request.get('command') if isinstance(request, dict) else None
+        handler = self.commands.get(command)
+        if handler is None:
+            reply = {'ok': False, 'error': f"Unknown command {command!r}", 'commands': list(self.commands)}
+        else:
+            try:
+                reply = {'ok': True, 'result': handler()}
+            except Exception as e:
+                logger.error(f"Error handling control command {command}: {e}")
+                reply = {'ok': False, 'error': str(e)}
+        self.metrics.observe('control_command', time.perf_counter() - start)
+        self.metrics.increment('control_commands')
+        conn.send(reply)
+
+    def close(self):
+        """Release the lock, waking the accept() the thread is blocked in"""
+        if self.closed:
+            return
+        self.closed = True
+        if self._thread:
+            # Unauthenticated, so it never waits on a thread that has already left accept()
+            try:
+                Client(self.address).close()
+            except OSError:
+                pass
+            self._thread.join(1)
+        self.listener.close()
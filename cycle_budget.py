@@ -0,0 +1,84 @@
+"""
+Cycle Budget - Per-cycle time budget that lets optional stages be skipped on loaded machines
+
+The monitor starts the budget at the top of each cycle. Mandatory stages
+(process scan, registry check) always run; optional, expensive ones ask
+allow() first and are skipped once the budget is used up. Skips and overruns
+are counted in the cycle metrics.
+"""
+
+import time
+import logging
+
+from cycle_metrics import NULL_METRICS
+
+logger = logging.getLogger(__name__)
+
+# Optional stages that may be skipped when the budget runs out
+BUDGET_STARTALLBACK_SCAN = 'startallback_scan'
+BUDGET_TASKBAR_BROADCAST = 'taskbar_broadcast'
+BUDGET_OVERFLOW_REFRESH = 'overflow_refresh'
+BUDGET_REGISTRY_DUMP = 'registry_dump'
+BUDGET_CALL_SCAN = 'call_scan'
+
+class NullBudget:
+    """Unlimited budget used when cycle_budget_ms is 0"""
+
+    enabled = False
+
+    def start(self):
+        pass
+
+    def remaining(self):
+        return float('inf')
+
+    def allow(self, stage):
+        return True
+
+    def finish(self):
+        pass
+
+NULL_BUDGET = NullBudget()
+
+class CycleBudget:
+    """Time budget for one monitor cycle, measured with an injectable clock"""
+
+    enabled = True
+
+    def __init__(self, seconds, metrics=NULL_METRICS, clock=time.monotonic):
+        self.seconds = seconds
+        self.metrics = metrics
+        self.clock = clock
+        self.started = None
+        self.skipped = []
+
+    def start(self):
+        self.started = self.clock()
+        self.skipped = []
+
+    def elapsed(self):
+        return self.clock() - self.started if self.started is not None else 0.0
+
+    def remaining(self):
+        return self.seconds - self.elapsed()
+
+    def allow(self, stage):
+        """True if an optional stage may run, otherwise count it as skipped"""
+        if self.started is None or self.remaining() > 0:
+            return True
+        self.skipped.append(stage)
+        self.metrics.increment('budget_skipped_stages')
+        self.metrics.increment(f'budget_skipped_{stage}')
+        logger.info(f"Cycle budget of {self.seconds * 1000:.0f} ms used up, skipping {stage}")
+        return False
+
+    def finish(self):
+        """Close the cycle and count an overrun if it went over budget"""
+        if self.started is None:
+            return
+        elapsed = self.elapsed()
+        self.started = None
+        if elapsed > self.seconds:
+            self.metrics.increment('budget_overruns')
+            skipped = f", skipped {', '.join(self.skipped)}" if self.skipped else ""
+            logger.warning(f"Cycle took {elapsed * 1000:.0f} ms, over its {self.seconds * 1000:.0f} ms budget{skipped}")
@@ -0,0 +1,234 @@
+"""
+Cycle Metrics - Per-stage timing histograms and counters for the monitor loop
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Stage names used by the monitor and the tray helper
+STAGE_CYCLE = 'cycle'
+STAGE_PROCESS_SCAN = 'process_scan'
+STAGE_WINDOW_ENUM = 'window_enum'
+STAGE_REGISTRY = 'registry'
+STAGE_MESSAGE_SEND = 'message_send'
+STAGE_LOG_IO = 'log_io'
+
+METRIC_PREFIX = 'discord_tray_manager'
+
+# Paths the stats endpoint answers, anything else is a 404
+STATS_PATHS = ('/metrics', '/stats')
+
+class RollingHistogram:
+    """Keeps the most recent samples and reports percentiles over them"""
+
+    def __init__(self, size=1024):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def percentile(self, pct):
+        """Nearest-rank percentile over the rolling window"""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+        return ordered[index]
+
+    def summary(self):
+        return {
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'count': self.count,
+            'sum': self.total,
+        }
+
+class _StageTimer:
+    __slots__ = ('metrics', 'stage', 'start')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = self.metrics.clock()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.stage, self.metrics.clock() - self.start)
+        return False
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class NullMetrics:
+    """Metrics sink used when nothing is collecting"""
+
+    def stage(self, name):
+        return _NULL_TIMER
+
+    def observe(self, name, seconds):
+        pass
+
+    def increment(self, name, amount=1):
+        pass
+
+NULL_METRICS = NullMetrics()
+
+class CycleMetrics:
+    """Collects stage timings and event counters for the monitor loop"""
+
+    def __init__(self, window=1024, clock=time.monotonic):
+        self.window = window
+        self.clock = clock
+        self.histograms = {}
+        self.counters = {
+            'fixes': 0,
+            'fix_failures': 0,
+            'suppressed_actions': 0,
+        }
+        self._lock = threading.Lock()
+
+    def stage(self, name):
+        """Context manager timing one stage with the monotonic clock"""
+        return _StageTimer(self, name)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = RollingHistogram(self.window)
+            histogram.observe(seconds)
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def snapshot(self):
+        """Return a plain dict copy of all stage summaries and counters"""
+        with self._lock:
+            return {
+                'stages': {name: h.summary() for name, h in self.histograms.items()},
+                'counters': dict(self.counters),
+            }
+
+    def render_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        data = self.snapshot()
+        lines = []
+
+        name = f"{METRIC_PREFIX}_stage_seconds"
+        lines.append(f"# HELP {name} Time spent per monitor stage (rolling window)")
+        lines.append(f"# TYPE {name} summary")
+        for stage, summary in sorted(data['stages'].items()):
+            for quantile, key in (('0.5', 'p50'), ('0.95', 'p95'), ('0.99', 'p99')):
+                lines.append(f'{name}{{stage="{stage}",quantile="{quantile}"}} {summary[key]:.6f}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {summary["sum"]:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {summary["count"]}')
+
+        for counter, value in sorted(data['counters'].items()):
+            name = f"{METRIC_PREFIX}_{counter}_total"
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {value}")
+
+        return '\n'.join(lines) + '\n'
+
+class TimedFileHandler(logging.FileHandler):
+    """File handler that records how long each log write takes"""
+
+    def __init__(self, filename, metrics=NULL_METRICS, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.metrics = metrics
+
+    def emit(self, record):
+        with self.metrics.stage(STAGE_LOG_IO):
+            super().emit(record)
+
+def write_stats_file(metrics, path):
+    """Atomically rewrite the stats file with the current metrics"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(metrics.render_prometheus())
+    os.replace(tmp_path, path)
+
+class StatsFileWriter:
+    """Background thread that periodically rewrites the stats file"""
+
+    def __init__(self, metrics, path, interval=30):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stats-file', daemon=True)
+        self._thread.start()
+        logger.info(f"Writing metrics to {self.path} every {self.interval} seconds")
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                write_stats_file(self.metrics, self.path)
+            except OSError as e:
+                logger.error(f"Could not write stats file {self.path}: {e}")
+            self._stop.wait(self.interval)
+
+class StatsServer:
+    """Serves the metrics over HTTP on the loopback interface only"""
+
+    def __init__(self, metrics, port):
+        self.metrics = metrics
+        self.port = port
+        self._server = None
+
+    def start(self):
+        # Imported here, it costs more than the rest of the module and most runs never serve stats
+        from http.server import HTTPServer, BaseHTTPRequestHandler
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in STATS_PATHS:
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(f"Stats request: {format % args}")
+
+        self._server = HTTPServer(('127.0.0.1', self.port), Handler)
+        thread = threading.Thread(target=self._server.serve_forever, name='stats-server', daemon=True)
+        thread.start()
+        logger.info(f"Serving metrics on http://127.0.0.1:{self._server.server_port}/metrics")
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
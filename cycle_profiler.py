@@ -0,0 +1,60 @@
+"""
+Cycle Profiler - Runs monitor cycles back to back under cProfile
+"""
+
+import os
+import io
+import time
+import cProfile
+import pstats
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Functions whose cumulative time is broken out in the summary
+PROFILE_FOCUS = r'tray_icon_helper\.py|is_discord_running|get_discord_processes|check_discord_tray_status|monitor_core'
+
+def profile_cycles(manager, cycles, output_dir, top=30, before_cycle=None):
+    """Run `cycles` monitor cycles with no sleeps and write a pstats report.
+
+    ``before_cycle`` is called ahead of every cycle and is profiled along
+    with it, so keep it cheap. Returns the paths of the ``.pstats`` file
+    and the text summary.
+    """
+    stats_path = os.path.join(output_dir, 'discord_tray_manager_profile.pstats')
+    summary_path = os.path.join(output_dir, 'discord_tray_manager_profile.txt')
+
+    logger.info(f"Profiling {cycles} monitor cycles...")
+
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        for _ in range(cycles):
+            if before_cycle:
+                before_cycle()
+            manager.run_cycle()
+    finally:
+        profiler.disable()
+    elapsed = time.perf_counter() - start
+
+    profiler.dump_stats(stats_path)
+
+    stream = io.StringIO()
+    stream.write(f"Discord Tray Manager profile: {cycles} cycles in {elapsed:.3f}s "
+                 f"({elapsed / max(cycles, 1) * 1000:.2f} ms/cycle)\n\n")
+
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.strip_dirs()
+
+    stream.write(f"=== Top {top} functions by cumulative time ===\n")
+    stats.sort_stats('cumulative').print_stats(top)
+
+    stream.write("=== TrayIconManager and process detection ===\n")
+    stats.sort_stats('cumulative').print_stats(PROFILE_FOCUS)
+
+    with open(summary_path, 'w') as f:
+        f.write(stream.getvalue())
+
+    logger.info(f"Profile written to {stats_path} and {summary_path}")
+    return stats_path, summary_path
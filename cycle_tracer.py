@@ -0,0 +1,108 @@
+"""
+Cycle Tracer - Records monitor spans for export as Chrome/Perfetto trace JSON
+"""
+
+import os
+import json
+import time
+import logging
+import functools
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = self.tracer.clock()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = self.tracer.clock()
+        if exc_type is not None:
+            self.args = dict(self.args or {}, error=exc_type.__name__)
+        self.tracer.events.append((self.name, self.start, end - self.start,
+                                   threading.get_ident(), self.args))
+        return False
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class NullTracer:
+    """Tracer used when tracing is disabled, every span is a shared no-op"""
+
+    enabled = False
+
+    def span(self, name, args=None):
+        return _NULL_SPAN
+
+NULL_TRACER = NullTracer()
+
+class CycleTracer:
+    """Keeps the most recent spans in a bounded ring buffer"""
+
+    enabled = True
+
+    def __init__(self, capacity=20000, clock=time.perf_counter):
+        self.clock = clock
+        # deque.append is atomic, so spans from several threads need no lock
+        self.events = deque(maxlen=capacity)
+        self.origin = clock()
+
+    def span(self, name, args=None):
+        """Context manager recording one begin/end span"""
+        return _Span(self, name, args)
+
+    def to_chrome_trace(self):
+        """Convert the buffered spans to Chrome trace-event JSON data"""
+        pid = os.getpid()
+        trace_events = []
+        # Monitor and fix threads keep appending, iterate over a copy taken in one step
+        for name, start, duration, tid, args in self.events.copy():
+            event = {
+                'name': name,
+                'cat': 'monitor',
+                'ph': 'X',
+                'ts': (start - self.origin) * 1e6,
+                'dur': duration * 1e6,
+                'pid': pid,
+                'tid': tid,
+            }
+            if args:
+                event['args'] = args
+            trace_events.append(event)
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    def dump(self, path):
+        """Write the buffered spans to `path` as Chrome/Perfetto trace JSON"""
+        data = self.to_chrome_trace()
+        with open(path, 'w') as f:
+            json.dump(data, f)
+        logger.info(f"Wrote {len(data['traceEvents'])} trace events to {path}")
+        return path
+
+def traced(func):
+    """Wrap a method in a span named after it, using the instance's tracer"""
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self.tracer.span(name):
+            return func(self, *args, **kwargs)
+
+    return wrapper
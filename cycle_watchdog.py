@@ -0,0 +1,189 @@
+"""
+Cycle Watchdog - Detects hung monitor cycles and isolates Win32 probes
+
+Every cycle beats a Heartbeat when it starts and ends. CycleWatchdog polls it
+from its own thread and, once a cycle has been running longer than the
+timeout, reports the hang so the monitor can abandon that thread and start a
+fresh one. Each further hang without a completed cycle in between doubles the
+wait before the next report, so a call that hangs every time does not leave
+a new stuck thread behind every timeout. IsolatedBackend goes further and
+runs every backend call in a disposable worker process that is killed and
+replaced when a call times out.
+"""
+
+import time
+import logging
+import threading
+import multiprocessing
+
+logger = logging.getLogger(__name__)
+
+# Most the timeout grows to, as a multiple, while cycles keep hanging
+MAX_BACKOFF_FACTOR = 8
+
+class Heartbeat:
+    """Start time of the cycle in progress and time of the last completed one"""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.started = None
+        self.last_beat = None
+        self.cycles = 0
+        self._owner = None
+
+    def begin(self):
+        self._owner = threading.get_ident()
+        self.started = self.clock()
+
+    def end(self):
+        # An abandoned thread finishing late must not clear its replacement's cycle
+        if self._owner != threading.get_ident():
+            return
+        self.started = None
+        self.last_beat = self.clock()
+        self.cycles += 1
+
+    def busy_for(self):
+        """Seconds the current cycle has been running, 0 between cycles"""
+        started = self.started
+        return self.clock() - started if started is not None else 0.0
+
+class CycleWatchdog:
+    """Calls on_hang() when a cycle overruns the timeout and again every timeout it stays stuck,
+    backing off while hangs repeat"""
+
+    def __init__(self, heartbeat, timeout, on_hang, interval=None, clock=None):
+        self.heartbeat = heartbeat
+        self.timeout = timeout
+        self.on_hang = on_hang
+        self.interval = interval or max(timeout / 4, 1)
+        self.clock = clock or heartbeat.clock
+        self.hang_count = 0
+        # Hangs since the last completed cycle, each doubles the timeout
+        self.consecutive_hangs = 0
+        self._reported = None
+        self._reported_at = None
+        self._cycles_at_report = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self):
+        """Check the heartbeat once, returns True if a hang was reported"""
+        started = self.heartbeat.started
+        if started is None:
+            return False
+        if self.heartbeat.cycles != self._cycles_at_report:
+            self.consecutive_hangs = 0
+        # A cycle the monitor kept running after its report counts from that report
+        since = self._reported_at if started == self._reported else started
+        if self.clock() - since < self.current_timeout():
+            return False
+
+        self._reported = started
+        self._reported_at = self.clock()
+        self._cycles_at_report = self.heartbeat.cycles
+        self.hang_count += 1
+        self.consecutive_hangs += 1
+        try:
+            self.on_hang()
+        except Exception as e:
+            logger.error(f"Error recovering from hung cycle: {e}")
+        return True
+
+    def current_timeout(self):
+        """Seconds a cycle may run before it is reported, longer while hangs repeat"""
+        return self.timeout * min(2 ** self.consecutive_hangs, MAX_BACKOFF_FACTOR)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='cycle-watchdog', daemon=True)
+        self._thread.start()
+        logger.info(f"Watchdog started, cycles longer than {self.timeout}s are abandoned")
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+class ProbeTimeout(TimeoutError):
+    """A backend call in the probe worker did not answer in time"""
+
+def _probe_worker(backend_factory, conn):
+    """Worker process loop: run backend calls received over the pipe"""
+    backend = backend_factory()
+    while True:
+        try:
+            name, args = conn.recv()
+        except EOFError:
+            return
+        try:
+            conn.send(('ok', getattr(backend, name)(*args)))
+        except Exception as e:
+            try:
+                conn.send(('error', e))
+            except Exception:
+                # Exceptions that cannot be pickled are passed on as text
+                conn.send(('error', RuntimeError(repr(e))))
+
+class IsolatedBackend:
+    """Runs backend calls in a disposable worker process with a per-call timeout.
+
+    ``backend_factory`` must be picklable (a module-level class or function)
+    and is called in the worker. A call that does not answer within
+    ``timeout`` seconds kills the worker and raises ProbeTimeout; the next
+    call starts a fresh one.
+    """
+
+    def __init__(self, backend_factory, timeout=10, metrics=None):
+        self.backend_factory = backend_factory
+        self.timeout = timeout
+        self.metrics = metrics
+        self.timeouts = 0
+        self._process = None
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _start_worker(self):
+        self._conn, child_conn = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_probe_worker, args=(self.backend_factory, child_conn),
+                                                name='probe-worker', daemon=True)
+        self._process.start()
+        child_conn.close()
+        logger.debug(f"Started probe worker (pid={self._process.pid})")
+
+    def _kill_worker(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.join(1)
+        if self._conn is not None:
+            self._conn.close()
+        self._process = None
+        self._conn = None
+
+    def call(self, name, *args):
+        with self._lock:
+            if self._process is None or not self._process.is_alive():
+                self._kill_worker()
+                self._start_worker()
+            self._conn.send((name, args))
+            if not self._conn.poll(self.timeout):
+                self._kill_worker()
+                self.timeouts += 1
+                if self.metrics:
+                    self.metrics.increment('probe_timeouts')
+                logger.error(f"Backend call {name} did not answer within {self.timeout}s, probe worker replaced")
+                raise ProbeTimeout(f"{name} timed out after {self.timeout}s")
+            status, value = self._conn.recv()
+        if status == 'error':
+            raise value
+        return value
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return lambda *args: self.call(name, *args)
+
+    def close(self):
+        with self._lock:
+            self._kill_worker()
@@ -0,0 +1,462 @@
+"""
+Desktop Backend - Process, window, message and registry access for the tray helper
+
+Win32Backend talks to the real desktop through ctypes, winreg and tasklist.
+RegistryHive reads and writes NotifyIconSettings in one user's hive, the
+current user's or another logged-on user's under HKEY_USERS. SimulatedDesktop
+is a deterministic in-memory stand-in so the hot paths can be benchmarked and
+regression-tested off Windows.
+"""
+
+import csv
+import time
+import ctypes
+import logging
+import threading
+import subprocess
+from collections import deque
+
+try:
+    import winreg
+except ImportError:  # Not on Windows, only the simulated desktop is usable
+    winreg = None
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_ICON_SETTINGS = r"Control Panel\NotifyIconSettings"
+
+HWND_BROADCAST = 0xFFFF
+
+TH32CS_SNAPPROCESS = 0x00000002
+SYNCHRONIZE = 0x00100000
+WAIT_TIMEOUT = 0x00000102
+MAXIMUM_WAIT_OBJECTS = 64
+SMTO_ABORTIFHUNG = 0x0002
+
+# Longest a window may take to handle a sent message, a hung one would otherwise block the cycle for good
+SEND_MESSAGE_TIMEOUT_MS = 2000
+
+# Session the simulated desktop puts processes in unless told otherwise
+DEFAULT_SESSION_ID = 1
+
+def _run_hidden(args):
+    """Run a console command without flashing a window, returns stdout"""
+    # Hide console window for subprocess
+    startupinfo = subprocess.STARTUPINFO()
+    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    startupinfo.wShowWindow = subprocess.SW_HIDE
+
+    result = subprocess.run(
+        args,
+        capture_output=True,
+        text=True,
+        check=True,
+        startupinfo=startupinfo,
+        creationflags=subprocess.CREATE_NO_WINDOW
+    )
+    return result.stdout
+
+class Win32Backend:
+    """Backend for the real Windows desktop"""
+
+    def __init__(self):
+        from ctypes import wintypes
+
+        self.user32 = ctypes.windll.user32
+        self.kernel32 = ctypes.windll.kernel32
+        self.kernel32.CreateToolhelp32Snapshot.restype = wintypes.HANDLE
+        self.kernel32.OpenProcess.restype = wintypes.HANDLE
+        self.user32.SendMessageTimeoutW.argtypes = [wintypes.HWND, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM,
+                                                    wintypes.UINT, wintypes.UINT, ctypes.POINTER(ctypes.c_size_t)]
+        self.user32.SendMessageTimeoutW.restype = wintypes.LPARAM
+        self._enum_proc_type = ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HWND, wintypes.LPARAM)
+        self._message_ids = {}
+        self.hive = RegistryHive()
+
+        class PROCESSENTRY32W(ctypes.Structure):
+            _fields_ = [
+                ("dwSize", wintypes.DWORD),
+                ("cntUsage", wintypes.DWORD),
+                ("th32ProcessID", wintypes.DWORD),
+                ("th32DefaultHeapID", ctypes.c_size_t),
+                ("th32ModuleID", wintypes.DWORD),
+                ("cntThreads", wintypes.DWORD),
+                ("th32ParentProcessID", wintypes.DWORD),
+                ("pcPriClassBase", wintypes.LONG),
+                ("dwFlags", wintypes.DWORD),
+                ("szExeFile", wintypes.WCHAR * 260),
+            ]
+
+        self._process_entry_type = PROCESSENTRY32W
+
+    # Processes
+
+    def list_processes(self):
+        """Return the image names of all running processes (one per process)"""
+        output = _run_hidden(['tasklist', '/FO', 'CSV', '/NH'])
+        return [row[0] for row in csv.reader(output.splitlines()) if row]
+
+    def list_session_processes(self):
+        """Return (session_id, image_name) for all running processes in every session"""
+        output = _run_hidden(['tasklist', '/FO', 'CSV', '/NH'])
+        # Columns: image name, PID, session name, session number, memory usage
+        return [(int(row[3]), row[0]) for row in csv.reader(output.splitlines()) if len(row) > 3]
+
+    def list_process_entries(self):
+        """Return (pid, image_name) for all running processes via a Toolhelp32 snapshot, no subprocess"""
+        snapshot = self.kernel32.CreateToolhelp32Snapshot(TH32CS_SNAPPROCESS, 0)
+        if not snapshot or snapshot == ctypes.c_void_p(-1).value:
+            raise ctypes.WinError()
+        try:
+            entry = self._process_entry_type()
+            entry.dwSize = ctypes.sizeof(entry)
+            entries = []
+            ok = self.kernel32.Process32FirstW(snapshot, ctypes.byref(entry))
+            while ok:
+                entries.append((entry.th32ProcessID, entry.szExeFile))
+                ok = self.kernel32.Process32NextW(snapshot, ctypes.byref(entry))
+            return entries
+        finally:
+            self.kernel32.CloseHandle(snapshot)
+
+    def wait_for_process_exit(self, pids, timeout):
+        """Block until one of `pids` exits or `timeout` seconds pass, True if one exited"""
+        handles = [h for h in (self.kernel32.OpenProcess(SYNCHRONIZE, False, pid)
+                               for pid in pids[:MAXIMUM_WAIT_OBJECTS]) if h]
+        if not handles:
+            return False
+        try:
+            array = (ctypes.c_void_p * len(handles))(*handles)
+            result = self.kernel32.WaitForMultipleObjects(len(handles), array, False, int(timeout * 1000))
+            return result != WAIT_TIMEOUT
+        finally:
+            for handle in handles:
+                self.kernel32.CloseHandle(handle)
+
+    # Windows
+
+    def get_window_class(self, hwnd):
+        class_name = ctypes.create_unicode_buffer(256)
+        self.user32.GetClassNameW(hwnd, class_name, 256)
+        return class_name.value
+
+    def get_window_title(self, hwnd):
+        title_length = self.user32.GetWindowTextLengthW(hwnd)
+        if title_length <= 0:
+            return ""
+        title = ctypes.create_unicode_buffer(title_length + 1)
+        self.user32.GetWindowTextW(hwnd, title, title_length + 1)
+        return title.value
+
+    def enum_windows(self):
+        """Return (hwnd, class_name, title) for every top-level window"""
+        windows = []
+
+        def enum_windows_proc(hwnd, lparam):
+            windows.append((hwnd, self.get_window_class(hwnd), self.get_window_title(hwnd)))
+            return True
+
+        self.user32.EnumWindows(self._enum_proc_type(enum_windows_proc), 0)
+        return windows
+
+    def find_window(self, class_name, title=None):
+        return self.user32.FindWindowW(class_name, title)
+
+    def find_window_ex(self, parent, child_after, class_name):
+        return self.user32.FindWindowExW(parent, child_after, class_name, None)
+
+    def is_window(self, hwnd):
+        return bool(self.user32.IsWindow(hwnd))
+
+    def register_window_message(self, name):
+        message_id = self._message_ids.get(name)
+        if message_id is None:
+            message_id = self._message_ids[name] = self.user32.RegisterWindowMessageW(name)
+        return message_id
+
+    def send_message(self, hwnd, msg, wparam, lparam):
+        """SendMessage that gives up on hung windows and after SEND_MESSAGE_TIMEOUT_MS, returning 0"""
+        result = ctypes.c_size_t()
+        if not self.user32.SendMessageTimeoutW(hwnd, msg, wparam, lparam, SMTO_ABORTIFHUNG,
+                                               SEND_MESSAGE_TIMEOUT_MS, ctypes.byref(result)):
+            logger.debug(f"Message {msg:#x} to window {hwnd:#x} not answered within {SEND_MESSAGE_TIMEOUT_MS} ms")
+            return 0
+        return result.value
+
+    def invalidate_rect(self, hwnd):
+        return self.user32.InvalidateRect(hwnd, None, True)
+
+    def update_window(self, hwnd):
+        return self.user32.UpdateWindow(hwnd)
+
+    # Registry (HKCU\Control Panel\NotifyIconSettings)
+
+    def enum_notify_icon_keys(self):
+        return self.hive.enum_notify_icon_keys()
+
+    def get_notify_icon_value(self, subkey, name):
+        return self.hive.get_notify_icon_value(subkey, name)
+
+    def get_notify_icon_values(self, subkey):
+        return self.hive.get_notify_icon_values(subkey)
+
+    def set_notify_icon_value(self, subkey, name, value):
+        return self.hive.set_notify_icon_value(subkey, name, value)
+
+class RegistryHive:
+    """NotifyIconSettings of one user, below `root`\\`path`"""
+
+    def __init__(self, root=None, path=NOTIFY_ICON_SETTINGS):
+        self.root = winreg.HKEY_CURRENT_USER if root is None else root
+        self.path = path
+
+    def enum_notify_icon_keys(self):
+        """Return the names of all NotifyIconSettings subkeys"""
+        names = []
+        with winreg.OpenKey(self.root, self.path) as main_key:
+            i = 0
+            while True:
+                try:
+                    names.append(winreg.EnumKey(main_key, i))
+                except OSError:
+                    break
+                i += 1
+        return names
+
+    def get_notify_icon_value(self, subkey, name):
+        """Return a value from a NotifyIconSettings subkey, or None if it is missing"""
+        with winreg.OpenKey(self.root, f"{self.path}\\{subkey}") as key:
+            try:
+                return winreg.QueryValueEx(key, name)[0]
+            except FileNotFoundError:
+                return None
+
+    def get_notify_icon_values(self, subkey):
+        """Return every value of a NotifyIconSettings subkey as a dict"""
+        values = {}
+        with winreg.OpenKey(self.root, f"{self.path}\\{subkey}") as key:
+            for j in range(winreg.QueryInfoKey(key)[1]):
+                value_name, value_data, value_type = winreg.EnumValue(key, j)
+                values[value_name] = value_data
+        return values
+
+    def set_notify_icon_value(self, subkey, name, value):
+        """Write a DWORD value to a NotifyIconSettings subkey"""
+        with winreg.OpenKey(self.root, f"{self.path}\\{subkey}", 0, winreg.KEY_SET_VALUE) as key:
+            winreg.SetValueEx(key, name, 0, winreg.REG_DWORD, value)
+
+def user_hive(sid):
+    """NotifyIconSettings in a logged-on user's hive (HKEY_USERS\\<SID>), writing needs admin rights"""
+    return RegistryHive(winreg.HKEY_USERS, f"{sid}\\{NOTIFY_ICON_SETTINGS}")
+
+class SimulatedWindow:
+    __slots__ = ('hwnd', 'class_name', 'title', 'parent')
+
+    def __init__(self, hwnd, class_name, title, parent):
+        self.hwnd = hwnd
+        self.class_name = class_name
+        self.title = title
+        self.parent = parent
+
+class SimulatedDesktop:
+    """Deterministic in-memory desktop: processes, windows, registry and a message sink.
+
+    ``message_latency`` and ``broadcast_latency`` (seconds) are slept on every
+    send, so injected delays show up in timings like a slow window would.
+    """
+
+    def __init__(self, message_latency=0.0, broadcast_latency=None, registry_latency=0.0,
+                 sink_size=1000, sleep=time.sleep):
+        self.processes = []
+        self.process_sessions = []
+        self.windows = {}
+        self.notify_icons = {}
+        self.message_latency = message_latency
+        self.broadcast_latency = message_latency if broadcast_latency is None else broadcast_latency
+        self.registry_latency = registry_latency
+        self.sleep = sleep
+        # Most recent sends and writes, plus running totals
+        self.sent_messages = deque(maxlen=sink_size)
+        self.registry_writes = deque(maxlen=sink_size)
+        self.message_count = 0
+        self.registry_write_count = 0
+        self._next_hwnd = 0x10000
+        self._message_ids = {}
+        self._released = threading.Event()
+        self._hung = []
+
+    # Builders
+
+    def add_process(self, image_name, session_id=DEFAULT_SESSION_ID):
+        self.processes.append(image_name)
+        self.process_sessions.append(session_id)
+
+    def remove_process(self, image_name):
+        kept = [(p, s) for p, s in zip(self.processes, self.process_sessions) if p.lower() != image_name.lower()]
+        self.processes = [p for p, _ in kept]
+        self.process_sessions = [s for _, s in kept]
+
+    def add_window(self, class_name, title="", parent=None, hwnd=None):
+        if hwnd is None:
+            hwnd = self._next_hwnd
+        self._next_hwnd = max(self._next_hwnd, hwnd) + 4
+        self.windows[hwnd] = SimulatedWindow(hwnd, class_name, title, parent)
+        return hwnd
+
+    def remove_window(self, hwnd):
+        self.windows.pop(hwnd, None)
+        for child in [w.hwnd for w in self.windows.values() if w.parent == hwnd]:
+            self.remove_window(child)
+
+    def add_notify_icon(self, subkey, **values):
+        self.notify_icons[subkey] = dict(values)
+
+    def add_shell_tray(self, overflow=True, monitors=1):
+        """Add the stock Shell_TrayWnd/TrayNotifyWnd pair, optionally the overflow window, and
+        a secondary taskbar for every monitor after the first"""
+        tray = self.add_window("Shell_TrayWnd")
+        self.add_window("TrayNotifyWnd", parent=tray)
+        if overflow:
+            self.add_window("NotifyIconOverflowWindow")
+        for _ in range(monitors - 1):
+            self.add_secondary_tray()
+        return tray
+
+    def add_secondary_tray(self, notify_area=False):
+        """Add a secondary monitor's taskbar, with its own notification area if `notify_area`"""
+        tray = self.add_window("Shell_SecondaryTrayWnd")
+        if notify_area:
+            self.add_window("TrayNotifyWnd", parent=tray)
+        return tray
+
+    def demote(self, match='discord'):
+        """Clear IsPromoted on every registry entry whose key contains `match`"""
+        for subkey, values in self.notify_icons.items():
+            if match in subkey.lower():
+                values['IsPromoted'] = 0
+
+    def hang(self, method):
+        """Make calls to `method` block until release(), like a hung window or registry handle"""
+        self._released.clear()
+        if method in self._hung:
+            return
+        original = getattr(self, method)
+
+        def hung(*args):
+            self._released.wait()
+            return original(*args)
+
+        setattr(self, method, hung)
+        self._hung.append(method)
+
+    def release(self):
+        """Unblock hung calls and restore every hung method"""
+        self._released.set()
+        for method in self._hung:
+            delattr(self, method)
+        self._hung = []
+
+    @classmethod
+    def generate(cls, processes=200, windows=300, registry_keys=100, discord=True,
+                 promoted=False, startallback=False, monitors=1, **kwargs):
+        """Build a desktop of the given size with one Discord install on it"""
+        desktop = cls(**kwargs)
+        desktop.add_shell_tray(monitors=monitors)
+        if startallback:
+            desktop.add_window("StartAllBack_TrayWnd")
+
+        for i in range(processes):
+            desktop.add_process(f"process{i}.exe")
+        for i in range(windows):
+            desktop.add_window(f"AppWindowClass{i % 50}", f"Window {i}")
+        for i in range(registry_keys):
+            desktop.add_notify_icon(f"{1000000 + i}", ExecutablePath=f"C:\\Apps\\app{i}.exe", IsPromoted=i % 2)
+
+        if discord:
+            desktop.add_process("Discord.exe")
+            desktop.add_process("Discord.exe")
+            desktop.add_window("Chrome_WidgetWin_1", "#general | Friends - Discord")
+            desktop.add_notify_icon("Discord.exe_7654321",
+                                    ExecutablePath=r"C:\Users\user\AppData\Local\Discord\app-1.0.9\Discord.exe",
+                                    IsPromoted=1 if promoted else 0)
+        return desktop
+
+    # Processes
+
+    def list_processes(self):
+        return list(self.processes)
+
+    def list_process_entries(self):
+        return [(4 * (i + 1), image_name) for i, image_name in enumerate(self.processes)]
+
+    def list_session_processes(self):
+        return list(zip(self.process_sessions, self.processes))
+
+    # Windows
+
+    def enum_windows(self):
+        return [(w.hwnd, w.class_name, w.title) for w in self.windows.values() if w.parent is None]
+
+    def find_window(self, class_name, title=None):
+        for w in self.windows.values():
+            if w.parent is None and w.class_name == class_name and (title is None or w.title == title):
+                return w.hwnd
+        return 0
+
+    def find_window_ex(self, parent, child_after, class_name):
+        seen_after = not child_after
+        for w in self.windows.values():
+            if not seen_after:
+                seen_after = w.hwnd == child_after
+                continue
+            if w.parent == (parent or None) and (class_name is None or w.class_name == class_name):
+                return w.hwnd
+        return 0
+
+    def is_window(self, hwnd):
+        return hwnd in self.windows
+
+    def register_window_message(self, name):
+        return self._message_ids.setdefault(name, 0xC000 + len(self._message_ids))
+
+    def send_message(self, hwnd, msg, wparam, lparam):
+        latency = self.broadcast_latency if hwnd == HWND_BROADCAST else self.message_latency
+        if latency:
+            self.sleep(latency)
+        self.sent_messages.append((hwnd, msg, wparam, lparam))
+        self.message_count += 1
+        return 1 if hwnd == HWND_BROADCAST or hwnd in self.windows else 0
+
+    def invalidate_rect(self, hwnd):
+        return 1 if hwnd in self.windows else 0
+
+    def update_window(self, hwnd):
+        return 1 if hwnd in self.windows else 0
+
+    # Registry
+
+    def _registry_delay(self):
+        if self.registry_latency:
+            self.sleep(self.registry_latency)
+
+    def enum_notify_icon_keys(self):
+        self._registry_delay()
+        return list(self.notify_icons)
+
+    def _open(self, subkey):
+        try:
+            return self.notify_icons[subkey]
+        except KeyError:
+            raise FileNotFoundError(f"Registry key not found: {subkey}")
+
+    def get_notify_icon_value(self, subkey, name):
+        return self._open(subkey).get(name)
+
+    def get_notify_icon_values(self, subkey):
+        return dict(self._open(subkey))
+
+    def set_notify_icon_value(self, subkey, name, value):
+        self._registry_delay()
+        self._open(subkey)[name] = value
+        self.registry_writes.append((subkey, name, value))
+        self.registry_write_count += 1
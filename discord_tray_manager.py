@@ -10,44 +10,166 @@ import threading
 import logging
 import json
 import os
+import argparse
+import multiprocessing
+import tracemalloc
 from datetime import datetime
 import ctypes
 from ctypes import wintypes
-import winreg
 import sys
-from tray_icon_helper import TrayIconManager, refresh_notification_area, is_discord_running, get_discord_processes
+from tray_icon_helper import (TrayIconManager, refresh_notification_area, is_discord_running, get_discord_processes,
+                              FIX_STRATEGIES, STRATEGY_CONFLICTS)
+from desktop_backend import Win32Backend, SimulatedDesktop, user_hive
+from monitor_core import (Snapshot, MonitorState, INITIAL_STATE, DEFAULT_MAX_FAILURES, ACTION_FIX, ACTION_SUPPRESSED,
+                          ACTION_BACKOFF, decide, apply_fix_result)
+from cycle_metrics import (CycleMetrics, TimedFileHandler, StatsFileWriter, StatsServer,
+                           STAGE_CYCLE)
+from cycle_profiler import profile_cycles
+from memory_report import report_memory, TRACE_FRAMES
+from cycle_tracer import CycleTracer, NULL_TRACER, traced
+from cycle_budget import CycleBudget, NULL_BUDGET, BUDGET_CALL_SCAN
+from cycle_watchdog import Heartbeat, CycleWatchdog, IsolatedBackend
+from state_cache import load_state_cache, save_state_cache
+from shell_events import ShellEventWindow, FakeShellEvents, EVENT_TASKBAR_CREATED, EVENT_DISPLAY_CHANGED
+from process_watcher import ProcessWatcher, EVENT_PROCESS_STARTED
+from tray_status import STATUS_NOT_RUNNING, STATUS_TEXT, TARGET_STATUS_TEXT
+from call_burst import CallDetector, BurstSchedule, DEFAULT_CALL_TITLE_PATTERNS
+from target_profiles import ProfileMatcher, CycleSnapshot, load_profiles
+from tray_topology import TopologyCache
+from fix_runner import ConcurrentFixRunner
+from power_schedule import PowerSchedule
+from trigger_coalescer import TriggerCoalescer, describe_batch, MAX_DELAY_WINDOWS
+from control_channel import (ControlServer, control_address, load_authkey, send_command, CONTROL_COMMANDS,
+                             COMMAND_STATUS, COMMAND_CHECK_NOW, COMMAND_RELOAD_CONFIG, COMMAND_METRICS, COMMAND_STOP)
+from session_monitor import SessionMonitor, SessionInfo, FakeSessionSource, WtsSessionSource
+from state_trace import TraceRecorder, replay_trace
+from shadow_mode import cost_strategies, describe_op, log_shadow_report, format_shadow_summary
+from log_analyzer import analyze_log, format_report, DEFAULT_WORKERS
+from change_events import EventBus, SnapshotDiffer, log_change_event, EVENT_STATUS_CHANGED, EVENT_TRAY_RECREATED
 
 # Import our helper module
 # (TrayIconManager already imported above)
 
-# Get user's AppData directory for log file
+# Get user's AppData directory for application files
+def get_app_data_dir():
+    """Get the application's folder in the user's AppData directory"""
+    # Outside Windows (simulated desktop runs) fall back to ~/.local/share
+    local_appdata = os.environ.get('LOCALAPPDATA') or os.path.expanduser(os.path.join('~', '.local', 'share'))
+    appdata_dir = os.path.join(local_appdata, 'Discord Tray Manager')
+    os.makedirs(appdata_dir, exist_ok=True)
+    return appdata_dir
+
 def get_log_file_path():
     """Get the appropriate log file path in user's AppData directory"""
-    appdata_dir = os.path.expandvars(r'%LOCALAPPDATA%\Discord Tray Manager')
-    os.makedirs(appdata_dir, exist_ok=True)
-    return os.path.join(appdata_dir, 'discord_tray_manager.log')
+    return os.path.join(get_app_data_dir(), 'discord_tray_manager.log')
+
+def get_trace_file_path():
+    """Get the Chrome trace export path in user's AppData directory"""
+    return os.path.join(get_app_data_dir(), 'discord_tray_manager_trace.json')
+
+def get_recording_file_path():
+    """Get the cycle state recording path in user's AppData directory"""
+    return os.path.join(get_app_data_dir(), 'discord_tray_manager_cycles.jsonl')
+
+def get_state_cache_path():
+    """Get the warm-start state cache path in user's AppData directory"""
+    return os.path.join(get_app_data_dir(), 'discord_tray_manager_state.json')
+
+def get_log_report_path():
+    """Get the log analysis report path in user's AppData directory"""
+    return os.path.join(get_app_data_dir(), 'discord_tray_manager_report.txt')
+
+def get_stats_file_path():
+    """Get the Prometheus-style stats file path in user's AppData directory"""
+    return os.path.join(get_app_data_dir(), 'discord_tray_manager.prom')
 
 # Setup logging
-def setup_logging(log_level):
+def setup_logging(log_level, metrics=None):
     """Set up logging configuration"""
     log_file_path = get_log_file_path()
     
+    file_handler = TimedFileHandler(log_file_path, metrics) if metrics else logging.FileHandler(log_file_path)
+    
     logging.basicConfig(
         level=getattr(logging, log_level.upper()),
         format='%(asctime)s - %(levelname)s - %(message)s',
         handlers=[
-            logging.FileHandler(log_file_path),
+            file_handler,
             logging.StreamHandler()
         ]
     )
 
 logger = logging.getLogger(__name__)
 
+# Cycles an extra target's fixes are paused for after repeated failures
+TARGET_BACKOFF_CYCLES = 3
+
+# Abandoned monitor threads allowed to stay stuck before a hung cycle is left running instead of replaced
+MAX_HUNG_THREADS = 3
+
+# Check intervals between call title scans unless call_scan_interval says otherwise, the
+# scan is a full window enumeration so it must not run on every steady cycle
+CALL_SCAN_CHECKS = 10
+
 class DiscordTrayManager:
-    def __init__(self, config_path='config.json'):
+    def __init__(self, config_path='config.json', backend=None):
+        self.metrics = CycleMetrics()
+        self.config_path = config_path
         self.load_config(config_path)
         self.running = True
-        self.tray_manager = TrayIconManager()
+        if backend is None:
+            backend = IsolatedBackend(Win32Backend, self.probe_timeout, self.metrics) if self.isolate_probes else Win32Backend()
+        self.backend = backend
+        self.tracer = CycleTracer(self.trace_buffer_size) if self.enable_tracing else NULL_TRACER
+        self.budget = CycleBudget(self.cycle_budget_ms / 1000, self.metrics) if self.cycle_budget_ms else NULL_BUDGET
+        self.shared = None
+        self.topology = TopologyCache(self.metrics)
+        self.tray_manager = self.create_tray_manager()
+        self.target_managers = []
+        self.target_states = {}
+        self.target_backoff = {}
+        self.set_targets(self.targets)
+        self.status = None
+        self.events = EventBus(self.metrics, self.event_queue_size)
+        self.differ = SnapshotDiffer(self.events)
+        self.stats_exporters = []
+        self.state = INITIAL_STATE
+        self.max_failures = DEFAULT_MAX_FAILURES
+        self.backoff_pending = False
+        self.recorder = None
+        self.heartbeat = Heartbeat()
+        self.watchdog = None
+        self.hang_count = 0
+        self.generation = 0
+        self.monitor_thread = None
+        self.hung_threads = []
+        self.stopped = threading.Event()
+        self._stop_lock = threading.Lock()
+        self.cache_path = None
+        self.first_cycle = True
+        self.event_source = None
+        self.wake = threading.Event()
+        # Triggers arriving together share one check
+        self.triggers = TriggerCoalescer(self.trigger_coalesce_window, metrics=self.metrics)
+        self.reload_pending = False
+        self.process_watcher = None
+        self.discord_process_count = 0
+        self.call_detector = CallDetector(self.call_title_patterns, self.call_process_delta)
+        self.burst = (BurstSchedule(self.check_interval, self.burst_interval, self.burst_max_cycles, self.metrics)
+                      if self.burst_on_call else None)
+        # The first title scan waits a full interval, so startup is not slowed by an extra window enumeration
+        self.last_call_scan = time.monotonic()
+        self.seen_discord_windows = None
+        self.session_monitor = self.create_session_monitor() if self.multi_session else None
+        self.power = (PowerSchedule(self.hidden_check_interval, self.battery_interval_factor, not self.multi_session,
+                                    self.metrics) if self.power_aware else None)
+        
+    def set_status(self, status):
+        """Record the monitor state and publish it when it changes"""
+        if status == self.status:
+            return
+        self.events.publish(EVENT_STATUS_CHANGED, old=self.status, new=status)
+        self.status = status
         
     def load_config(self, config_path):
         """Load configuration from JSON file"""
@@ -62,10 +184,39 @@ class DiscordTrayManager:
             self.enable_window_simulation = config.get('enable_window_simulation', False)
             self.enable_registry_check = config.get('enable_registry_check', False)
             self.startup_delay = config.get('startup_delay', 5)
+            self.stats_file = config.get('stats_file', False)
+            self.stats_interval = config.get('stats_interval', 30)
+            self.stats_port = config.get('stats_port', 0)
+            self.enable_tracing = config.get('enable_tracing', False)
+            self.trace_buffer_size = config.get('trace_buffer_size', 20000)
+            self.record_cycles = config.get('record_cycles', False)
+            self.shadow_mode = config.get('shadow_mode', False)
+            self.cycle_budget_ms = config.get('cycle_budget_ms', 2000)
+            self.watchdog_timeout = config.get('watchdog_timeout', 120)
+            self.isolate_probes = config.get('isolate_probes', False)
+            self.probe_timeout = config.get('probe_timeout', 10)
+            self.state_cache = config.get('state_cache', True)
+            self.watch_taskbar = config.get('watch_taskbar', True)
+            self.watch_processes = config.get('watch_processes', True)
+            self.process_watch_interval = config.get('process_watch_interval', 5)
+            self.burst_on_call = config.get('burst_on_call', True)
+            self.burst_interval = config.get('burst_interval', 5)
+            self.burst_max_cycles = config.get('burst_max_cycles', 360)
+            self.call_scan_interval = config.get('call_scan_interval', self.check_interval * CALL_SCAN_CHECKS)
+            self.call_title_patterns = config.get('call_title_patterns', DEFAULT_CALL_TITLE_PATTERNS)
+            self.call_process_delta = config.get('call_process_delta', 2)
+            self.targets = config.get('targets', [])
+            self.multi_session = config.get('multi_session', False)
+            self.event_queue_size = config.get('event_queue_size', 256)
+            self.concurrent_fixes = config.get('concurrent_fixes', False)
+            self.power_aware = config.get('power_aware', True)
+            self.hidden_check_interval = config.get('hidden_check_interval', 0)
+            self.battery_interval_factor = config.get('battery_interval_factor', 2)
+            self.trigger_coalesce_window = config.get('trigger_coalesce_window', 0.5)
             
             # Setup logging with config level
-            log_level = config.get('log_level', 'INFO')
-            setup_logging(log_level)
+            self.log_level = log_level = config.get('log_level', 'INFO')
+            setup_logging(log_level, self.metrics)
             
             logger.info(f"Loaded configuration from {config_path}")
             
@@ -85,56 +236,113 @@ class DiscordTrayManager:
         self.enable_window_simulation = False
         self.enable_registry_check = False
         self.startup_delay = 5
-        setup_logging('INFO')
+        self.stats_file = False
+        self.stats_interval = 30
+        self.stats_port = 0
+        self.enable_tracing = False
+        self.trace_buffer_size = 20000
+        self.record_cycles = False
+        self.shadow_mode = False
+        self.cycle_budget_ms = 2000
+        self.watchdog_timeout = 120
+        self.isolate_probes = False
+        self.probe_timeout = 10
+        self.state_cache = True
+        self.watch_taskbar = True
+        self.watch_processes = True
+        self.process_watch_interval = 5
+        self.burst_on_call = True
+        self.burst_interval = 5
+        self.burst_max_cycles = 360
+        self.call_scan_interval = self.check_interval * CALL_SCAN_CHECKS
+        self.call_title_patterns = DEFAULT_CALL_TITLE_PATTERNS
+        self.call_process_delta = 2
+        self.targets = []
+        self.multi_session = False
+        self.event_queue_size = 256
+        self.concurrent_fixes = False
+        self.power_aware = True
+        self.hidden_check_interval = 0
+        self.battery_interval_factor = 2
+        self.trigger_coalesce_window = 0.5
+        self.log_level = 'INFO'
+        setup_logging('INFO', self.metrics)
         
+    def create_tray_manager(self, profile=None):
+        """TrayIconManager for one target, sharing this monitor's backend and instrumentation"""
+        tray_manager = TrayIconManager(self.backend, profile)
+        tray_manager.metrics = self.metrics
+        tray_manager.tracer = self.tracer
+        tray_manager.budget = self.budget
+        tray_manager.shared = self.shared
+        tray_manager.topology = self.topology
+        if self.concurrent_fixes:
+            tray_manager.fix_runner = ConcurrentFixRunner(tray_manager.run_fix_strategy, tray_manager.fix_cancel,
+                                                          STRATEGY_CONFLICTS, self.metrics, len(FIX_STRATEGIES),
+                                                          tray_manager.is_promoted_now)
+        return tray_manager
+
+    def set_targets(self, targets):
+        """Build the target profiles: Discord plus one TrayIconManager per extra app, all on one snapshot"""
+        self.targets = targets
+        profiles = load_profiles(self.discord_processes, targets)
+        self.shared = CycleSnapshot(self.backend, ProfileMatcher(profiles), self.metrics)
+        self.tray_manager.profile = profiles[0]
+        self.tray_manager.shared = self.shared
+        self.target_managers = [self.create_tray_manager(profile) for profile in profiles[1:]]
+        self.target_states = {profile.name: self.target_states.get(profile.name, INITIAL_STATE)
+                              for profile in profiles[1:]}
+        if self.target_managers:
+            logger.info(f"Also keeping visible: {', '.join(p.name for p in profiles[1:])}")
+
+    def set_backend(self, backend):
+        """Point the monitor, every target and the shared snapshot at another backend"""
+        self.backend = self.shared.backend = backend
+        for tray_manager in [self.tray_manager] + self.target_managers:
+            tray_manager.backend = backend
+
+    @traced
     def is_discord_running(self):
         """Check if any Discord process is currently running"""
         try:
-            # Hide console window for subprocess
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            startupinfo.wShowWindow = subprocess.SW_HIDE
+            # Counted for every target in the same pass over the process list
+            process_counts = self.shared.process_counts()
             
-            result = subprocess.run(
-                ['tasklist', '/FO', 'CSV'], 
-                capture_output=True, 
-                text=True, 
-                check=True,
-                startupinfo=startupinfo,
-                creationflags=subprocess.CREATE_NO_WINDOW
-            )
-            
-            for process_name in self.discord_processes:
-                if process_name.lower() in result.stdout.lower():
-                    logger.debug(f"Found running Discord process: {process_name}")
-                    return True
-            return False
+            self.discord_process_count = process_counts.get(self.tray_manager.profile.name, 0)
+            if self.discord_process_count:
+                logger.debug(f"Found {self.discord_process_count} running Discord processes")
+            return bool(self.discord_process_count)
         except subprocess.CalledProcessError as e:
             logger.error(f"Error checking running processes: {e}")
             return False
 
+    @traced
     def check_discord_tray_status(self):
-        """Check if Discord icon is properly visible in system tray"""
+        """Detect Discord's process and tray icon state as a Snapshot"""
         if not self.is_discord_running():
             logger.debug("Discord is not running")
-            return False, "Discord not running"
+            return Snapshot(False, False)
         
         # Check if Discord icon is visible in tray
         is_visible = self.tray_manager.is_discord_icon_visible()
         
         if is_visible:
             logger.debug("Discord icon appears to be in system tray")
-            return True, "Icon visible"
         else:
             logger.info("Discord is running but icon may not be visible in tray")
-            return False, "Icon not visible"
+        return Snapshot(True, is_visible)
 
+    @traced
     def fix_discord_tray_icon(self):
         """Attempt to fix Discord tray icon visibility"""
         if not self.enable_auto_fix:
             logger.debug("Auto-fix is disabled")
+            self.metrics.increment('suppressed_actions')
             return False
         
+        if self.shadow_mode:
+            return self.shadow_fix()
+        
         logger.info("Attempting to fix Discord tray icon...")
         
         success = False
@@ -153,45 +361,448 @@ class DiscordTrayManager:
                 success = True
                 logger.info("Successfully simulated Discord tray action")
         
+        self.metrics.increment('fixes' if success else 'fix_failures')
+        return success
+
+    def shadow_fix(self):
+        """Plan and time every fix strategy without performing any of them"""
+        logger.info("Shadow mode: costing fix strategies, no changes will be made...")
+        results = cost_strategies(self.tray_manager)
+        log_shadow_report(results)
+        self.metrics.increment('shadow_fixes')
+        return False
+
+    def start_stats_exporters(self):
+        """Start the stats file writer and/or localhost stats endpoint"""
+        if self.stats_file:
+            writer = StatsFileWriter(self.metrics, get_stats_file_path(), self.stats_interval)
+            writer.start()
+            self.stats_exporters.append(writer)
+        
+        if self.stats_port:
+            try:
+                server = StatsServer(self.metrics, self.stats_port)
+                server.start()
+                self.stats_exporters.append(server)
+            except OSError as e:
+                logger.error(f"Could not start stats endpoint on port {self.stats_port}: {e}")
+
+    def start_shell_events(self):
+        """Listen for taskbar restarts, display changes and session/power signals"""
+        if self.event_source is None:
+            self.event_source = ShellEventWindow() if sys.platform == 'win32' else FakeShellEvents()
+        self.event_source.start(self.on_shell_event)
+
+    def on_shell_event(self, event):
+        """React to a shell event, called on the event source's thread"""
+        if event == EVENT_TASKBAR_CREATED:
+            logger.info("Taskbar was recreated, checking Discord's tray icon now")
+            self.metrics.increment('taskbar_restarts')
+            self.events.publish(EVENT_TRAY_RECREATED)
+            self.tray_manager.forget_window_handles()
+            self.request_check('taskbar recreated')
+        elif event == EVENT_DISPLAY_CHANGED:
+            # Secondary taskbars come and go with monitors, and icons can move between them
+            logger.info("Displays changed, looking the tray up again")
+            self.metrics.increment('display_changes')
+            self.tray_manager.forget_window_handles('display changed')
+            self.request_check('display changed')
+        elif self.power:
+            self.on_power_event(event)
+
+    def on_power_event(self, event):
+        """Apply a session or power signal, checking at once when the tray can be seen again"""
+        was_visible = self.power.visible()
+        woke = self.power.handle(event)
+        visible = self.power.visible()
+        if self.process_watcher and visible != was_visible:
+            # Discord starting behind a locked screen can wait for the check on unlock
+            if visible:
+                self.process_watcher.resume()
+            else:
+                self.process_watcher.pause()
+        if woke:
+            self.request_check(f"tray visible again ({event.replace('_', ' ')})")
+
+    def control_commands(self):
+        """Control channel handlers, all answered from state the monitor already holds"""
+        return {
+            COMMAND_STATUS: self.control_status,
+            COMMAND_CHECK_NOW: self.control_check_now,
+            COMMAND_RELOAD_CONFIG: self.reload_config,
+            COMMAND_METRICS: self.metrics.snapshot,
+            COMMAND_STOP: self.control_stop,
+        }
+
+    def control_status(self):
+        last_beat = self.heartbeat.last_beat
+        status = {
+            'pid': os.getpid(),
+            'status': self.status,
+            'status_text': STATUS_TEXT.get(self.status, self.status),
+            'discord_running': self.differ.running,
+            'discord_processes': self.discord_process_count,
+            'consecutive_failures': self.state.consecutive_failures,
+            'cycles': self.heartbeat.cycles,
+            'seconds_since_check': time.monotonic() - last_beat if last_beat is not None else None,
+            'cycle_in_progress_for': self.heartbeat.busy_for(),
+            'targets': {name: state.status for name, state in self.target_states.items()},
+        }
+        if self.power:
+            status['presence'] = self.power.state
+        if self.session_monitor:
+            status['sessions'] = self.session_monitor.status_counts()
+        return status
+
+    def control_check_now(self):
+        self.request_check('requested over the control channel')
+        return {'requested': True}
+
+    def control_stop(self):
+        # Only ends the loop, main() then runs stop() in full before the process exits
+        self.running = False
+        self.wake.set()
+        return {'stopping': True}
+
+    def reload_config(self):
+        """Check the config file parses, then have the monitor thread apply it before its next cycle"""
+        with open(self.config_path, 'r') as f:
+            json.load(f)
+        self.reload_pending = True
+        self.request_check('configuration reloaded')
+        return {'reload': 'scheduled', 'config': os.path.abspath(self.config_path)}
+
+    def apply_config(self):
+        """Re-read the config and update everything that can change without a restart"""
+        self.reload_pending = False
+        self.load_config(self.config_path)
+        logging.getLogger().setLevel(getattr(logging, self.log_level.upper(), logging.INFO))
+        self.set_targets(self.targets)
+        if self.budget.enabled and self.cycle_budget_ms:
+            self.budget.seconds = self.cycle_budget_ms / 1000
+        if self.burst:
+            self.burst.normal_interval = self.check_interval
+            self.burst.burst_interval = self.burst_interval
+            self.burst.max_burst_cycles = self.burst_max_cycles
+        if self.power:
+            self.power.hidden_interval = self.hidden_check_interval
+            self.power.battery_factor = self.battery_interval_factor
+        self.triggers.window = self.trigger_coalesce_window
+        self.triggers.max_delay = self.trigger_coalesce_window * MAX_DELAY_WINDOWS
+        logger.info(f"Configuration reloaded: check_interval={self.check_interval}s, auto_fix={self.enable_auto_fix}")
+
+    def start_process_watcher(self):
+        """Watch Discord start and exit so the loop can sleep while it is not running"""
+        # Process snapshots and handle waits must not go through the isolated worker's single pipe
+        backend = Win32Backend() if isinstance(self.backend, IsolatedBackend) else self.backend
+        self.process_watcher = ProcessWatcher(backend, self.discord_processes, self.on_process_event,
+                                              self.process_watch_interval)
+        if self.power:
+            self.process_watcher.on_poll = self.power.record_wakeup
+            if not self.power.visible():
+                self.process_watcher.pause()
+        self.process_watcher.start()
+
+    def on_process_event(self, event, process_name):
+        """React to Discord starting or exiting, called on the watcher's thread"""
+        self.metrics.increment('discord_starts' if event == EVENT_PROCESS_STARTED else 'discord_exits')
+        self.request_check(f"{process_name} {event}")
+
+    def request_check(self, reason):
+        """Cut the current wait short and run the next cycle once the burst of triggers is over"""
+        self.triggers.trigger(reason)
+        self.wake.set()
+
+    def wait_for_next_cycle(self, seconds):
+        """Sleep between cycles, returns True if woken early by request_check().
+
+        Triggers are held until none has arrived for trigger_coalesce_window
+        seconds, so a burst of them runs one check instead of one each.
+        """
+        deadline = None if seconds is None else time.monotonic() + seconds
+        while self.running:
+            batch = self.triggers.take_due()
+            if batch:
+                logger.info(f"Running an immediate check for {batch.count} trigger(s) after "
+                            f"{batch.waited * 1000:.0f} ms: {describe_batch(batch)}")
+                return True
+            timeout = self.triggers.due_in()
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    # The scheduled check covers whatever is still settling
+                    batch = self.triggers.take()
+                    if batch:
+                        logger.info(f"Scheduled check also covers {batch.count} trigger(s): {describe_batch(batch)}")
+                    return False
+                timeout = remaining if timeout is None else min(timeout, remaining)
+            self.wake.wait(timeout)
+            self.wake.clear()
+        return True
+
+    def start_recording(self, path=None):
+        """Record every cycle's observed inputs and actions to a trace file"""
+        self.recorder = TraceRecorder(self.backend, self.discord_processes, path or get_recording_file_path(),
+                                      self.tray_manager.cache)
+        self.set_backend(self.recorder.backend)
+
+    def load_state_cache(self, path=None):
+        """Start warm from the state cache file and keep it updated from now on"""
+        self.cache_path = path or get_state_cache_path()
+        self.tray_manager.cache = load_state_cache(self.cache_path)
+
+    def save_state_cache(self):
+        """Write the state cache if anything in it changed"""
+        if not self.cache_path or not self.tray_manager.cache.dirty:
+            return
+        try:
+            save_state_cache(self.tray_manager.cache, self.cache_path)
+        except OSError as e:
+            logger.error(f"Could not write state cache {self.cache_path}: {e}")
+
+    def run_cycle(self):
+        """Run a single check-and-fix cycle without sleeping"""
+        self.heartbeat.begin()
+        start = time.perf_counter()
+        try:
+            if self.recorder:
+                self.recorder.begin_cycle()
+                try:
+                    self._run_cycle()
+                finally:
+                    self.recorder.end_cycle()
+            else:
+                self._run_cycle()
+        finally:
+            self.heartbeat.end()
+        
+        elapsed = time.perf_counter() - start
+        if self.burst:
+            self.burst.record_cycle(elapsed)
+        if self.first_cycle:
+            self.first_cycle = False
+            start_type = 'warm' if self.tray_manager.cache.loaded else 'cold'
+            self.metrics.observe(f'first_cycle_{start_type}', elapsed)
+            logger.info(f"First cycle took {elapsed * 1000:.1f} ms ({start_type} start)")
+        self.save_state_cache()
+
+    def create_session_monitor(self):
+        """SessionMonitor over every logged-on user's session, or the one simulated session"""
+        if isinstance(self.backend, SimulatedDesktop):
+            source = FakeSessionSource([SessionInfo(1, 'SIMULATED\\user', 'S-1-5-21-0-0-0-1001')])
+            hive_factory = lambda sid: self.backend
+        else:
+            source = WtsSessionSource()
+            hive_factory = user_hive
+        logger.info("Multi-session mode: checking every logged-on session")
+        return SessionMonitor(source, self.backend, hive_factory, self.tray_manager.profile, self.metrics,
+                              self.enable_auto_fix, self.max_failures)
+
+    def _run_cycle(self):
+        self.budget.start()
+        self.shared.reset()
+        try:
+            with self.metrics.stage(STAGE_CYCLE), self.tracer.span('cycle'):
+                if self.session_monitor:
+                    # The monitor's own session is one of the logged-on sessions
+                    self.state = MonitorState(self.session_monitor.run_cycle(), 0)
+                    self.set_status(self.state.status)
+                    return
+                snapshot = self.check_discord_tray_status()
+                self.differ.update(snapshot.discord_running, promotion=self.tray_manager.promotion_values)
+                self.state, actions = decide(snapshot, self.state, self.enable_auto_fix)
+                if actions:
+                    logger.warning("Discord tray issue detected: Icon not visible")
+                self.set_status(self.state.status)
+                self.execute_actions(actions)
+                if self.burst:
+                    self.update_call_state(snapshot)
+                if self.target_managers:
+                    self.check_targets()
+                # Windows are only known once fixes or call detection enumerated them
+                self.differ.update(snapshot.discord_running,
+                                   windows=self.shared.observed_windows(self.tray_manager.profile.name))
+        finally:
+            self.budget.finish()
+
+    @traced
+    def check_targets(self):
+        """Check and fix every extra target from the snapshot Discord's check already took"""
+        try:
+            process_counts = self.shared.process_counts()
+        except Exception as e:
+            logger.error(f"Error checking target processes: {e}")
+            return
+        
+        for tray_manager in self.target_managers:
+            name = tray_manager.profile.name
+            running = bool(process_counts.get(name))
+            snapshot = Snapshot(running, tray_manager.is_discord_icon_visible() if running else False)
+            previous = self.target_states[name]
+            state, actions = decide(snapshot, previous, self.enable_auto_fix)
+            
+            if ACTION_FIX in actions:
+                if self.target_backoff.get(name):
+                    self.target_backoff[name] -= 1
+                else:
+                    logger.warning(f"{name} tray icon not visible, attempting to fix...")
+                    state, follow_up = apply_fix_result(state, self.fix_target(tray_manager), self.max_failures)
+                    if ACTION_BACKOFF in follow_up:
+                        logger.error(f"Too many consecutive failures fixing {name}, pausing its fixes")
+                        self.target_backoff[name] = TARGET_BACKOFF_CYCLES
+            elif ACTION_SUPPRESSED in actions:
+                self.metrics.increment('suppressed_actions')
+            
+            if state.status != previous.status:
+                logger.info(f"{name}: {TARGET_STATUS_TEXT.get(state.status, state.status)}")
+            self.target_states[name] = state
+
+    def fix_target(self, tray_manager):
+        """Attempt to bring an extra target's tray icon back"""
+        if self.shadow_mode:
+            log_shadow_report(cost_strategies(tray_manager))
+            self.metrics.increment('shadow_fixes')
+            return False
+        
+        success = bool(self.enable_tray_refresh and tray_manager.refresh_notification_area())
+        self.metrics.increment('target_fixes' if success else 'target_fix_failures')
         return success
 
+    def targets_status_text(self):
+        """One line per extra target for the status view"""
+        return '\n'.join(f"{name}: {TARGET_STATUS_TEXT.get(state.status, state.status)}"
+                         for name, state in self.target_states.items())
+
+    def update_call_state(self, snapshot):
+        """Detect a voice call from process counts and Discord window titles"""
+        if snapshot.discord_running:
+            # Titles come from the latest window enumeration, refreshed at most every call_scan_interval
+            now = time.monotonic()
+            if now - self.last_call_scan >= self.call_scan_interval and self.budget.allow(BUDGET_CALL_SCAN):
+                self.last_call_scan = now
+                self.tray_manager.find_discord_windows()
+            if self.tray_manager.discord_windows is not self.seen_discord_windows:
+                self.seen_discord_windows = self.tray_manager.discord_windows
+                self.call_detector.update_windows(self.seen_discord_windows)
+        
+        reasons = self.call_detector.detect(self.discord_process_count if snapshot.discord_running else 0)
+        self.burst.update(reasons)
+
+    def call_status_text(self):
+        """Call state, detected call windows and burst cost for the status view"""
+        if not self.burst:
+            return "Detection disabled"
+        if not self.burst.in_call:
+            return "None"
+        windows = ', '.join(w['title'] for w in self.call_detector.call_windows) or 'detected from processes'
+        return (f"Active ({windows}), {self.burst.burst_cycles} burst checks, "
+                f"{self.burst.burst_seconds * 1000:.0f} ms")
+
+    def execute_actions(self, actions):
+        """Carry out the actions chosen by the decision core"""
+        for action in actions:
+            if action == ACTION_FIX:
+                success = self.fix_discord_tray_icon()
+                if success:
+                    logger.info("Successfully applied fix")
+                else:
+                    failures = self.state.consecutive_failures + 1
+                    logger.warning(f"Fix attempt failed ({failures}/{self.max_failures})")
+                self.state, follow_up = apply_fix_result(self.state, success, self.max_failures)
+                self.set_status(self.state.status)
+                self.execute_actions(follow_up)
+            elif action == ACTION_SUPPRESSED:
+                logger.debug("Auto-fix is disabled, not fixing")
+                self.metrics.increment('suppressed_actions')
+            elif action == ACTION_BACKOFF:
+                logger.error("Too many consecutive failures, taking a break...")
+                self.backoff_pending = True
+
     def monitor_and_fix(self):
         """Main monitoring loop"""
         logger.info("Discord Tray Manager started")
         logger.info(f"Monitoring every {self.check_interval} seconds")
         logger.info(f"Startup delay: {self.startup_delay} seconds")
         
+        self.start_stats_exporters()
+        self.events.listen('log', log_change_event)
+        if self.state_cache:
+            self.load_state_cache()
+        if self.watch_taskbar or self.power:
+            self.start_shell_events()
+        if self.watch_processes:
+            self.start_process_watcher()
+        if self.record_cycles:
+            self.start_recording()
+        
         # Initial startup delay to let system settle
         if self.startup_delay > 0:
             logger.info(f"Waiting {self.startup_delay} seconds before starting monitoring...")
             time.sleep(self.startup_delay)
         
-        consecutive_failures = 0
-        max_failures = 5
+        if not self.watchdog_timeout:
+            self.monitor_loop(self.generation)
+            return
         
+        # Cycles run on a replaceable thread so the watchdog can abandon a hung one
+        self.watchdog = CycleWatchdog(self.heartbeat, self.watchdog_timeout, self.restart_monitor)
+        self.watchdog.start()
+        self.start_monitor_thread()
         while self.running:
             try:
-                is_ok, status = self.check_discord_tray_status()
+                self.stopped.wait(1)
+            except KeyboardInterrupt:
+                logger.info("Received interrupt signal, stopping...")
+                self.running = False
+
+    def start_monitor_thread(self):
+        """Start a fresh monitor loop thread, retiring any previous one"""
+        self.generation += 1
+        self.monitor_thread = threading.Thread(target=self.monitor_loop, args=(self.generation,),
+                                               name=f'monitor-{self.generation}', daemon=True)
+        self.monitor_thread.start()
+
+    def restart_monitor(self):
+        """Abandon the hung monitor thread and carry on with a new one, unless too many are still stuck"""
+        self.hang_count += 1
+        self.metrics.increment('hung_cycles')
+        self.hung_threads = [thread for thread in self.hung_threads if thread.is_alive()]
+        if len(self.hung_threads) >= MAX_HUNG_THREADS:
+            # Another thread would only hang on the same call, this one carries on if its call ever returns
+            logger.error(f"Monitor cycle has been running for {self.heartbeat.busy_for():.0f}s and "
+                         f"{len(self.hung_threads)} abandoned monitors are still stuck, "
+                         f"not starting another (hang #{self.hang_count})")
+            return
+        logger.error(f"Monitor cycle has been running for {self.heartbeat.busy_for():.0f}s, "
+                     f"abandoning it and starting a fresh monitor (hang #{self.hang_count})")
+        self.hung_threads.append(self.monitor_thread)
+        self.start_monitor_thread()
+
+    def monitor_loop(self, generation):
+        """Check and fix every check_interval until stopped or replaced by a newer loop"""
+        while self.running and generation == self.generation:
+            try:
+                if self.reload_pending:
+                    self.apply_config()
+                if self.power:
+                    self.power.record_wakeup()
+                self.run_cycle()
                 
-                if not is_ok and self.is_discord_running():
-                    logger.warning(f"Discord tray issue detected: {status}")
-                    
-                    if self.fix_discord_tray_icon():
-                        logger.info("Successfully applied fix")
-                        consecutive_failures = 0
-                    else:
-                        consecutive_failures += 1
-                        logger.warning(f"Fix attempt failed ({consecutive_failures}/{max_failures})")
-                        
-                        if consecutive_failures >= max_failures:
-                            logger.error("Too many consecutive failures, taking a break...")
-                            time.sleep(self.check_interval * 3)  # Longer pause
-                            consecutive_failures = 0
-                else:
-                    consecutive_failures = 0
+                if self.backoff_pending:
+                    self.backoff_pending = False
+                    if self.wait_for_next_cycle(self.check_interval * 3):  # Longer pause
+                        continue
+                
+                # Nothing can be fixed until Discord starts, so sleep until the watcher says it has.
+                # The watcher only knows Discord's processes, other targets still need their checks
+                if self.process_watcher and self.state.status == STATUS_NOT_RUNNING and not self.target_managers:
+                    logger.debug("Discord is not running, waiting for it to start")
+                    self.wait_for_next_cycle(None)
+                    continue
                 
-                # Wait before next check
-                time.sleep(self.check_interval)
+                # Wait before next check, sooner while a voice call is on, longer or not at all while the tray is unseen
+                interval = self.burst.interval() if self.burst else self.check_interval
+                self.wait_for_next_cycle(self.power.interval(interval) if self.power else interval)
                 
             except KeyboardInterrupt:
                 logger.info("Received interrupt signal, stopping...")
@@ -200,9 +811,48 @@ class DiscordTrayManager:
                 logger.error(f"Unexpected error in monitoring loop: {e}")
                 time.sleep(5)  # Wait before retrying
 
+    def dump_trace(self, path=None):
+        """Write the buffered trace spans as Chrome/Perfetto trace JSON"""
+        if not self.tracer.enabled:
+            logger.warning("Tracing is disabled, set enable_tracing in config.json")
+            return None
+        return self.tracer.dump(path or get_trace_file_path())
+
     def stop(self):
-        """Stop the monitoring"""
+        """Stop the monitoring, a second caller waits until the first has finished"""
+        with self._stop_lock:
+            if self.stopped.is_set():
+                return
+            self._stop()
+
+    def _stop(self):
         self.running = False
+        self.stopped.set()
+        self.wake.set()
+        if self.watchdog:
+            self.watchdog.stop()
+        if self.event_source:
+            self.event_source.stop()
+        if self.process_watcher:
+            self.process_watcher.stop()
+        for tray_manager in [self.tray_manager] + self.target_managers:
+            if tray_manager.fix_runner:
+                tray_manager.fix_runner.close()
+        if self.power:
+            logger.info(self.power.format_report())
+        if self.triggers.batches:
+            logger.info(f"{self.triggers.batches + self.triggers.absorbed} check triggers ran "
+                        f"{self.triggers.batches} checks (largest burst {self.triggers.largest})")
+        self.events.close()
+        for exporter in self.stats_exporters:
+            exporter.stop()
+        self.stats_exporters = []
+        if self.tracer.enabled:
+            self.dump_trace()
+        if self.recorder:
+            self.recorder.close()
+        if isinstance(self.backend, IsolatedBackend):
+            self.backend.close()
         logger.info("Discord Tray Manager stopped")
 
 def check_and_fix_discord_tray():
@@ -241,58 +891,184 @@ def check_and_fix_discord_tray():
     except Exception as e:
         logger.error(f"Error in Discord tray check: {e}")
 
-def main():
+def build_arg_parser():
+    """Command-line options shared by the console and GUI entry points"""
+    parser = argparse.ArgumentParser(description="Keeps Discord's icon visible in the system tray")
+    parser.add_argument('--config', default='config.json',
+                        help='Path to the configuration file (default: config.json)')
+    parser.add_argument('--profile', type=int, metavar='N',
+                        help='Run N monitor cycles back to back under cProfile and exit')
+    parser.add_argument('--profile-top', type=int, default=30, metavar='N',
+                        help='Number of functions listed in the profile summary (default: 30)')
+    parser.add_argument('--memory-report', type=int, metavar='N',
+                        help='Run N monitor cycles back to back, report RSS and the top allocators before and after, and exit')
+    parser.add_argument('--replay', metavar='TRACE',
+                        help='Replay a recorded cycle trace at full speed, check the actions match and exit')
+    parser.add_argument('--shadow', action='store_true',
+                        help='Detect once, print what every fix strategy would do and cost, change nothing and exit')
+    parser.add_argument('--analyze-log', nargs='?', const='', metavar='LOG',
+                        help='Stream a log file (default: the current log) into an incident report and exit')
+    parser.add_argument('--simulate', action='store_true',
+                        help='Run against an in-memory simulated desktop instead of Windows')
+    parser.add_argument('--control', choices=CONTROL_COMMANDS, metavar='COMMAND',
+                        help=f"Send a command to the running instance, print its reply and exit "
+                             f"({', '.join(CONTROL_COMMANDS)})")
+    return parser
+
+def create_backend(args):
+    """Create the desktop backend selected on the command line"""
+    if args.simulate:
+        logger.info("Using simulated desktop backend")
+        return SimulatedDesktop.generate()
+    return Win32Backend()
+
+def run_profile(args):
+    """Profile monitor cycles and write the report next to the log file"""
+    backend = create_backend(args)
+    manager = DiscordTrayManager(args.config, backend)
+    
+    # On the simulated desktop Discord loses its promotion every cycle so the fix path is profiled too
+    before_cycle = backend.demote if args.simulate else None
+    stats_path, summary_path = profile_cycles(manager, args.profile, get_app_data_dir(), args.profile_top,
+                                              before_cycle)
+    print(f"Profile data: {stats_path}")
+    print(f"Profile summary: {summary_path}")
+
+def run_memory_report(args):
+    """Measure memory over monitor cycles and write the report next to the log file"""
+    # Traced from before the monitor exists, so its own allocations show in the startup picture
+    tracemalloc.start(TRACE_FRAMES)
+    try:
+        backend = create_backend(args)
+        manager = DiscordTrayManager(args.config, backend)
+        before_cycle = backend.demote if args.simulate else None
+        report_path = report_memory(manager, args.memory_report, get_app_data_dir(), before_cycle=before_cycle)
+    finally:
+        tracemalloc.stop()
+    print(f"Memory report: {report_path}")
+
+def run_replay(args):
+    """Replay a recorded cycle trace and report mismatches and speed"""
+    # Replayed cycles must not flood the real log
+    logging.disable(logging.CRITICAL)
+    try:
+        result = replay_trace(args.replay, lambda backend: DiscordTrayManager(args.config, backend))
+    finally:
+        logging.disable(logging.NOTSET)
+    
+    print(f"Replayed {result['cycles']} cycles in {result['seconds']:.2f}s "
+          f"({result['cycles_per_second']:.0f} cycles/s)")
+    for mismatch in result['mismatches']:
+        print(f"Cycle {mismatch['cycle']} (t={mismatch['t']}s): expected {mismatch['expected']}, got {mismatch['actual']}")
+    if result['mismatches']:
+        print("Replay FAILED: actions differ from the recording")
+        return 1
+    print("Replay OK: all actions match the recording")
+    return 0
+
+def run_shadow(args):
+    """Run one detection pass and a shadow report of every fix strategy"""
+    manager = DiscordTrayManager(args.config, create_backend(args))
+    snapshot = manager.check_discord_tray_status()
+    print(f"Discord running: {snapshot.discord_running}, icon visible: {snapshot.icon_visible}")
+    
+    results = cost_strategies(manager.tray_manager)
+    for result in results:
+        print(f"\n{result['strategy']}: {len(result['ops'])} operation(s)")
+        for op in result['ops']:
+            print(f"  would {describe_op(op)}")
+        if result['error']:
+            print(f"  failed while planning: {result['error']}")
+    print()
+    print(format_shadow_summary(results))
+
+def acquire_single_instance(metrics):
+    """Take this user's control channel, or return None if a monitor is already running"""
+    directory = get_app_data_dir()
+    return ControlServer.acquire(control_address(directory), load_authkey(directory), metrics)
+
+def run_control(args):
+    """Send a control command to the running instance and print the reply"""
+    directory = get_app_data_dir()
+    try:
+        reply = send_command(control_address(directory), load_authkey(directory), args.control)
+    except (OSError, EOFError):
+        print("Discord Tray Manager is not running")
+        return 1
+    if not reply.get('ok'):
+        print(f"Error: {reply.get('error')}")
+        return 1
+    print(json.dumps(reply['result'], indent=2, default=str))
+    return 0
+
+def run_analyze_log(args):
+    """Print an incident timeline and fix statistics for a log file"""
+    path = args.analyze_log or get_log_file_path()
+    try:
+        analysis = analyze_log(path, workers=DEFAULT_WORKERS)
+    except OSError as e:
+        print(f"Could not read {path}: {e}")
+        return 1
+    print(format_report(analysis))
+    return 0
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    
+    if args.control:
+        sys.exit(run_control(args))
+    
+    if args.analyze_log is not None:
+        sys.exit(run_analyze_log(args))
+    
+    if args.profile:
+        run_profile(args)
+        return
+    
+    if args.memory_report:
+        run_memory_report(args)
+        return
+    
+    if args.replay:
+        sys.exit(run_replay(args))
+    
+    if args.shadow:
+        run_shadow(args)
+        return
+    
+    manager = None
+    control = None
     try:
         logger.info("===== DISCORD TRAY MANAGER STARTING =====")
         logger.info(f"Process ID: {os.getpid()}")
-        logger.info(f"Log level: {logger.level}")
         
         # Load configuration
-        logger.info("Loading configuration...")
-        config = load_config()
-        logger.info(f"Configuration loaded: check_interval={config.get('check_interval', 30)}s, auto_fix={config.get('enable_auto_fix', True)}")
+        manager = DiscordTrayManager(args.config, create_backend(args))
+        logger.info(f"Configuration loaded: check_interval={manager.check_interval}s, auto_fix={manager.enable_auto_fix}")
         
-        check_interval = config.get('check_interval', 30)
-        enable_auto_fix = config.get('enable_auto_fix', True)
-        startup_delay = config.get('startup_delay', 5)
+        # A second monitor would double every scan and fight the first one's fixes
+        control = acquire_single_instance(manager.metrics)
+        if control is None:
+            logger.error("Discord Tray Manager is already running for this user, exiting "
+                         "(use --control status to query it)")
+            return
+        control.start(manager.control_commands())
         
-        if not enable_auto_fix:
+        if not manager.enable_auto_fix:
             logger.warning("Auto-fix is disabled in configuration - will only monitor, not fix")
         
-        # Startup delay
-        if startup_delay > 0:
-            logger.info(f"Startup delay: waiting {startup_delay} seconds before beginning checks...")
-            time.sleep(startup_delay)
-        
-        # Create system tray icon
-        logger.info("Creating system tray icon...")
-        create_tray_icon()
-        
-        logger.info(f"===== DISCORD TRAY MANAGER READY - CHECK INTERVAL: {check_interval}s =====")
+        manager.monitor_and_fix()
         
-        # Main loop
-        while True:
-            try:
-                if enable_auto_fix:
-                    check_and_fix_discord_tray()
-                else:
-                    logger.debug("Auto-fix disabled, skipping Discord tray check")
-                
-                logger.debug(f"Sleeping for {check_interval} seconds until next check...")
-                time.sleep(check_interval)
-                
-            except KeyboardInterrupt:
-                logger.info("Received keyboard interrupt, shutting down...")
-                break
-            except Exception as e:
-                logger.error(f"Error in main loop: {e}")
-                logger.info(f"Continuing after error, next check in {check_interval} seconds...")
-                time.sleep(check_interval)
-                
     except Exception as e:
         logger.error(f"Fatal error in Discord Tray Manager: {e}")
     finally:
+        if manager and control:
+            manager.stop()
+        if control:
+            control.close()
         logger.info("===== DISCORD TRAY MANAGER SHUTTING DOWN =====")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    # Needed for the isolated probe worker in frozen builds
+    multiprocessing.freeze_support()
+    main()
@@ -15,26 +15,20 @@ import ctypes
 from ctypes import wintypes
 import winreg
 import sys
+import multiprocessing
 import pystray
 from PIL import Image, ImageDraw
 from pystray import MenuItem as item
 from tray_icon_helper import TrayIconManager, refresh_notification_area, is_discord_running, get_discord_processes
+from tray_status import TrayStatusPresenter, STATUS_COLORS, STATUS_OK
+from discord_tray_manager import (DiscordTrayManager, get_log_file_path, get_log_report_path, build_arg_parser,
+                                  create_backend, run_profile, run_memory_report, run_replay, run_shadow,
+                                  run_analyze_log, run_control, acquire_single_instance)
+from control_channel import COMMAND_STOP
+from log_analyzer import analyze_log, format_report, DEFAULT_WORKERS
+from change_events import EVENT_STATUS_CHANGED, EVENT_DISCORD_STARTED, EVENT_DISCORD_STOPPED
 
-# Simple icon data (16x16 icon encoded as base64)
-ICON_DATA = """
-iVBORw0KGgoAAAANSUhEUgAAABAAAAAQCAYAAAAf8/9hAAAABHNCSVQICAgIfAhkiAAAAAlwSFlz
-AAAB2AAAAdgB+lymcgAAABl0RVh0U29mdHdhcmUAd3d3Lmlua3NjYXBlLm9yZ5vuPBoAAAE4SURB
-VDiNpZM9SwNBEIafgxCwsLGwsLW1tba0sLBYbG0sLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCws
-LCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCws
-LCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCws
-LCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCws
-LCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCws
-LCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCws
-LCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCws
-LCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCwsLCws
-"""
-
-def create_tray_image():
+def create_tray_image(color=(88, 101, 242, 255)):
     """Create a simple system tray icon"""
     # Create a simple 64x64 icon
     width = 64
@@ -43,8 +37,7 @@ def create_tray_image():
     draw = ImageDraw.Draw(image)
     
     # Draw a simple Discord-style rounded rectangle
-    # Blue color similar to Discord
-    color = (88, 101, 242, 255)  # Discord blurple
+    # Defaults to Discord blurple, other colours mark the monitor state
     
     # Draw rounded rectangle
     margin = 8
@@ -64,30 +57,60 @@ def create_tray_image():
     
     return image
 
+def create_status_images():
+    """Pre-render one tray image per monitor state"""
+    images = {}
+    rendered = {}
+    for status, color in STATUS_COLORS.items():
+        # States sharing a colour share the same image object. The icon has only a few
+        # colours, so a 16 colour palette image holds it in a quarter of the RGBA bytes
+        if color not in rendered:
+            rendered[color] = create_tray_image(color).quantize(16, Image.FASTOCTREE)
+        images[status] = rendered[color]
+    return images
+
 class SystemTrayApp:
-    def __init__(self):
+    def __init__(self, config_path='config.json', backend=None):
         self.manager = None
         self.running = False
         
         # Load manager
-        self.manager = DiscordTrayManager()
+        self.manager = DiscordTrayManager(config_path, backend)
+        
+        # Pre-render the state images once, never on the monitor thread
+        status_images = create_status_images()
         
         # Create tray icon
         self.icon = pystray.Icon(
             "discord_tray_manager",
-            create_tray_image(),
+            status_images[STATUS_OK],
             "Discord Tray Manager",
             menu=pystray.Menu(
                 item('Discord Tray Manager', self.show_about, default=True),
-                item('Status: Monitoring...', self.show_status),
+                item(lambda item: self.status.menu_text(item), self.show_status),
                 pystray.Menu.SEPARATOR,
                 item('Open Logs', self.open_logs),
+                item('Log Report', self.open_log_report),
                 item('Open Config', self.open_config),
+                item('Export Trace', self.export_trace, visible=self.manager.tracer.enabled),
                 pystray.Menu.SEPARATOR,
                 item('Exit', self.quit_application)
             )
         )
         
+        # Push icon and menu updates only when the monitor state changes
+        self.status = TrayStatusPresenter(self.icon, status_images)
+        self.discord_running = None
+        self.manager.events.listen('tray', self.on_change_event,
+                                   kinds=(EVENT_STATUS_CHANGED, EVENT_DISCORD_STARTED, EVENT_DISCORD_STOPPED))
+        
+    def on_change_event(self, event):
+        """Follow the monitor's published changes instead of querying it"""
+        if event.kind == EVENT_STATUS_CHANGED:
+            self.status.set_status(event.new)
+        else:
+            self.discord_running = event.new
+        
     def show_about(self, icon, item):
         """Show about dialog"""
         # Use Windows message box
@@ -101,13 +124,17 @@ class SystemTrayApp:
     
     def show_status(self, icon, item):
         """Show current status"""
-        is_discord_running = self.manager.is_discord_running()
-        status = "Discord is running" if is_discord_running else "Discord not detected"
+        if self.discord_running is None:
+            status = "Not checked yet"
+        else:
+            status = "Discord is running" if self.discord_running else "Discord not detected"
         
         import ctypes
         ctypes.windll.user32.MessageBoxW(
             0,
-            f"Status: {status}\nCheck interval: {self.manager.check_interval}s\nAuto-fix: {'Enabled' if self.manager.enable_auto_fix else 'Disabled'}",
+            f"Status: {status}\nTray: {self.status.status_text()}\nCheck interval: {self.manager.check_interval}s\nAuto-fix: {'Enabled' if self.manager.enable_auto_fix else 'Disabled'}\nHung cycles recovered: {self.manager.hang_count}\nVoice call: {self.manager.call_status_text()}" +
+            (f"\n\n{self.manager.targets_status_text()}" if self.manager.target_states else "") +
+            (f"\n\nSessions: {self.manager.session_monitor.status_text()}" if self.manager.session_monitor else ""),
             "Discord Tray Manager Status",
             0x40  # MB_ICONINFORMATION
         )
@@ -126,6 +153,40 @@ class SystemTrayApp:
                 0x10  # MB_ICONERROR
             )
     
+    def open_log_report(self, icon, item):
+        """Summarize the log into an incident report and open it, off the menu thread"""
+        threading.Thread(target=self.write_log_report, daemon=True).start()
+    
+    def write_log_report(self):
+        try:
+            report_file = get_log_report_path()
+            with open(report_file, 'w', encoding='utf-8') as f:
+                f.write(format_report(analyze_log(get_log_file_path(), workers=DEFAULT_WORKERS)))
+            os.startfile(report_file)
+        except Exception as e:
+            import ctypes
+            ctypes.windll.user32.MessageBoxW(
+                0,
+                f"Could not build log report:\n{e}",
+                "Error",
+                0x10  # MB_ICONERROR
+            )
+    
+    def export_trace(self, icon, item):
+        """Dump the trace ring buffer and open its folder"""
+        try:
+            trace_file = self.manager.dump_trace()
+            if trace_file:
+                os.startfile(os.path.dirname(trace_file))
+        except Exception as e:
+            import ctypes
+            ctypes.windll.user32.MessageBoxW(
+                0,
+                f"Could not export trace:\n{e}",
+                "Error",
+                0x10  # MB_ICONERROR
+            )
+    
     def open_config(self, icon, item):
         """Open config file"""
         try:
@@ -154,6 +215,16 @@ class SystemTrayApp:
         self.stop_monitoring()
         icon.stop()
     
+    def control_commands(self):
+        """The monitor's control commands, with stop also closing the tray icon"""
+        commands = self.manager.control_commands()
+        commands[COMMAND_STOP] = self.control_stop
+        return commands
+    
+    def control_stop(self):
+        threading.Thread(target=self.quit_application, args=(self.icon, None), daemon=True).start()
+        return {'stopping': True}
+    
     def start_monitoring(self):
         """Start the Discord monitoring in a separate thread"""
         if not self.running:
@@ -177,185 +248,12 @@ class SystemTrayApp:
         self.start_monitoring()
         self.icon.run()
 
-# Get user's AppData directory for log file
-def get_log_file_path():
-    """Get the appropriate log file path in user's AppData directory"""
-    appdata_dir = os.path.expandvars(r'%LOCALAPPDATA%\Discord Tray Manager')
-    os.makedirs(appdata_dir, exist_ok=True)
-    return os.path.join(appdata_dir, 'discord_tray_manager.log')
-
-def setup_logging():
-    """Set up logging configuration"""
-    log_file_path = get_log_file_path()
-    
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file_path),
-            logging.StreamHandler()
-        ]
-    )
-
 logger = logging.getLogger(__name__)
 
-class DiscordTrayManager:
-    def __init__(self, config_path='config.json'):
-        self.load_config(config_path)
-        self.running = True
-        self.tray_manager = TrayIconManager()
-        
-    def load_config(self, config_path):
-        """Load configuration from JSON file"""
-        try:
-            if os.path.exists(config_path):
-                with open(config_path, 'r') as f:
-                    config = json.load(f)
-            else:
-                config = {}
-            
-            self.check_interval = config.get('check_interval', 30)
-            self.discord_processes = config.get('discord_processes', ['Discord.exe', 'DiscordPTB.exe', 'DiscordCanary.exe'])
-            self.enable_auto_fix = config.get('enable_auto_fix', True)
-            self.enable_tray_refresh = config.get('enable_tray_refresh', True)
-            self.enable_window_simulation = config.get('enable_window_simulation', False)
-            self.startup_delay = config.get('startup_delay', 5)
-            
-            # Setup logging with config level
-            log_level = config.get('log_level', 'INFO')
-            setup_logging()
-            
-            logger.info(f"Loaded configuration")
-            
-        except Exception as e:
-            logger.error(f"Error loading config: {e}")
-            self.setup_defaults()
-    
-    def setup_defaults(self):
-        """Set up default configuration"""
-        self.check_interval = 30
-        self.discord_processes = ['Discord.exe', 'DiscordPTB.exe', 'DiscordCanary.exe']
-        self.enable_auto_fix = True
-        self.enable_tray_refresh = True
-        self.enable_window_simulation = False
-        self.startup_delay = 5
-        setup_logging()
-        
-    def is_discord_running(self):
-        """Check if any Discord process is currently running"""
-        try:
-            # Hide console window for subprocess
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            startupinfo.wShowWindow = subprocess.SW_HIDE
-            
-            result = subprocess.run(
-                ['tasklist', '/FO', 'CSV'], 
-                capture_output=True, 
-                text=True, 
-                check=True,
-                startupinfo=startupinfo,
-                creationflags=subprocess.CREATE_NO_WINDOW
-            )
-            
-            for process_name in self.discord_processes:
-                if process_name.lower() in result.stdout.lower():
-                    logger.debug(f"Found running Discord process: {process_name}")
-                    return True
-            return False
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Error checking running processes: {e}")
-            return False
-
-    def check_discord_tray_status(self):
-        """Check if Discord icon is properly visible in system tray"""
-        if not self.is_discord_running():
-            logger.debug("Discord is not running")
-            return False, "Discord not running"
-        
-        # Check if Discord icon is visible in tray
-        is_visible = self.tray_manager.is_discord_icon_visible()
-        
-        if is_visible:
-            logger.debug("Discord icon appears to be in system tray")
-            return True, "Icon visible"
-        else:
-            logger.info("Discord is running but icon may not be visible in tray")
-            return False, "Icon not visible"
-
-    def fix_discord_tray_icon(self):
-        """Attempt to fix Discord tray icon visibility"""
-        if not self.enable_auto_fix:
-            logger.debug("Auto-fix is disabled")
-            return False
-        
-        logger.info("Attempting to fix Discord tray icon...")
-        
-        success = False
-        
-        # Method 1: Refresh notification area
-        if self.enable_tray_refresh:
-            logger.debug("Refreshing notification area...")
-            if self.tray_manager.refresh_notification_area():
-                success = True
-                logger.info("Successfully refreshed notification area")
-        
-        # Method 2: Simulate window actions (more invasive)
-        if self.enable_window_simulation and not success:
-            logger.debug("Simulating Discord window actions...")
-            if self.tray_manager.simulate_discord_tray_action():
-                success = True
-                logger.info("Successfully simulated Discord tray action")
-        
-        return success
-
-    def monitor_and_fix(self):
-        """Main monitoring loop"""
-        logger.info("Discord Tray Manager started")
-        logger.info(f"Monitoring every {self.check_interval} seconds")
-        
-        # Initial startup delay
-        if self.startup_delay > 0:
-            time.sleep(self.startup_delay)
-        
-        consecutive_failures = 0
-        max_failures = 5
-        
-        while self.running:
-            try:
-                is_ok, status = self.check_discord_tray_status()
-                
-                if not is_ok and self.is_discord_running():
-                    logger.warning(f"Discord tray issue detected: {status}")
-                    
-                    if self.fix_discord_tray_icon():
-                        logger.info("Successfully applied fix")
-                        consecutive_failures = 0
-                    else:
-                        consecutive_failures += 1
-                        logger.warning(f"Fix attempt failed ({consecutive_failures}/{max_failures})")
-                        
-                        if consecutive_failures >= max_failures:
-                            logger.error("Too many consecutive failures, taking a break...")
-                            time.sleep(self.check_interval * 3)
-                            consecutive_failures = 0
-                else:
-                    consecutive_failures = 0
-                
-                # Wait before next check
-                time.sleep(self.check_interval)
-                
-            except Exception as e:
-                logger.error(f"Unexpected error in monitoring loop: {e}")
-                time.sleep(5)
-
-    def stop(self):
-        """Stop the monitoring"""
-        self.running = False
-        logger.info("Discord Tray Manager stopped")
-
-def main():
+def main(argv=None):
     """Main entry point for GUI version"""
+    args = build_arg_parser().parse_args(argv)
+    
     if sys.platform != 'win32':
         import ctypes
         ctypes.windll.user32.MessageBoxW(
@@ -366,9 +264,43 @@ def main():
         )
         sys.exit(1)
     
+    if args.control:
+        sys.exit(run_control(args))
+    
+    if args.analyze_log is not None:
+        sys.exit(run_analyze_log(args))
+    
+    if args.profile:
+        run_profile(args)
+        return
+    
+    if args.memory_report:
+        run_memory_report(args)
+        return
+    
+    if args.replay:
+        sys.exit(run_replay(args))
+    
+    if args.shadow:
+        run_shadow(args)
+        return
+    
+    control = None
     try:
         # Create and run the tray application
-        app = SystemTrayApp()
+        app = SystemTrayApp(args.config, create_backend(args))
+        
+        # Only one monitor per user, a second launch just says so
+        control = acquire_single_instance(app.manager.metrics)
+        if control is None:
+            ctypes.windll.user32.MessageBoxW(
+                0,
+                "Discord Tray Manager is already running.\nLook for its icon in the system tray.",
+                "Discord Tray Manager",
+                0x40  # MB_ICONINFORMATION
+            )
+            return
+        control.start(app.control_commands())
         app.run()
         
     except Exception as e:
@@ -381,6 +313,11 @@ def main():
             0x10  # MB_ICONERROR
         )
         sys.exit(1)
+    finally:
+        if control:
+            control.close()
 
 if __name__ == "__main__":
+    # Needed for the isolated probe worker in frozen builds
+    multiprocessing.freeze_support()
     main() 
\ No newline at end of file
@@ -0,0 +1,103 @@
+"""
+Fix Runner - Runs independent fix strategies side by side and keeps the first that works
+
+Strategies that would interfere, such as two that both make Discord re-add
+its icon via TaskbarCreated, are declared as conflicting and run one after
+the other in the same chain. Separate chains run at once on a small thread
+pool. A strategy that reports success only wins once `verify` confirms Discord
+really is promoted again, otherwise its chain carries on with the next one;
+the cancel event is then set so the other chains stop at their next check and
+their results are ignored.
+"""
+
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+
+from cycle_metrics import NULL_METRICS
+
+logger = logging.getLogger(__name__)
+
+def conflict_chains(strategies, conflicts):
+    """Split strategies into chains that can run at the same time, keeping their order.
+
+    `conflicts` is a collection of strategy pairs that must not overlap; a
+    strategy joins the chain of the first earlier strategy it conflicts with.
+    """
+    chains = []
+    for strategy in strategies:
+        for chain in chains:
+            if any(frozenset((strategy, other)) in conflicts for other in chain):
+                chain.append(strategy)
+                break
+        else:
+            chains.append([strategy])
+    return chains
+
+class ConcurrentFixRunner:
+    """Races the conflict-free chains of a fix and returns the winning strategy"""
+
+    def __init__(self, run_strategy, cancel, conflicts, metrics=NULL_METRICS, workers=3, verify=None):
+        self.run_strategy = run_strategy
+        self.verify = verify
+        self.cancel = cancel
+        self.conflicts = conflicts
+        self.metrics = metrics
+        self.workers = workers
+        self.pending = []
+        self._executor = None
+
+    def run(self, strategies):
+        """Run the strategies, returns the first that succeeded or None"""
+        # Losers of the previous fix must be done before anything is sent again
+        self.wait_idle()
+        chains = conflict_chains(strategies, self.conflicts)
+        start = time.perf_counter()
+        if len(chains) == 1:
+            winner = self.run_chain(chains[0])
+        else:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='fix')
+            self.pending = [self._executor.submit(self.run_chain, chain) for chain in chains]
+            winner = None
+            for future in as_completed(self.pending):
+                winner = future.result()
+                if winner:
+                    self.cancel.set()
+                    break
+        elapsed = time.perf_counter() - start
+        self.metrics.observe('concurrent_fix', elapsed)
+        if winner:
+            logger.info(f"Strategy {winner} won after {elapsed * 1000:.1f} ms, "
+                        f"{len(chains) - 1} other chain(s) cancelled")
+        return winner
+
+    def run_chain(self, chain):
+        for strategy in chain:
+            if self.cancel.is_set():
+                logger.debug(f"Skipping {strategy}, another strategy already succeeded")
+                self.metrics.increment('fix_strategies_cancelled')
+                return None
+            try:
+                if not self.run_strategy(strategy):
+                    continue
+                if self.verify is None or self.verify():
+                    return strategy
+                logger.info(f"Strategy {strategy} reported success but Discord is still not promoted")
+                self.metrics.increment('fix_unverified_successes')
+            except Exception as e:
+                logger.error(f"Error in fix strategy {strategy}: {e}")
+        return None
+
+    def wait_idle(self):
+        """Wait for chains still finishing after a win, then let strategies run in full again"""
+        if self.pending:
+            wait(self.pending)
+            self.pending = []
+        self.cancel.clear()
+
+    def close(self):
+        self.cancel.set()
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,291 @@
+"""
+Log Analyzer - Streams discord_tray_manager.log into an incident timeline and fix statistics
+
+The log is memory-mapped and scanned in bounded windows that end on a line
+break, so multi-GB debug logs are never loaded whole. Every
+`%(asctime)s - %(levelname)s - %(message)s` line feeds the repeated message
+counts through one compiled findall per window; the few lines the timeline
+needs are picked out by a second compiled matcher. Large files can be split
+into line-aligned ranges scanned by worker processes, whose events are then
+replayed in file order.
+"""
+
+import os
+import re
+import mmap
+import time
+import multiprocessing
+import logging
+from collections import Counter
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 16 * 1024 * 1024
+
+# Distinct raw messages kept before they are folded into their grouped form
+MAX_RAW_MESSAGES = 100000
+
+# Worker processes for files bigger than one window
+DEFAULT_WORKERS = min(os.cpu_count() or 1, 8)
+
+TIMESTAMP_LENGTH = len('2026-01-01 00:00:00,000')
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S,%f'
+
+# Message part of every well-formed line. `.` rather than [^\n] lets the engine take its
+# fast path; it stops at line breaks anyway, leaving only the \r of CRLF logs to strip
+MESSAGE_REGEX = re.compile(rb'^.{%d} - [A-Z]+ - (.*)' % TIMESTAMP_LENGTH, re.MULTILINE)
+
+# Lines the timeline is built from; the timestamp sits right before the match
+EVENT_ISSUE = b'Discord tray issue detected'
+EVENT_FIXED = b'Successfully applied fix'
+EVENT_FIX_FAILED = b'Fix attempt failed'
+EVENT_BACKOFF = b'Too many consecutive failures, taking a break'
+EVENT_LAST_STRATEGY = b'Step 0: Trying last successful strategy first: '
+EVENT_STRATEGY_RESULT = b'promotion result: '
+# Older logs repeat each result: the strategy logged its own line, its caller another and
+# step 0 a third, those repeats of the attempt just recorded are not counted again
+EVENT_LAST_STRATEGY_RESULT = b'Last successful strategy result: '
+EVENT_STARTED = b'===== DISCORD TRAY MANAGER STARTING ====='
+EVENT_STOPPED = b'Discord Tray Manager stopped'
+EVENT_TASKBAR = b'Taskbar was recreated'
+
+EVENT_REGEX = re.compile(rb' - (?:INFO|WARNING|ERROR) - ((?:%s).*)' % b'|'.join(
+    [re.escape(e) for e in (EVENT_ISSUE, EVENT_FIXED, EVENT_FIX_FAILED, EVENT_BACKOFF, EVENT_LAST_STRATEGY,
+                            EVENT_LAST_STRATEGY_RESULT, EVENT_STARTED, EVENT_STOPPED, EVENT_TASKBAR)] +
+    [rb'(?:StartAllBack|Shell API|Registry) ' + re.escape(EVENT_STRATEGY_RESULT)]))
+
+# Strategy names as logged by run_fix_strategy()
+STRATEGY_LABELS = {b'StartAllBack': 'startallback', b'Shell API': 'shell_api', b'Registry': 'registry'}
+
+# Collapsed to one placeholder when grouping repeated messages
+VARIABLE_REGEX = re.compile(r'0x[0-9a-fA-F]+|\d+(?:\.\d+)?')
+
+def iter_windows(mm, chunk_size=CHUNK_SIZE, start=0, size=None):
+    """Yield (start, end) windows of the mapped file up to `size` that end on a line break"""
+    if size is None:
+        size = len(mm)
+    while start < size:
+        end = min(start + chunk_size, size)
+        if end < size:
+            newline = mm.rfind(b'\n', start, end)
+            # A single line longer than the window is read whole
+            end = newline + 1 if newline >= 0 else (mm.find(b'\n', end) + 1 or size)
+        yield start, end
+        start = end
+
+def release_window(mm, start, end):
+    """Drop a scanned window's pages so resident memory stays at about one window"""
+    if hasattr(mm, 'madvise'):  # Not available on Windows, where the pages simply age out
+        aligned = start - start % mmap.PAGESIZE
+        mm.madvise(mmap.MADV_DONTNEED, aligned, end - aligned)
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(pct / 100.0 * len(values))) - 1))]
+
+class LogAnalysis:
+    """Timeline and statistics accumulated while a log streams past"""
+
+    def __init__(self):
+        self.lines = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.grouped = Counter()
+        self.timeline = []
+        self.incidents = []
+        self.strategies = {}
+        self.open_incident = None
+        self.pending_strategy = None
+        # (name, success) of the attempt last recorded, until a line that starts another one
+        self.last_result = None
+
+    def add_event(self, timestamp, message):
+        when = datetime.strptime(timestamp.decode('ascii', 'replace'), TIMESTAMP_FORMAT)
+        message = message.rstrip(b'\r')
+        text = message.decode('utf-8', 'replace')
+        incident = self.open_incident
+
+        if EVENT_STRATEGY_RESULT not in message and not message.startswith(EVENT_LAST_STRATEGY_RESULT):
+            self.last_result = None
+
+        if message.startswith(EVENT_ISSUE):
+            if incident is None:
+                self.open_incident = {'start': when, 'end': None, 'attempts': 0, 'outcome': None,
+                                      'strategies': [], 'backoffs': 0}
+        elif message.startswith(EVENT_FIXED) or message.startswith(EVENT_FIX_FAILED):
+            if incident is not None:
+                incident['attempts'] += 1
+                if message.startswith(EVENT_FIXED):
+                    self.close_incident(when, 'fixed')
+        elif message.startswith(EVENT_BACKOFF):
+            if incident is not None:
+                incident['backoffs'] += 1
+            self.timeline.append((when, 'backoff', text))
+        elif message.startswith(EVENT_LAST_STRATEGY):
+            self.pending_strategy = text[len(EVENT_LAST_STRATEGY):].strip()
+        elif message.startswith(EVENT_LAST_STRATEGY_RESULT):
+            self.record_attempt(self.pending_strategy or 'last', message.endswith(b'True'))
+        elif EVENT_STRATEGY_RESULT in message:
+            label = message.split(b' ' + EVENT_STRATEGY_RESULT, 1)[0]
+            self.record_attempt(STRATEGY_LABELS.get(label, label.decode()), message.endswith(b'True'))
+        elif message.startswith(EVENT_STARTED):
+            self.close_incident(when, 'restarted')
+            self.timeline.append((when, 'start', 'Manager started'))
+        elif message.startswith(EVENT_STOPPED):
+            self.close_incident(when, 'stopped')
+            self.timeline.append((when, 'stop', 'Manager stopped'))
+        elif message.startswith(EVENT_TASKBAR):
+            self.timeline.append((when, 'taskbar', 'Taskbar recreated'))
+
+    def record_attempt(self, name, success):
+        """Record a result line unless it repeats the attempt recorded just before"""
+        if self.last_result == (name, success):
+            return
+        self.last_result = (name, success)
+        self.record_strategy(name, success)
+
+    def record_strategy(self, name, success):
+        stats = self.strategies.setdefault(name, [0, 0])
+        stats[0 if success else 1] += 1
+        if self.open_incident is not None:
+            self.open_incident['strategies'].append((name, success))
+
+    def close_incident(self, when, outcome):
+        incident = self.open_incident
+        if incident is None:
+            return
+        incident['end'] = when
+        incident['outcome'] = outcome
+        self.incidents.append(incident)
+        self.timeline.append((incident['start'], 'incident', incident))
+        self.open_incident = None
+
+    def finish(self):
+        """Record a still-open incident at the end of the log"""
+        if self.open_incident is not None:
+            self.incidents.append(self.open_incident)
+            self.timeline.append((self.open_incident['start'], 'incident', self.open_incident))
+            self.open_incident = None
+        self.timeline.sort(key=lambda entry: entry[0])
+
+    def recovery_seconds(self):
+        return sorted((i['end'] - i['start']).total_seconds() for i in self.incidents if i['outcome'] == 'fixed')
+
+    def top_messages(self, count=10):
+        """Most repeated messages, with numbers and handles folded together"""
+        return self.grouped.most_common(count)
+
+def fold_messages(messages, grouped):
+    """Move raw message counts into their grouped form, bounding memory"""
+    for message, seen in messages.items():
+        grouped[VARIABLE_REGEX.sub('#', message.rstrip(b'\r').decode('utf-8', 'replace'))] += seen
+    messages.clear()
+
+def line_aligned_ranges(mm, parts):
+    """Split the mapped file into up to `parts` (start, end) ranges that end on a line break"""
+    size = len(mm)
+    bounds = [0]
+    for i in range(1, parts):
+        newline = mm.find(b'\n', max(size * i // parts, bounds[-1]))
+        if newline < 0:
+            break
+        bounds.append(newline + 1)
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+def scan_range(path, start, end, chunk_size=CHUNK_SIZE):
+    """Scan one byte range of a log, returns (lines, grouped message counts, [(timestamp, message)])"""
+    lines = 0
+    messages = Counter()
+    grouped = Counter()
+    events = []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for window_start, window_end in iter_windows(mm, chunk_size, start, end):
+            found = MESSAGE_REGEX.findall(mm, window_start, window_end)
+            lines += len(found)
+            messages.update(found)
+            if len(messages) > MAX_RAW_MESSAGES:
+                fold_messages(messages, grouped)
+            for match in EVENT_REGEX.finditer(mm, window_start, window_end):
+                if match.start() - TIMESTAMP_LENGTH >= window_start:
+                    events.append((mm[match.start() - TIMESTAMP_LENGTH:match.start()], match.group(1)))
+            release_window(mm, window_start, window_end)
+    fold_messages(messages, grouped)
+    return lines, grouped, events
+
+def analyze_log(path, chunk_size=CHUNK_SIZE, workers=1):
+    """Stream a log file and return its LogAnalysis, scanning `workers` ranges in parallel processes"""
+    analysis = LogAnalysis()
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return analysis
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            ranges = line_aligned_ranges(mm, workers if size > chunk_size else 1)
+
+    if len(ranges) > 1:
+        with multiprocessing.Pool(len(ranges)) as pool:
+            results = pool.starmap(scan_range, [(path, a, b, chunk_size) for a, b in ranges])
+    else:
+        results = [scan_range(path, 0, size, chunk_size)]
+
+    # Ranges come back in file order, so incidents are replayed in the order they were logged
+    for lines, grouped, events in results:
+        analysis.lines += lines
+        analysis.grouped.update(grouped)
+        for timestamp, message in events:
+            try:
+                analysis.add_event(timestamp, message)
+            except ValueError:
+                continue  # Not a line start, a message merely quoting one
+    analysis.bytes = size
+    analysis.finish()
+    analysis.seconds = time.perf_counter() - start
+    return analysis
+
+def describe_incident(incident):
+    tried = ', '.join(f"{name} {'ok' if ok else 'failed'}" for name, ok in incident['strategies'])
+    if incident['end'] is None:
+        summary = f"still open at end of log after {incident['attempts']} attempt(s)"
+    else:
+        duration = (incident['end'] - incident['start']).total_seconds()
+        summary = f"{incident['outcome']} after {duration:.1f}s, {incident['attempts']} attempt(s)"
+    if incident['backoffs']:
+        summary += f", {incident['backoffs']} backoff(s)"
+    return summary + (f" [{tried}]" if tried else "")
+
+def format_report(analysis, top=10, timeline_limit=50):
+    """Human readable report of an analysis"""
+    mb = analysis.bytes / (1024 * 1024)
+    rate = mb / analysis.seconds if analysis.seconds else 0
+    lines = [f"Analyzed {analysis.lines} lines ({mb:.1f} MB) in {analysis.seconds:.2f}s ({rate:.0f} MB/s)", ""]
+
+    lines.append(f"Incident timeline ({len(analysis.incidents)} incidents)")
+    shown = analysis.timeline[-timeline_limit:] if timeline_limit else analysis.timeline
+    if len(shown) < len(analysis.timeline):
+        lines.append(f"  ... {len(analysis.timeline) - len(shown)} earlier entries")
+    for when, kind, detail in shown:
+        text = describe_incident(detail) if kind == 'incident' else detail
+        lines.append(f"  {when:%Y-%m-%d %H:%M:%S}  {kind:<8}  {text}")
+
+    lines += ["", "Fix strategies"]
+    for name, (succeeded, failed) in sorted(analysis.strategies.items()):
+        lines.append(f"  {name:<14} {succeeded:>6} ok {failed:>6} failed  "
+                     f"{100 * succeeded / (succeeded + failed):5.1f}% success")
+    if not analysis.strategies:
+        lines.append("  none attempted")
+
+    recovery = analysis.recovery_seconds()
+    lines += ["", f"Time to recovery ({len(recovery)} fixed incidents)"]
+    if recovery:
+        lines.append("  " + "  ".join(f"p{pct} {percentile(recovery, pct):.1f}s" for pct in (50, 90, 99)) +
+                     f"  max {recovery[-1]:.1f}s")
+
+    lines += ["", "Top repeated messages"]
+    for message, seen in analysis.top_messages(top):
+        lines.append(f"  {seen:>10}  {message}")
+    return "\n".join(lines)
@@ -0,0 +1,137 @@
+"""
+Memory Report - Resident set and top Python allocators before and after N monitor cycles
+
+Runs monitor cycles back to back under tracemalloc, like the cProfile runner,
+and records the process RSS and the traced Python heap at startup and after
+the last cycle. The report lists the largest allocation sites, what grew in
+between and the growth per cycle, so a leak shows up as a steady climb.
+"""
+
+import os
+import gc
+import sys
+import time
+import ctypes
+import logging
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+# Frames kept per traced allocation, one groups by source line
+TRACE_FRAMES = 1
+
+def resident_set_size():
+    """Current resident set (working set on Windows) in bytes, None if it cannot be read"""
+    if sys.platform == 'win32':
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        kernel32 = ctypes.windll.kernel32
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        if not kernel32.K32GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return None
+        return counters.WorkingSetSize
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+def format_bytes(size):
+    if size is None:
+        return "n/a"
+    if abs(size) < 1024:
+        return f"{size} B"
+    for unit in ('KB', 'MB'):
+        size /= 1024
+        if abs(size) < 1024:
+            break
+    return f"{size:.1f} {unit}"
+
+class MemoryPoint:
+    """RSS and traced heap at one moment, with the tracemalloc snapshot behind it"""
+
+    def __init__(self, label):
+        gc.collect()
+        self.label = label
+        self.rss = resident_set_size()
+        self.traced, self.peak = tracemalloc.get_traced_memory()
+        self.snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ])
+
+    def describe(self):
+        return (f"{self.label:<10} RSS {format_bytes(self.rss):>10}   traced {format_bytes(self.traced):>10}   "
+                f"traced peak {format_bytes(self.peak):>10}")
+
+def measure_cycles(manager, cycles, before_cycle=None):
+    """Run the cycles under tracemalloc, returns the (startup, after) MemoryPoints.
+
+    The first MemoryPoint is taken before any cycle has run. tracemalloc is
+    left as it was found.
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(TRACE_FRAMES)
+    try:
+        startup = MemoryPoint('startup')
+        for _ in range(cycles):
+            if before_cycle:
+                before_cycle()
+            manager.run_cycle()
+        after = MemoryPoint(f'{cycles} cycles')
+    finally:
+        if started:
+            tracemalloc.stop()
+    return startup, after
+
+def format_memory_report(startup, after, cycles, elapsed, top=15):
+    lines = [f"Discord Tray Manager memory: {cycles} cycles in {elapsed:.3f}s", ""]
+    lines.append(startup.describe())
+    lines.append(after.describe())
+    growth = after.traced - startup.traced
+    lines.append(f"Traced growth {format_bytes(growth)} ({growth / max(cycles, 1):.1f} B/cycle)")
+    if startup.rss is not None and after.rss is not None:
+        lines.append(f"RSS growth {format_bytes(after.rss - startup.rss)}")
+
+    lines += ["", f"=== Top {top} allocation sites after {cycles} cycles ==="]
+    for stat in after.snapshot.statistics('lineno')[:top]:
+        lines.append(f"{format_bytes(stat.size):>10} {stat.count:>8} blocks  {stat.traceback}")
+
+    lines += ["", f"=== Top {top} changes since startup ==="]
+    for stat in after.snapshot.compare_to(startup.snapshot, 'lineno')[:top]:
+        lines.append(f"{stat.size_diff:>+10} B {stat.count_diff:>+8} blocks  {stat.traceback}")
+    return "\n".join(lines) + "\n"
+
+def report_memory(manager, cycles, output_dir, top=15, before_cycle=None):
+    """Measure `cycles` monitor cycles with no sleeps and write the text report, returns its path"""
+    report_path = os.path.join(output_dir, 'discord_tray_manager_memory.txt')
+    logger.info(f"Measuring memory over {cycles} monitor cycles...")
+
+    start = time.perf_counter()
+    startup, after = measure_cycles(manager, cycles, before_cycle)
+    elapsed = time.perf_counter() - start
+
+    with open(report_path, 'w') as f:
+        f.write(format_memory_report(startup, after, cycles, elapsed, top))
+
+    logger.info(f"Memory {startup.describe()}")
+    logger.info(f"Memory {after.describe()}")
+    logger.info(f"Memory report written to {report_path}")
+    return report_path
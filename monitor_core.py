@@ -0,0 +1,64 @@
+"""
+Monitor Core - Pure detection-to-decision state machine for the monitor loop
+
+decide() turns a Snapshot of what was detected plus the previous MonitorState
+into the next state and the actions to carry out. It performs no I/O, so the
+Win32 side effects stay in the executor (DiscordTrayManager) and millions of
+synthetic snapshots can be evaluated in benchmarks.
+"""
+
+from collections import namedtuple
+
+from tray_status import (STATUS_STARTING, STATUS_OK, STATUS_FIXING, STATUS_NOT_RUNNING, STATUS_DEGRADED,
+                         STATUS_MONITOR_ONLY)
+
+# What one cycle detected
+Snapshot = namedtuple('Snapshot', ['discord_running', 'icon_visible'])
+
+# Everything the monitor carries from one cycle to the next
+MonitorState = namedtuple('MonitorState', ['status', 'consecutive_failures'])
+
+# Intended actions, executed outside the core
+ACTION_FIX = 'fix'
+ACTION_SUPPRESSED = 'suppressed'
+ACTION_BACKOFF = 'backoff'
+
+NO_ACTIONS = ()
+FIX_ACTIONS = (ACTION_FIX,)
+SUPPRESSED_ACTIONS = (ACTION_SUPPRESSED,)
+BACKOFF_ACTIONS = (ACTION_BACKOFF,)
+
+# Shared states for the common cases so steady cycles allocate nothing
+INITIAL_STATE = MonitorState(STATUS_STARTING, 0)
+STATE_OK = MonitorState(STATUS_OK, 0)
+STATE_NOT_RUNNING = MonitorState(STATUS_NOT_RUNNING, 0)
+STATE_SUPPRESSED = MonitorState(STATUS_MONITOR_ONLY, 0)
+
+DEFAULT_MAX_FAILURES = 5
+
+def decide(snapshot, state, auto_fix=True):
+    """Return (next_state, actions) for a freshly detected snapshot"""
+    if not snapshot.discord_running:
+        return STATE_NOT_RUNNING, NO_ACTIONS
+
+    if snapshot.icon_visible:
+        return STATE_OK, NO_ACTIONS
+
+    if not auto_fix:
+        return STATE_SUPPRESSED, SUPPRESSED_ACTIONS
+
+    if state.consecutive_failures:
+        # Keep showing the degraded state while retrying
+        return state, FIX_ACTIONS
+    return MonitorState(STATUS_FIXING, 0), FIX_ACTIONS
+
+def apply_fix_result(state, success, max_failures=DEFAULT_MAX_FAILURES):
+    """Return (next_state, actions) once a fix attempt has finished"""
+    if success:
+        return STATE_OK, NO_ACTIONS
+
+    failures = state.consecutive_failures + 1
+    if failures >= max_failures:
+        # Back off and start counting again afterwards
+        return MonitorState(STATUS_DEGRADED, 0), BACKOFF_ACTIONS
+    return MonitorState(STATUS_DEGRADED, failures), NO_ACTIONS
@@ -0,0 +1,155 @@
+"""
+Power Schedule - Stretches or suspends checks while nobody can see the tray
+
+Session lock/unlock and connect/disconnect, display power, suspend/resume and
+AC/battery signals from the shell event source decide what the monitor is
+allowed to spend. While the tray cannot be seen (locked, disconnected,
+display off, suspended) polling stops, or slows to hidden_interval; on
+battery the normal interval is stretched. The monitor checks at once when
+the tray becomes visible again. Wakeups and time are counted per state so
+the saving can be reported as wakeups per hour.
+"""
+
+import time
+import logging
+import threading
+
+from cycle_metrics import NULL_METRICS
+from shell_events import (EVENT_SESSION_LOCKED, EVENT_SESSION_UNLOCKED, EVENT_SESSION_DISCONNECTED,
+                          EVENT_SESSION_CONNECTED, EVENT_DISPLAY_OFF, EVENT_DISPLAY_ON, EVENT_ON_BATTERY, EVENT_ON_AC,
+                          EVENT_SUSPENDED, EVENT_RESUMED)
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_ACTIVE = 'active'
+PRESENCE_BATTERY = 'battery'
+PRESENCE_DISPLAY_OFF = 'display_off'
+PRESENCE_LOCKED = 'locked'
+PRESENCE_DISCONNECTED = 'disconnected'
+PRESENCE_SUSPENDED = 'suspended'
+
+# Most restrictive first, the current state is the first whose condition holds
+PRESENCE_ORDER = [PRESENCE_SUSPENDED, PRESENCE_DISCONNECTED, PRESENCE_LOCKED, PRESENCE_DISPLAY_OFF,
+                  PRESENCE_BATTERY, PRESENCE_ACTIVE]
+HIDDEN_STATES = {PRESENCE_SUSPENDED, PRESENCE_DISCONNECTED, PRESENCE_LOCKED, PRESENCE_DISPLAY_OFF}
+# Conditions that belong to this user's session rather than the machine
+SESSION_STATES = {PRESENCE_LOCKED, PRESENCE_DISCONNECTED}
+
+# Shell event -> (condition, whether it now holds)
+SIGNALS = {
+    EVENT_SESSION_LOCKED: (PRESENCE_LOCKED, True),
+    EVENT_SESSION_UNLOCKED: (PRESENCE_LOCKED, False),
+    EVENT_SESSION_DISCONNECTED: (PRESENCE_DISCONNECTED, True),
+    EVENT_SESSION_CONNECTED: (PRESENCE_DISCONNECTED, False),
+    EVENT_DISPLAY_OFF: (PRESENCE_DISPLAY_OFF, True),
+    EVENT_DISPLAY_ON: (PRESENCE_DISPLAY_OFF, False),
+    EVENT_ON_BATTERY: (PRESENCE_BATTERY, True),
+    EVENT_ON_AC: (PRESENCE_BATTERY, False),
+    EVENT_SUSPENDED: (PRESENCE_SUSPENDED, True),
+    EVENT_RESUMED: (PRESENCE_SUSPENDED, False),
+}
+
+PRESENCE_TEXT = {
+    PRESENCE_ACTIVE: "active",
+    PRESENCE_BATTERY: "on battery",
+    PRESENCE_DISPLAY_OFF: "display off",
+    PRESENCE_LOCKED: "locked",
+    PRESENCE_DISCONNECTED: "disconnected",
+    PRESENCE_SUSPENDED: "suspended",
+}
+
+def format_duration(seconds):
+    minutes = int(seconds // 60)
+    if minutes >= 60:
+        return f"{minutes // 60}h {minutes % 60}m"
+    return f"{minutes}m {int(seconds % 60)}s"
+
+class PowerSchedule:
+    """Current presence state, the check interval it allows and wakeups counted per state"""
+
+    def __init__(self, hidden_interval=0, battery_factor=2, track_session=True, metrics=NULL_METRICS,
+                 clock=time.monotonic):
+        self.hidden_interval = hidden_interval
+        self.battery_factor = battery_factor
+        # Off in multi-session mode, where one session's lock says nothing about the others
+        self.track_session = track_session
+        self.metrics = metrics
+        self.clock = clock
+        self.conditions = set()
+        self.state = PRESENCE_ACTIVE
+        self.since = clock()
+        self.seconds = dict.fromkeys(PRESENCE_ORDER, 0.0)
+        self.wakeups = dict.fromkeys(PRESENCE_ORDER, 0)
+        self._lock = threading.Lock()
+
+    def handle(self, event):
+        """Apply a shell event, returns True if the tray has just become visible again"""
+        signal = SIGNALS.get(event)
+        if signal is None:
+            return False
+        condition, holds = signal
+        if condition in SESSION_STATES and not self.track_session:
+            return False
+        with self._lock:
+            if holds:
+                self.conditions.add(condition)
+            else:
+                self.conditions.discard(condition)
+            previous = self.state
+            state = next((s for s in PRESENCE_ORDER if s in self.conditions), PRESENCE_ACTIVE)
+            if state == previous:
+                return False
+            seconds = self._account()
+            wakeups = self.wakeups[previous]
+            self.state = state
+        logger.info(f"Tray presence {PRESENCE_TEXT[previous]} -> {PRESENCE_TEXT[state]} after "
+                    f"{format_duration(seconds)} with {wakeups} wakeups so far in that state, "
+                    f"{self.describe_interval()}")
+        self.metrics.increment(f'presence_{state}')
+        return previous in HIDDEN_STATES and state not in HIDDEN_STATES
+
+    def _account(self):
+        """Add the time since the last transition to the current state, returns its total"""
+        now = self.clock()
+        self.seconds[self.state] += now - self.since
+        self.since = now
+        return self.seconds[self.state]
+
+    def visible(self):
+        return self.state not in HIDDEN_STATES
+
+    def interval(self, normal):
+        """Seconds until the next check given the normal interval, None to wait for a wake-up"""
+        if self.state in HIDDEN_STATES:
+            return self.hidden_interval or None
+        if self.state == PRESENCE_BATTERY:
+            return normal * self.battery_factor
+        return normal
+
+    def describe_interval(self):
+        if self.state in HIDDEN_STATES:
+            return f"checking every {self.hidden_interval}s" if self.hidden_interval else "checks paused"
+        if self.state == PRESENCE_BATTERY:
+            return f"check interval x{self.battery_factor}"
+        return "normal checks"
+
+    def record_wakeup(self):
+        """Count one cycle or process poll against the current state"""
+        with self._lock:
+            state = self.state
+            self.wakeups[state] += 1
+        self.metrics.increment(f'wakeups_{state}')
+
+    def wakeups_per_hour(self):
+        """Return {state: (wakeups, seconds, wakeups per hour)} for every state seen so far"""
+        with self._lock:
+            self._account()
+            return {state: (self.wakeups[state], self.seconds[state],
+                            self.wakeups[state] * 3600 / self.seconds[state] if self.seconds[state] else 0.0)
+                    for state in PRESENCE_ORDER if self.seconds[state] or self.wakeups[state]}
+
+    def format_report(self):
+        lines = ["Wakeups per hour by tray presence:"]
+        for state, (wakeups, seconds, per_hour) in self.wakeups_per_hour().items():
+            lines.append(f"  {PRESENCE_TEXT[state]:<13} {per_hour:8.1f}/h  ({wakeups} in {format_duration(seconds)})")
+        return "\n".join(lines)
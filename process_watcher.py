@@ -0,0 +1,107 @@
+"""
+Process Watcher - Emits start and exit events for the configured Discord image names
+
+A background thread diffs cheap process snapshots (Toolhelp32 on Windows, the
+backend's process list elsewhere). While Discord runs it waits on the
+processes' handles where the backend supports it, so an exit is seen at once;
+otherwise it sleeps for the poll interval between snapshots. It can be
+paused while nobody can see the tray.
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+EVENT_PROCESS_STARTED = 'started'
+EVENT_PROCESS_EXITED = 'exited'
+
+class ProcessWatcher:
+    """Calls callback(event, image_name) when a watched image starts or its last process exits"""
+
+    def __init__(self, backend, process_names, callback, interval=5):
+        self.backend = backend
+        self.names = {name.lower(): name for name in process_names}
+        self.callback = callback
+        self.interval = interval
+        self.running = set()
+        self.pids = []
+        self.polls = 0
+        # Called after every snapshot, for wakeup accounting
+        self.on_poll = None
+        self._stop = threading.Event()
+        self._active = threading.Event()
+        self._active.set()
+        self._thread = None
+
+    def poll(self):
+        """Take one snapshot and emit the differences, returns (started, exited)"""
+        pids = []
+        current = set()
+        for pid, image_name in self.backend.list_process_entries():
+            name = self.names.get(image_name.lower())
+            if name:
+                current.add(name)
+                pids.append(pid)
+        self.polls += 1
+        self.pids = pids
+        if self.on_poll:
+            self.on_poll()
+
+        started = sorted(current - self.running)
+        exited = sorted(self.running - current)
+        self.running = current
+        for name in started:
+            self.emit(EVENT_PROCESS_STARTED, name)
+        for name in exited:
+            self.emit(EVENT_PROCESS_EXITED, name)
+        return started, exited
+
+    def emit(self, event, name):
+        logger.info(f"Process {name} {event}")
+        try:
+            self.callback(event, name)
+        except Exception as e:
+            logger.error(f"Error handling process event {event} for {name}: {e}")
+
+    def wait(self):
+        """Wait until the next snapshot is due"""
+        wait_for_exit = getattr(self.backend, 'wait_for_process_exit', None)
+        if self.pids and wait_for_exit:
+            wait_for_exit(self.pids, self.interval)
+        else:
+            self._stop.wait(self.interval)
+
+    def start(self):
+        # The first snapshot is the baseline, the monitor's own first cycle covers it
+        self.running = {self.names[image_name.lower()] for _, image_name in self.backend.list_process_entries()
+                        if image_name.lower() in self.names}
+        self._thread = threading.Thread(target=self._run, name='process-watcher', daemon=True)
+        self._thread.start()
+        logger.info(f"Watching for {', '.join(self.names.values())} starting and exiting")
+
+    def stop(self):
+        self._stop.set()
+        self._active.set()
+
+    def pause(self):
+        """Stop taking snapshots until resume(), a wait already under way still finishes"""
+        if self._active.is_set():
+            logger.debug("Process watcher paused")
+            self._active.clear()
+
+    def resume(self):
+        if not self._active.is_set():
+            logger.debug("Process watcher resumed")
+            self._active.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._active.wait()
+                self.wait()
+                if not self._stop.is_set():
+                    self.poll()
+            except Exception as e:
+                logger.error(f"Error watching processes: {e}")
+                self._stop.wait(self.interval)
@@ -0,0 +1,296 @@
+"""
+Session Monitor - One manager servicing every interactive user on a terminal server
+
+Each cycle lists the logged-on sessions once, takes one process snapshot for
+the whole machine and splits it by session number. Sessions running Discord
+are then checked one after another, and promoted if needed, through the
+user's own NotifyIconSettings hive under HKEY_USERS. A check is a few registry
+reads, so a worker pool cost more in hand-offs than it saved even at 500
+sessions. Session sources and hives are injectable, so FakeSessionSource plus
+one SimulatedDesktop per hive lets hundreds of sessions run off Windows.
+"""
+
+import ctypes
+import logging
+from collections import namedtuple
+
+from cycle_metrics import NULL_METRICS, STAGE_PROCESS_SCAN, STAGE_REGISTRY
+from monitor_core import (Snapshot, INITIAL_STATE, STATE_NOT_RUNNING, DEFAULT_MAX_FAILURES, ACTION_FIX,
+                          ACTION_SUPPRESSED, ACTION_BACKOFF, decide, apply_fix_result)
+from state_cache import FULL_SCAN_INTERVAL
+from tray_status import (STATUS_OK, STATUS_FIXING, STATUS_NOT_RUNNING, STATUS_DEGRADED, STATUS_STARTING,
+                         STATUS_MONITOR_ONLY, TARGET_STATUS_TEXT)
+
+logger = logging.getLogger(__name__)
+
+STAGE_SESSIONS = 'session_enum'
+
+# Cycles a session is left alone for after its fixes kept failing
+SESSION_BACKOFF_CYCLES = 3
+
+# One logged-on user as reported by the session source
+SessionInfo = namedtuple('SessionInfo', ['session_id', 'user', 'sid'])
+
+WTS_CURRENT_SERVER_HANDLE = 0
+WTS_USER_NAME = 5
+WTS_DOMAIN_NAME = 7
+# Connected states that have a user logged on (disconnected sessions keep their Discord running)
+WTS_ACTIVE = 0
+WTS_DISCONNECTED = 4
+
+# Most severe first, the overall status is the worst session's
+STATUS_SEVERITY = [STATUS_DEGRADED, STATUS_MONITOR_ONLY, STATUS_FIXING, STATUS_STARTING, STATUS_OK,
+                   STATUS_NOT_RUNNING]
+
+class FakeSessionSource:
+    """Session source driven by hand, for tests, benchmarks and the simulated desktop"""
+
+    def __init__(self, sessions=()):
+        self.sessions = list(sessions)
+
+    def add_session(self, session_id, user, sid):
+        self.sessions.append(SessionInfo(session_id, user, sid))
+
+    def remove_session(self, session_id):
+        self.sessions = [s for s in self.sessions if s.session_id != session_id]
+
+    def list_sessions(self):
+        return list(self.sessions)
+
+class WtsSessionSource:
+    """Logged-on sessions from WTSEnumerateSessions, with each user's SID for HKEY_USERS"""
+
+    def __init__(self):
+        from ctypes import wintypes
+
+        self.wtsapi32 = ctypes.windll.wtsapi32
+        self.advapi32 = ctypes.windll.advapi32
+        self.kernel32 = ctypes.windll.kernel32
+        self.sids = {}
+
+        class WTS_SESSION_INFOW(ctypes.Structure):
+            _fields_ = [
+                ("SessionId", wintypes.DWORD),
+                ("pWinStationName", wintypes.LPWSTR),
+                ("State", ctypes.c_int),
+            ]
+
+        self._session_info_type = WTS_SESSION_INFOW
+
+    def list_sessions(self):
+        from ctypes import wintypes
+
+        info = ctypes.POINTER(self._session_info_type)()
+        count = wintypes.DWORD()
+        if not self.wtsapi32.WTSEnumerateSessionsW(WTS_CURRENT_SERVER_HANDLE, 0, 1,
+                                                   ctypes.byref(info), ctypes.byref(count)):
+            raise ctypes.WinError()
+        try:
+            candidates = [(info[i].SessionId, info[i].State) for i in range(count.value)]
+        finally:
+            self.wtsapi32.WTSFreeMemory(info)
+
+        sessions = []
+        for session_id, state in candidates:
+            if state not in (WTS_ACTIVE, WTS_DISCONNECTED):
+                continue
+            user = self.query_session_string(session_id, WTS_USER_NAME)
+            if not user:
+                continue
+            account = f"{self.query_session_string(session_id, WTS_DOMAIN_NAME)}\\{user}"
+            sid = self.lookup_sid(account)
+            if sid:
+                sessions.append(SessionInfo(session_id, account, sid))
+        return sessions
+
+    def query_session_string(self, session_id, info_class):
+        from ctypes import wintypes
+
+        buffer = wintypes.LPWSTR()
+        size = wintypes.DWORD()
+        if not self.wtsapi32.WTSQuerySessionInformationW(WTS_CURRENT_SERVER_HANDLE, session_id, info_class,
+                                                         ctypes.byref(buffer), ctypes.byref(size)):
+            return ""
+        try:
+            return buffer.value or ""
+        finally:
+            self.wtsapi32.WTSFreeMemory(buffer)
+
+    def lookup_sid(self, account):
+        """String SID of an account, cached since it never changes"""
+        from ctypes import wintypes
+
+        if account in self.sids:
+            return self.sids[account]
+        sid = ctypes.create_string_buffer(256)
+        sid_size = wintypes.DWORD(256)
+        domain = ctypes.create_unicode_buffer(256)
+        domain_size = wintypes.DWORD(256)
+        use = wintypes.DWORD()
+        if not self.advapi32.LookupAccountNameW(None, account, sid, ctypes.byref(sid_size),
+                                                domain, ctypes.byref(domain_size), ctypes.byref(use)):
+            logger.warning(f"Could not look up SID for {account}: {ctypes.WinError()}")
+            return None
+        string_sid = wintypes.LPWSTR()
+        if not self.advapi32.ConvertSidToStringSidW(sid, ctypes.byref(string_sid)):
+            return None
+        try:
+            self.sids[account] = string_sid.value
+        finally:
+            self.kernel32.LocalFree(string_sid)
+        return self.sids[account]
+
+class SessionState:
+    """What the monitor carries per session, slotted so hundreds of sessions stay small"""
+
+    __slots__ = ('user', 'sid', 'state', 'subkeys', 'checks', 'backoff')
+
+    def __init__(self, user, sid):
+        self.user = user
+        self.sid = sid
+        self.state = INITIAL_STATE
+        # Discord's NotifyIconSettings keys in this user's hive, None until scanned
+        self.subkeys = None
+        self.checks = 0
+        # Cycles still to skip after repeated fix failures
+        self.backoff = 0
+
+class SessionMonitor:
+    """Checks and promotes Discord's tray icon in every logged-on session"""
+
+    def __init__(self, source, backend, hive_factory, profile, metrics=NULL_METRICS,
+                 auto_fix=True, max_failures=DEFAULT_MAX_FAILURES):
+        self.source = source
+        self.backend = backend
+        self.hive_factory = hive_factory
+        self.profile = profile
+        self.process_names = {name.lower() for name in profile.process_names}
+        self.metrics = metrics
+        self.auto_fix = auto_fix
+        self.max_failures = max_failures
+        self.sessions = {}
+
+    def process_counts(self):
+        """Return {session_id: Discord process count} from one machine-wide snapshot"""
+        counts = {}
+        names = self.process_names
+        with self.metrics.stage(STAGE_PROCESS_SCAN):
+            for session_id, image_name in self.backend.list_session_processes():
+                if image_name.lower() in names:
+                    counts[session_id] = counts.get(session_id, 0) + 1
+        return counts
+
+    def run_cycle(self):
+        """Check every session once, returns the overall status"""
+        with self.metrics.stage(STAGE_SESSIONS):
+            logged_on = self.source.list_sessions()
+        counts = self.process_counts()
+
+        sessions = {}
+        for info in logged_on:
+            session = self.sessions.get(info.session_id)
+            # A reused session id belongs to whoever is logged on now
+            if session is None or session.sid != info.sid:
+                logger.info(f"Session {info.session_id} ({info.user}) logged on")
+                session = SessionState(info.user, info.sid)
+            sessions[info.session_id] = session
+        for session_id in self.sessions.keys() - sessions.keys():
+            logger.info(f"Session {session_id} ({self.sessions[session_id].user}) logged off")
+        self.sessions = sessions
+
+        running = []
+        for session_id, session in sessions.items():
+            if counts.get(session_id):
+                running.append((session_id, session))
+            else:
+                self.set_state(session_id, session, STATE_NOT_RUNNING)
+
+        for session_id, session in running:
+            self.check_session(session_id, session)
+        self.metrics.increment('session_checks', len(running))
+        return self.overall_status()
+
+    def check_session(self, session_id, session):
+        """Check one session's hive and promote Discord there if it has been hidden"""
+        if session.backoff:
+            session.backoff -= 1
+            self.metrics.increment('session_backoff_skips')
+            return
+        try:
+            hive = self.hive_factory(session.sid)
+            visible = self.is_promoted(hive, session)
+        except Exception as e:
+            logger.error(f"Error checking session {session_id} ({session.user}): {e}")
+            return
+
+        state, actions = decide(Snapshot(True, visible), session.state, self.auto_fix)
+        if ACTION_FIX in actions:
+            success = self.promote(hive, session)
+            self.metrics.increment('session_fixes' if success else 'session_fix_failures')
+            state, follow_up = apply_fix_result(state, success, self.max_failures)
+            if ACTION_BACKOFF in follow_up:
+                logger.error(f"Too many consecutive failures fixing session {session_id} ({session.user}), "
+                             f"skipping it for {SESSION_BACKOFF_CYCLES} cycles")
+                session.backoff = SESSION_BACKOFF_CYCLES
+        elif ACTION_SUPPRESSED in actions:
+            self.metrics.increment('suppressed_actions')
+        self.set_state(session_id, session, state)
+
+    def set_state(self, session_id, session, state):
+        if state.status != session.state.status:
+            logger.info(f"Session {session_id} ({session.user}): "
+                        f"Discord {TARGET_STATUS_TEXT.get(state.status, state.status)}")
+        session.state = state
+
+    def scan(self, hive, session):
+        with self.metrics.stage(STAGE_REGISTRY):
+            session.subkeys = tuple(name for name in hive.enum_notify_icon_keys()
+                                    if self.profile.matches_registry_key(name))
+
+    def is_promoted(self, hive, session):
+        """Read IsPromoted from the session's known Discord keys, rescanning the hive periodically"""
+        if session.subkeys is None or session.checks % FULL_SCAN_INTERVAL == 0:
+            self.scan(hive, session)
+        session.checks += 1
+        if not session.subkeys:
+            return True  # No entries yet, assume it's fine (might be first run)
+        try:
+            with self.metrics.stage(STAGE_REGISTRY):
+                return any(hive.get_notify_icon_value(name, "IsPromoted") == 1 for name in session.subkeys)
+        except OSError:
+            # A known entry disappeared, rescan on the next check
+            session.subkeys = None
+            return True
+
+    def promote(self, hive, session):
+        """Set IsPromoted on every Discord entry in the session's hive, True if any was written"""
+        promoted = False
+        with self.metrics.stage(STAGE_REGISTRY):
+            for name in session.subkeys:
+                try:
+                    hive.set_notify_icon_value(name, "IsPromoted", 1)
+                    promoted = True
+                except OSError as e:
+                    logger.error(f"Could not promote {name} for {session.user}: {e}")
+        return promoted
+
+    def status_counts(self):
+        """Return {status: number of sessions}"""
+        counts = {}
+        for session in self.sessions.values():
+            counts[session.state.status] = counts.get(session.state.status, 0) + 1
+        return counts
+
+    def overall_status(self):
+        counts = self.status_counts()
+        for status in STATUS_SEVERITY:
+            if counts.get(status):
+                return status
+        return STATUS_NOT_RUNNING
+
+    def status_text(self):
+        counts = self.status_counts()
+        if not counts:
+            return "no sessions"
+        return ", ".join(f"{counts[status]} {TARGET_STATUS_TEXT[status]}" for status in STATUS_SEVERITY
+                         if counts.get(status))
@@ -0,0 +1,169 @@
+"""
+Shadow Mode - Costs out every fix strategy against the live desktop without side effects
+
+ShadowBackend passes every read through to the real backend but swallows the
+writes (messages, repaints, registry values), recording them as a plan instead.
+cost_strategies() runs each strategy of a TrayIconManager on top of it and
+reports what it would have done, how many targets it would have touched and
+how long the preparation took.
+"""
+
+import time
+import logging
+
+from desktop_backend import HWND_BROADCAST
+from tray_icon_helper import WM_COMMAND, WM_SETTINGCHANGE
+from cycle_budget import NULL_BUDGET
+
+logger = logging.getLogger(__name__)
+
+# Strategy name -> TrayIconManager method, in the order the fix chain tries them
+STRATEGIES = (
+    ('startallback', 'promote_discord_startallback_compatible'),
+    ('shell_api', 'promote_discord_shell_api'),
+    ('registry', 'registry_promote_discord'),
+    ('tray_refresh', 'refresh_tray_windows'),
+    ('window_simulation', 'simulate_discord_tray_action'),
+    # The whole chain exactly as fix_discord_tray_icon would run it
+    ('full_fix', 'refresh_notification_area'),
+)
+
+MESSAGE_NAMES = {WM_COMMAND: 'WM_COMMAND', WM_SETTINGCHANGE: 'WM_SETTINGCHANGE'}
+
+class ShadowBackend:
+    """Backend proxy that performs reads and records writes without performing them"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.planned = []
+        self._message_names = dict(MESSAGE_NAMES)
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def register_window_message(self, name):
+        message_id = self.backend.register_window_message(name)
+        self._message_names[message_id] = name
+        return message_id
+
+    def message_name(self, msg):
+        return self._message_names.get(msg, hex(msg))
+
+    # Writes are planned, not performed; report success so later steps are planned too
+
+    def send_message(self, hwnd, msg, wparam, lparam):
+        self.planned.append(('send', hwnd, self.message_name(msg), wparam, lparam))
+        return 1
+
+    def invalidate_rect(self, hwnd):
+        self.planned.append(('invalidate', hwnd))
+        return 1
+
+    def update_window(self, hwnd):
+        self.planned.append(('update', hwnd))
+        return 1
+
+    def set_notify_icon_value(self, subkey, name, value):
+        self.planned.append(('registry', subkey, name, value))
+
+def describe_op(op):
+    """Human-readable description of one planned operation"""
+    kind = op[0]
+    if kind == 'send':
+        _, hwnd, msg, wparam, lparam = op
+        target = 'HWND_BROADCAST' if hwnd == HWND_BROADCAST else f"hwnd={hwnd:#x}"
+        return f"SendMessage {msg} to {target} (wParam={wparam}, lParam={lparam})"
+    if kind == 'invalidate':
+        return f"InvalidateRect hwnd={op[1]:#x}"
+    if kind == 'update':
+        return f"UpdateWindow hwnd={op[1]:#x}"
+    _, subkey, name, value = op
+    return f"Set NotifyIconSettings\\{subkey}\\{name} = {value}"
+
+def summarize_ops(ops):
+    """Count messages, broadcasts, distinct windows and registry writes in a plan"""
+    windows = set()
+    messages = broadcasts = registry_writes = 0
+    for op in ops:
+        if op[0] == 'registry':
+            registry_writes += 1
+            continue
+        if op[0] == 'send':
+            messages += 1
+            if op[1] == HWND_BROADCAST:
+                broadcasts += 1
+                continue
+        windows.add(op[1])
+    return {
+        'messages': messages,
+        'broadcasts': broadcasts,
+        'windows': len(windows),
+        'registry_writes': registry_writes,
+    }
+
+def cost_strategies(tray_manager, strategies=STRATEGIES):
+    """Run every strategy in shadow and return one result dict per strategy.
+
+    Each result has the strategy name, whether it would have reported
+    success, the seconds spent preparing it (detection and planning, the
+    skipped writes themselves are not included), the planned operations and
+    their counts from summarize_ops().
+    """
+    if tray_manager.fix_runner:
+        # Nothing left over from the last concurrent fix may run on the shadow backend
+        tray_manager.fix_runner.wait_idle()
+    backend = tray_manager.backend
+    budget = tray_manager.budget
+    cache = tray_manager.cache
+    shadow = ShadowBackend(backend)
+    tray_manager.backend = shadow
+    # Cost every step in full, whatever the current cycle's budget
+    tray_manager.budget = NULL_BUDGET
+    # Planned fixes must not be remembered as ones that worked
+    tray_manager.cache = cache.copy()
+    results = []
+    try:
+        for name, method in strategies:
+            shadow.planned = []
+            start = time.perf_counter()
+            try:
+                success = bool(getattr(tray_manager, method)())
+                error = None
+            except Exception as e:
+                success = False
+                error = str(e)
+            elapsed = time.perf_counter() - start
+            # Strategies that lost a concurrent fix finish on the shadow backend too
+            if tray_manager.fix_runner:
+                tray_manager.fix_runner.wait_idle()
+
+            result = {'strategy': name, 'success': success, 'seconds': elapsed,
+                      'ops': shadow.planned, 'error': error}
+            result.update(summarize_ops(shadow.planned))
+            results.append(result)
+    finally:
+        tray_manager.backend = backend
+        tray_manager.budget = budget
+        tray_manager.cache = cache
+    return results
+
+def log_shadow_report(results):
+    """Log every planned operation followed by the comparison table"""
+    for result in results:
+        logger.info(f"[shadow] {result['strategy']}: {len(result['ops'])} operation(s) planned, "
+                    f"success={result['success']}")
+        for op in result['ops']:
+            logger.info(f"[shadow]   would {describe_op(op)}")
+        if result['error']:
+            logger.error(f"[shadow]   failed while planning: {result['error']}")
+    for line in format_shadow_summary(results).splitlines():
+        logger.info(f"[shadow] {line}")
+
+def format_shadow_summary(results):
+    """Table comparing the strategies' cost and reach"""
+    lines = [f"{'strategy':<18} {'ok':<4} {'ms':>8} {'msgs':>5} {'bcast':>5} {'windows':>7} {'reg':>4}"]
+    for result in results:
+        lines.append(f"{result['strategy']:<18} {'yes' if result['success'] else 'no':<4} "
+                     f"{result['seconds'] * 1000:8.3f} {result['messages']:5d} {result['broadcasts']:5d} "
+                     f"{result['windows']:7d} {result['registry_writes']:4d}")
+    return '\n'.join(lines)
@@ -0,0 +1,234 @@
+"""
+Shell Events - Delivers taskbar, display, session and power signals to the monitor
+
+ShellEventWindow owns a hidden window on its own thread and forwards the
+registered TaskbarCreated message, which the shell broadcasts to every
+top-level window whenever the taskbar is recreated, and WM_DISPLAYCHANGE,
+sent when monitors are added, removed or resized. It also subscribes to
+session lock/unlock and connect/disconnect notifications, suspend/resume,
+display power and AC/battery changes. FakeShellEvents has the same
+interface and lets tests or the simulated desktop emit events by hand.
+"""
+
+import uuid
+import ctypes
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+EVENT_TASKBAR_CREATED = 'taskbar_created'
+EVENT_DISPLAY_CHANGED = 'display_changed'
+EVENT_SESSION_LOCKED = 'session_locked'
+EVENT_SESSION_UNLOCKED = 'session_unlocked'
+EVENT_SESSION_DISCONNECTED = 'session_disconnected'
+EVENT_SESSION_CONNECTED = 'session_connected'
+EVENT_DISPLAY_OFF = 'display_off'
+EVENT_DISPLAY_ON = 'display_on'
+EVENT_ON_BATTERY = 'on_battery'
+EVENT_ON_AC = 'on_ac'
+EVENT_SUSPENDED = 'suspended'
+EVENT_RESUMED = 'resumed'
+
+WM_DESTROY = 0x0002
+WM_CLOSE = 0x0010
+WM_DISPLAYCHANGE = 0x007E
+WM_POWERBROADCAST = 0x0218
+WM_WTSSESSION_CHANGE = 0x02B1
+WS_EX_TOOLWINDOW = 0x00000080
+MSGFLT_ALLOW = 1
+
+WINDOW_CLASS_NAME = "DiscordTrayManagerShellEvents"
+
+NOTIFY_FOR_THIS_SESSION = 0
+DEVICE_NOTIFY_WINDOW_HANDLE = 0
+
+# WM_WTSSESSION_CHANGE wParam -> event
+SESSION_CHANGES = {
+    1: EVENT_SESSION_CONNECTED,     # WTS_CONSOLE_CONNECT
+    2: EVENT_SESSION_DISCONNECTED,  # WTS_CONSOLE_DISCONNECT
+    3: EVENT_SESSION_CONNECTED,     # WTS_REMOTE_CONNECT
+    4: EVENT_SESSION_DISCONNECTED,  # WTS_REMOTE_DISCONNECT
+    7: EVENT_SESSION_LOCKED,        # WTS_SESSION_LOCK
+    8: EVENT_SESSION_UNLOCKED,      # WTS_SESSION_UNLOCK
+}
+
+PBT_APMSUSPEND = 0x0004
+PBT_APMRESUMESUSPEND = 0x0007
+PBT_APMRESUMEAUTOMATIC = 0x0012
+PBT_POWERSETTINGCHANGE = 0x8013
+
+# Power setting GUID -> {setting value: event}; a dimmed display (2) still shows the tray
+GUID_CONSOLE_DISPLAY_STATE = uuid.UUID('6fe69556-704a-47a0-8f24-c28d936fda47')
+GUID_ACDC_POWER_SOURCE = uuid.UUID('5d3e9a59-e9d5-4b00-a6bd-ff34ff516548')
+POWER_SETTINGS = {
+    GUID_CONSOLE_DISPLAY_STATE.bytes_le: {0: EVENT_DISPLAY_OFF, 1: EVENT_DISPLAY_ON, 2: EVENT_DISPLAY_ON},
+    GUID_ACDC_POWER_SOURCE.bytes_le: {0: EVENT_ON_AC, 1: EVENT_ON_BATTERY, 2: EVENT_ON_BATTERY},
+}
+
+class FakeShellEvents:
+    """Event source driven by emit(), for tests and the simulated desktop"""
+
+    def __init__(self):
+        self.callback = None
+
+    def start(self, callback):
+        self.callback = callback
+
+    def emit(self, event):
+        if self.callback:
+            self.callback(event)
+
+    def stop(self):
+        self.callback = None
+
+class ShellEventWindow:
+    """Hidden top-level window that receives TaskbarCreated, display, session and power messages.
+
+    Message-only windows (HWND_MESSAGE) never see broadcasts, so this is an
+    ordinary top-level window that is simply never shown; WS_EX_TOOLWINDOW
+    keeps it off the taskbar and Alt+Tab.
+    """
+
+    def __init__(self):
+        self.callback = None
+        self.hwnd = None
+        self.messages = {}
+        # Messages whose event depends on their parameters
+        self.decoders = {WM_WTSSESSION_CHANGE: self.session_event, WM_POWERBROADCAST: self.power_event}
+        self.notifications = []
+        self._thread = None
+        self._ready = threading.Event()
+
+    def start(self, callback):
+        self.callback = callback
+        self._thread = threading.Thread(target=self._run, name='shell-events', daemon=True)
+        self._thread.start()
+        self._ready.wait(5)
+
+    def stop(self):
+        if self.hwnd:
+            ctypes.windll.user32.PostMessageW(self.hwnd, WM_CLOSE, 0, 0)
+
+    def _create_window(self):
+        from ctypes import wintypes
+
+        user32 = ctypes.windll.user32
+        kernel32 = ctypes.windll.kernel32
+        LRESULT = wintypes.LPARAM
+        WNDPROC = ctypes.WINFUNCTYPE(LRESULT, wintypes.HWND, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM)
+
+        class WNDCLASSW(ctypes.Structure):
+            _fields_ = [
+                ("style", wintypes.UINT),
+                ("lpfnWndProc", WNDPROC),
+                ("cbClsExtra", ctypes.c_int),
+                ("cbWndExtra", ctypes.c_int),
+                ("hInstance", wintypes.HINSTANCE),
+                ("hIcon", wintypes.HICON),
+                ("hCursor", wintypes.HANDLE),
+                ("hbrBackground", wintypes.HBRUSH),
+                ("lpszMenuName", wintypes.LPCWSTR),
+                ("lpszClassName", wintypes.LPCWSTR),
+            ]
+
+        user32.DefWindowProcW.argtypes = [wintypes.HWND, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM]
+        user32.DefWindowProcW.restype = LRESULT
+
+        def window_proc(hwnd, msg, wparam, lparam):
+            event = self.messages.get(msg)
+            if event:
+                self.dispatch(event)
+                return 0
+            decode = self.decoders.get(msg)
+            if decode:
+                event = decode(wparam, lparam)
+                if event:
+                    self.dispatch(event)
+            elif msg == WM_DESTROY:
+                self._unregister_notifications()
+                user32.PostQuitMessage(0)
+                return 0
+            return user32.DefWindowProcW(hwnd, msg, wparam, lparam)
+
+        # Keep the callback alive for as long as the window exists
+        self._window_proc = WNDPROC(window_proc)
+        hinstance = kernel32.GetModuleHandleW(None)
+        window_class = WNDCLASSW(lpfnWndProc=self._window_proc, hInstance=hinstance,
+                                 lpszClassName=WINDOW_CLASS_NAME)
+        user32.RegisterClassW(ctypes.byref(window_class))
+
+        self.hwnd = user32.CreateWindowExW(WS_EX_TOOLWINDOW, WINDOW_CLASS_NAME, "Discord Tray Manager", 0,
+                                           0, 0, 0, 0, None, None, hinstance, None)
+        if not self.hwnd:
+            raise ctypes.WinError()
+
+        taskbar_created = user32.RegisterWindowMessageW("TaskbarCreated")
+        self.messages[taskbar_created] = EVENT_TASKBAR_CREATED
+        self.messages[WM_DISPLAYCHANGE] = EVENT_DISPLAY_CHANGED
+        # Let the shell's broadcast through even when running elevated
+        user32.ChangeWindowMessageFilterEx(self.hwnd, taskbar_created, MSGFLT_ALLOW, None)
+        self._register_notifications()
+
+    def _register_notifications(self):
+        """Subscribe to session changes and the power settings in POWER_SETTINGS"""
+        user32 = ctypes.windll.user32
+        user32.RegisterPowerSettingNotification.restype = ctypes.c_void_p
+        if not ctypes.windll.wtsapi32.WTSRegisterSessionNotification(self.hwnd, NOTIFY_FOR_THIS_SESSION):
+            logger.warning(f"Could not subscribe to session changes: {ctypes.WinError()}")
+        # Windows sends each setting's current value straight away
+        for guid in POWER_SETTINGS:
+            handle = user32.RegisterPowerSettingNotification(self.hwnd, (ctypes.c_ubyte * 16).from_buffer_copy(guid),
+                                                              DEVICE_NOTIFY_WINDOW_HANDLE)
+            if handle:
+                self.notifications.append(handle)
+            else:
+                logger.warning(f"Could not subscribe to power setting {uuid.UUID(bytes_le=guid)}")
+
+    def _unregister_notifications(self):
+        ctypes.windll.wtsapi32.WTSUnRegisterSessionNotification(self.hwnd)
+        for handle in self.notifications:
+            ctypes.windll.user32.UnregisterPowerSettingNotification(ctypes.c_void_p(handle))
+        self.notifications = []
+
+    def session_event(self, wparam, lparam):
+        return SESSION_CHANGES.get(wparam)
+
+    def power_event(self, wparam, lparam):
+        if wparam == PBT_APMSUSPEND:
+            return EVENT_SUSPENDED
+        if wparam in (PBT_APMRESUMESUSPEND, PBT_APMRESUMEAUTOMATIC):
+            return EVENT_RESUMED
+        if wparam == PBT_POWERSETTINGCHANGE and lparam:
+            # POWERBROADCAST_SETTING: the setting's GUID, DataLength, then a DWORD for both settings used
+            guid = ctypes.string_at(lparam, 16)
+            values = POWER_SETTINGS.get(guid)
+            if values:
+                return values.get(ctypes.c_uint32.from_address(lparam + 20).value)
+        return None
+
+    def dispatch(self, event):
+        logger.debug(f"Shell event: {event}")
+        try:
+            self.callback(event)
+        except Exception as e:
+            logger.error(f"Error handling shell event {event}: {e}")
+
+    def _run(self):
+        from ctypes import wintypes
+
+        try:
+            self._create_window()
+        except Exception as e:
+            logger.error(f"Could not create shell event window: {e}")
+            self._ready.set()
+            return
+        logger.info(f"Listening for taskbar restarts (hwnd={self.hwnd})")
+        self._ready.set()
+
+        user32 = ctypes.windll.user32
+        msg = wintypes.MSG()
+        while user32.GetMessageW(ctypes.byref(msg), None, 0, 0) > 0:
+            user32.TranslateMessage(ctypes.byref(msg))
+            user32.DispatchMessageW(ctypes.byref(msg))
+        self.hwnd = None
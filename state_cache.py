@@ -0,0 +1,118 @@
+"""
+State Cache - Facts about this desktop remembered across cycles and restarts
+
+Holds which NotifyIconSettings subkeys are Discord's, the tray variant in use,
+the fix strategy that last worked and recent Discord executable paths. The
+monitor keeps it in memory to check only the known subkeys each cycle, and
+persists it as a small versioned JSON file so a new login starts warm.
+"""
+
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+STATE_CACHE_VERSION = 1
+
+# Targeted checks between full registry scans, so new Discord entries are still picked up
+FULL_SCAN_INTERVAL = 20
+
+MAX_EXECUTABLE_PATHS = 5
+
+TRAY_STOCK = 'stock'
+TRAY_STARTALLBACK = 'startallback'
+
+class StateCache:
+    """Warm-start facts, with a dirty flag so only changes are written"""
+
+    def __init__(self, discord_subkeys=(), tray_variant=None, last_strategy=None, executable_paths=()):
+        self.discord_subkeys = list(discord_subkeys)
+        self.tray_variant = tray_variant
+        self.last_strategy = last_strategy
+        self.executable_paths = list(executable_paths)
+        self.targeted_checks = 0
+        self.loaded = False
+        self.dirty = False
+
+    def _set(self, name, value):
+        if getattr(self, name) != value:
+            setattr(self, name, value)
+            self.dirty = True
+
+    def set_discord_subkeys(self, subkeys):
+        self._set('discord_subkeys', list(subkeys))
+        self.targeted_checks = 0
+
+    def set_tray_variant(self, variant):
+        if self.tray_variant and variant != self.tray_variant:
+            # A different taskbar means the last strategy may no longer apply
+            logger.info(f"Tray variant changed from {self.tray_variant} to {variant}, forgetting last strategy")
+            self._set('last_strategy', None)
+        self._set('tray_variant', variant)
+
+    def set_last_strategy(self, strategy):
+        self._set('last_strategy', strategy)
+
+    def remember_executable(self, path):
+        paths = [path] + [p for p in self.executable_paths if p != path]
+        self._set('executable_paths', paths[:MAX_EXECUTABLE_PATHS])
+
+    def needs_full_scan(self):
+        return not self.discord_subkeys or self.targeted_checks >= FULL_SCAN_INTERVAL
+
+    def invalidate(self, reason):
+        """Drop the known subkeys so the next check does a full scan"""
+        logger.info(f"State cache is stale ({reason}), falling back to a full scan")
+        self.set_discord_subkeys([])
+
+    def copy(self):
+        cache = StateCache(self.discord_subkeys, self.tray_variant, self.last_strategy, self.executable_paths)
+        cache.targeted_checks = self.targeted_checks
+        return cache
+
+    def to_dict(self):
+        return {
+            'version': STATE_CACHE_VERSION,
+            'discord_subkeys': self.discord_subkeys,
+            'tray_variant': self.tray_variant,
+            'last_strategy': self.last_strategy,
+            'executable_paths': self.executable_paths,
+        }
+
+def cache_from_dict(data):
+    """Rebuild a cache from to_dict() output, a trace header may add targeted_checks"""
+    cache = StateCache(data.get('discord_subkeys', ()), data.get('tray_variant'),
+                       data.get('last_strategy'), data.get('executable_paths', ()))
+    cache.targeted_checks = data.get('targeted_checks', 0)
+    return cache
+
+def load_state_cache(path):
+    """Load the cache file, or return an empty cache if it is missing, corrupt or from another version"""
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        logger.info("No state cache found, starting cold")
+        return StateCache()
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read state cache {path}: {e}, starting cold")
+        return StateCache()
+
+    if not isinstance(data, dict) or data.get('version') != STATE_CACHE_VERSION:
+        logger.info(f"Ignoring state cache from version {data.get('version') if isinstance(data, dict) else None}")
+        return StateCache()
+
+    cache = cache_from_dict(data)
+    cache.loaded = True
+    logger.info(f"Loaded state cache: {len(cache.discord_subkeys)} Discord registry entries, "
+                f"tray={cache.tray_variant}, last strategy={cache.last_strategy}")
+    return cache
+
+def save_state_cache(cache, path):
+    """Atomically rewrite the cache file and clear the dirty flag"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(cache.to_dict(), f, indent=4)
+    os.replace(tmp_path, path)
+    cache.dirty = False
@@ -0,0 +1,290 @@
+"""
+State Trace - Records each cycle's observed desktop state and actions, and replays them
+
+The recorder wraps the desktop backend, keeps the first observation of every
+input in a cycle (Discord processes, Discord/tray windows, Discord's
+NotifyIconSettings values, shell tray handles) plus every side effect, and
+appends one delta-encoded JSON line per cycle. The replayer rebuilds each
+cycle on a SimulatedDesktop, runs it through the monitor at full speed and
+checks the same actions come out.
+"""
+
+import json
+import time
+import logging
+
+from desktop_backend import SimulatedDesktop
+from tray_icon_helper import is_discord_registry_key
+from tray_topology import OVERFLOW_CLASSES
+from state_cache import StateCache, cache_from_dict
+
+logger = logging.getLogger(__name__)
+
+TRACE_VERSION = 1
+
+# Snapshot fields, delta-encoded against the previous cycle
+SNAPSHOT_FIELDS = ('processes', 'windows', 'notify_icons', 'tray')
+
+def is_relevant_window(class_name, title):
+    """Windows the monitor's decisions depend on: Discord's own and the shell tray's"""
+    class_lower = class_name.lower()
+    return ('discord' in class_lower or 'discord' in title.lower() or
+            'startallback' in class_lower or 'traywnd' in class_lower or 'traynotifywnd' in class_lower)
+
+class RecordingBackend:
+    """Backend proxy that captures a cycle's inputs and actions"""
+
+    def __init__(self, backend, process_names):
+        self.backend = backend
+        self.process_names = {name.lower() for name in process_names}
+        self._message_names = {}
+        # Class of every tray window looked up, so cycles that reuse a cached handle still record it
+        self._tray_classes = {}
+        self.begin_cycle()
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def begin_cycle(self):
+        self.snapshot = {'tray': {}}
+        self.notify_icons = {}
+        self.actions = []
+
+    def end_cycle(self):
+        """Return (snapshot, actions) observed since begin_cycle()"""
+        self.snapshot.setdefault('processes', [])
+        self.snapshot.setdefault('windows', [])
+        self.snapshot['notify_icons'] = self.notify_icons
+        return self.snapshot, self.actions
+
+    # Inputs, the first observation in a cycle wins
+
+    def list_processes(self):
+        processes = self.backend.list_processes()
+        if 'processes' not in self.snapshot:
+            self.snapshot['processes'] = sorted(p for p in processes if p.lower() in self.process_names)
+        return processes
+
+    def enum_windows(self):
+        windows = self.backend.enum_windows()
+        if 'windows' not in self.snapshot:
+            self.snapshot['windows'] = [[hwnd, class_name, title] for hwnd, class_name, title in windows
+                                        if is_relevant_window(class_name, title)]
+        return windows
+
+    def find_window(self, class_name, title=None):
+        hwnd = self.backend.find_window(class_name, title)
+        self.record_tray_window(class_name, hwnd)
+        return hwnd
+
+    def find_window_ex(self, parent, child_after, class_name):
+        hwnd = self.backend.find_window_ex(parent, child_after, class_name)
+        self.record_tray_window(class_name, hwnd)
+        return hwnd
+
+    def is_window(self, hwnd):
+        alive = self.backend.is_window(hwnd)
+        if alive and hwnd in self._tray_classes:
+            self.snapshot['tray'].setdefault(self._tray_classes[hwnd], hwnd)
+        return alive
+
+    def record_tray_window(self, class_name, hwnd):
+        if hwnd:
+            self._tray_classes[hwnd] = class_name
+        self.snapshot['tray'].setdefault(class_name, hwnd)
+
+    def enum_notify_icon_keys(self):
+        keys = self.backend.enum_notify_icon_keys()
+        for key in keys:
+            if is_discord_registry_key(key):
+                self.notify_icons.setdefault(key, {})
+        return keys
+
+    def get_notify_icon_value(self, subkey, name):
+        value = self.backend.get_notify_icon_value(subkey, name)
+        self.notify_icons.setdefault(subkey, {}).setdefault(name, value)
+        return value
+
+    def register_window_message(self, name):
+        message_id = self.backend.register_window_message(name)
+        self._message_names[message_id] = name
+        return message_id
+
+    # Actions
+
+    def send_message(self, hwnd, msg, wparam, lparam):
+        self.actions.append(['send', hwnd, self._message_names.get(msg, msg), wparam, lparam])
+        return self.backend.send_message(hwnd, msg, wparam, lparam)
+
+    def invalidate_rect(self, hwnd):
+        self.actions.append(['invalidate', hwnd])
+        return self.backend.invalidate_rect(hwnd)
+
+    def update_window(self, hwnd):
+        self.actions.append(['update', hwnd])
+        return self.backend.update_window(hwnd)
+
+    def set_notify_icon_value(self, subkey, name, value):
+        self.actions.append(['registry', subkey, name, value])
+        return self.backend.set_notify_icon_value(subkey, name, value)
+
+class TraceWriter:
+    """Append-only, delta-encoded trace file, one JSON line per cycle"""
+
+    def __init__(self, path, clock=time.time, cache=None):
+        self.path = path
+        self.clock = clock
+        self.previous = {}
+        self.previous_actions = None
+        self.cycle = 0
+        self._file = open(path, 'a')
+        self.origin = clock()
+        header = {'v': TRACE_VERSION, 'start': self.origin}
+        if cache is not None:
+            # The warm cache picks the first strategy and which registry entries are read, replay starts from it
+            header['cache'] = dict(cache.to_dict(), targeted_checks=cache.targeted_checks)
+        self._write(header)
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self._file.flush()
+
+    def write_cycle(self, snapshot, actions):
+        record = {'c': self.cycle, 't': round(self.clock() - self.origin, 1)}
+        delta = {field: snapshot[field] for field in SNAPSHOT_FIELDS
+                 if snapshot.get(field) != self.previous.get(field)}
+        if delta:
+            record['d'] = delta
+        if actions:
+            # A fixer that keeps repeating itself is stored as a back-reference
+            record['a'] = 1 if actions == self.previous_actions else actions
+            self.previous_actions = actions
+        self._write(record)
+        self.previous = snapshot
+        self.cycle += 1
+
+    def close(self):
+        self._file.close()
+
+class TraceRecorder:
+    """Hooks a RecordingBackend into the monitor and writes each cycle to a trace"""
+
+    def __init__(self, backend, process_names, path, cache=None):
+        self.backend = RecordingBackend(backend, process_names)
+        self.writer = TraceWriter(path, cache=cache)
+        logger.info(f"Recording cycle trace to {path}")
+
+    def begin_cycle(self):
+        self.backend.begin_cycle()
+
+    def end_cycle(self):
+        snapshot, actions = self.backend.end_cycle()
+        self.writer.write_cycle(snapshot, actions)
+
+    def close(self):
+        self.writer.close()
+
+def read_trace(path, on_session=None):
+    """Yield (cycle, timestamp, snapshot, actions) with deltas expanded.
+
+    ``on_session(header)`` is called with each recording session's header
+    record before that session's cycles.
+    """
+    snapshot = {}
+    previous_actions = []
+    with open(path, 'r') as f:
+        for line in f:
+            record = json.loads(line)
+            if 'v' in record:
+                if record['v'] != TRACE_VERSION:
+                    raise ValueError(f"Unsupported trace version {record['v']} in {path}")
+                # Each recording session restarts from a full snapshot
+                snapshot = {}
+                previous_actions = []
+                if on_session:
+                    on_session(record)
+                continue
+            delta = record.get('d')
+            if delta:
+                snapshot = dict(snapshot, **delta)
+            actions = record.get('a', [])
+            if actions == 1:
+                actions = previous_actions
+            elif actions:
+                previous_actions = actions
+            yield record['c'], record['t'], snapshot, actions
+
+def build_desktop(snapshot):
+    """Recreate the recorded inputs of one cycle on a simulated desktop"""
+    desktop = SimulatedDesktop()
+    for process in snapshot.get('processes', ()):
+        desktop.add_process(process)
+    for hwnd, class_name, title in snapshot.get('windows', ()):
+        desktop.add_window(class_name, title, hwnd=hwnd)
+
+    tray = snapshot.get('tray', {})
+    tray_wnd = tray.get('Shell_TrayWnd')
+    if tray_wnd and tray_wnd not in desktop.windows:
+        desktop.add_window('Shell_TrayWnd', hwnd=tray_wnd)
+    if tray.get('TrayNotifyWnd'):
+        desktop.add_window('TrayNotifyWnd', parent=tray_wnd, hwnd=tray['TrayNotifyWnd'])
+    for class_name in OVERFLOW_CLASSES:
+        overflow_wnd = tray.get(class_name)
+        if overflow_wnd and overflow_wnd not in desktop.windows:
+            desktop.add_window(class_name, hwnd=overflow_wnd)
+
+    for subkey, values in snapshot.get('notify_icons', {}).items():
+        desktop.add_notify_icon(subkey, **{name: value for name, value in values.items() if value is not None})
+    return desktop
+
+class ReplayBackend:
+    """Delegates to the current cycle's simulated desktop, swapped per cycle"""
+
+    def __init__(self):
+        self.desktop = SimulatedDesktop()
+
+    def __getattr__(self, name):
+        return getattr(self.desktop, name)
+
+def replay_trace(path, manager_factory, max_mismatches=20):
+    """Replay a trace through the monitor with no sleeps.
+
+    ``manager_factory(backend)`` must return a DiscordTrayManager-like object
+    with ``run_cycle()``. Returns a dict with cycle count, mismatches and
+    cycles per second.
+    """
+    replay = ReplayBackend()
+    recorder = RecordingBackend(replay, ())
+    manager = manager_factory(recorder)
+    recorder.process_names = {name.lower() for name in manager.discord_processes}
+
+    def start_session(header):
+        # Recordings without a cache were made cold
+        cache = header.get('cache')
+        manager.tray_manager.cache = cache_from_dict(cache) if cache else StateCache()
+
+    cycles = 0
+    mismatches = []
+    previous = None
+    actions = None
+    start = time.perf_counter()
+    for cycle, timestamp, snapshot, expected in read_trace(path, start_session):
+        # Unchanged inputs and no writes last cycle: the desktop is still accurate
+        if snapshot is not previous or actions:
+            replay.desktop = build_desktop(snapshot)
+            previous = snapshot
+        recorder.begin_cycle()
+        manager.run_cycle()
+        _, actions = recorder.end_cycle()
+        if actions != expected:
+            if len(mismatches) < max_mismatches:
+                mismatches.append({'cycle': cycle, 't': timestamp, 'expected': expected, 'actual': actions})
+        cycles += 1
+    elapsed = time.perf_counter() - start
+
+    return {
+        'cycles': cycles,
+        'mismatches': mismatches,
+        'seconds': elapsed,
+        'cycles_per_second': cycles / elapsed if elapsed else 0.0,
+    }
@@ -0,0 +1,260 @@
+"""
+Target Profiles - Apps whose tray icons are kept visible, matched from one shared snapshot
+
+Each TargetProfile names the processes, windows and NotifyIconSettings keys of
+one app. ProfileMatcher folds every profile into a process lookup table and
+precompiled alternations with one named group per profile, so a single pass
+over the process list, window list and registry keys serves all targets.
+CycleSnapshot takes those passes at most once per cycle and hands each
+profile its share.
+
+A pattern with groups or inline flags would change meaning inside the
+alternation, so such a profile is searched with its own regex instead.
+Plain-text patterns only share an input when one contains the other; an
+input that merely mentions two apps goes to the one the alternation hits
+first.
+"""
+
+import re
+import logging
+import warnings
+
+from cycle_metrics import NULL_METRICS, STAGE_PROCESS_SCAN, STAGE_WINDOW_ENUM, STAGE_REGISTRY
+
+logger = logging.getLogger(__name__)
+
+DISCORD_PROFILE_NAME = 'Discord'
+
+# Same rules as find_discord_windows() and is_discord_registry_key(). Spelled as an
+# alternation rather than two anchored lookaheads, which backtrack over every key
+DISCORD_WINDOW_PATTERN = r'discord'
+DISCORD_REGISTRY_PATTERN = r'discord.*(?:exe|app)|(?:exe|app).*discord'
+
+class TargetProfile:
+    """Process names, window matcher and registry key matcher of one app"""
+
+    def __init__(self, name, process_names, window_pattern, registry_pattern):
+        self.name = name
+        self.process_names = list(process_names)
+        self.window_pattern = window_pattern
+        self.registry_pattern = registry_pattern
+        self.window_regex = re.compile(window_pattern, re.IGNORECASE)
+        self.registry_regex = re.compile(registry_pattern, re.IGNORECASE)
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a profile from a `targets` entry in config.json"""
+        name = config['name']
+        process_names = config.get('processes', [f"{name}.exe"])
+        window_pattern = config.get('window_match', re.escape(name))
+        registry_pattern = config.get('registry_match', re.escape(name))
+        return cls(name, process_names, window_pattern, registry_pattern)
+
+    def matches_window(self, class_name, title):
+        return bool(self.window_regex.search(title) or self.window_regex.search(class_name))
+
+    def matches_title(self, title):
+        return bool(self.window_regex.search(title))
+
+    def matches_registry_key(self, subkey_name):
+        return bool(self.registry_regex.search(subkey_name))
+
+def discord_profile(process_names):
+    return TargetProfile(DISCORD_PROFILE_NAME, process_names, DISCORD_WINDOW_PATTERN, DISCORD_REGISTRY_PATTERN)
+
+def load_profiles(discord_processes, targets):
+    """Discord first, then every valid `targets` entry"""
+    profiles = [discord_profile(discord_processes)]
+    names = {DISCORD_PROFILE_NAME}
+    for target in targets:
+        try:
+            profile = TargetProfile.from_config(target)
+        except (KeyError, TypeError, re.error) as e:
+            logger.error(f"Ignoring invalid target profile {target!r}: {e}")
+            continue
+        if profile.name in names:
+            logger.error(f"Ignoring duplicate target profile {profile.name}")
+            continue
+        names.add(profile.name)
+        profiles.append(profile)
+    return profiles
+
+# Characters that make a pattern more than plain text
+REGEX_SYNTAX = set('.^$*+?{}[]|()')
+
+def literal_text(pattern):
+    """The lowercased text a pattern matches literally, or None if it uses any regex syntax"""
+    chars = []
+    escaped = False
+    for char in pattern:
+        if escaped:
+            if char.isalnum():
+                # \d, \b, \1 and the like
+                return None
+            chars.append(char)
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char in REGEX_SYNTAX:
+            return None
+        else:
+            chars.append(char)
+    return None if escaped else ''.join(chars).lower()
+
+def can_combine(pattern):
+    """Whether a pattern keeps its meaning as one named group of the combined alternation"""
+    try:
+        with warnings.catch_warnings():
+            # Older Pythons only warn about global flags that are not at the start
+            warnings.simplefilter('error')
+            return re.compile(f'(?P<t>{pattern})').groups == 1
+    except (re.error, DeprecationWarning):
+        return False
+
+def no_match(string):
+    return None
+
+class CombinedPattern:
+    """One kind of pattern (window or registry) of every profile, folded into a single alternation"""
+
+    def __init__(self, profiles, kind, pattern_of):
+        self.groups = {}
+        self.separate = []
+        parts = []
+        for i, profile in enumerate(profiles):
+            pattern = pattern_of(profile)
+            if can_combine(pattern):
+                # Group names must be identifiers, so groups are numbered and mapped back
+                self.groups[f't{i}'] = profile
+                parts.append(f'(?P<t{i}>{pattern})')
+            else:
+                logger.warning(f"{profile.name} {kind} pattern {pattern!r} uses groups or flags, "
+                               f"matching it on its own")
+                self.separate.append(profile)
+        self.regex = re.compile('|'.join(parts), re.IGNORECASE) if parts else None
+        # The compiled regex's own search, a wrapper would cost a call per input
+        self.search = self.regex.search if self.regex else no_match
+
+        # Decided once: which other profiles can also match an input a profile's group matched
+        texts = {profile.name: literal_text(pattern_of(profile)) for profile in self.groups.values()}
+        self.overlaps = {}
+        for profile in self.groups.values():
+            text = texts[profile.name]
+            self.overlaps[profile.name] = [
+                other for other in self.groups.values()
+                if other is not profile and (text is None or texts[other.name] is None
+                                             or text in texts[other.name] or texts[other.name] in text)]
+
+    def owners(self, match, test):
+        """Profiles an input belongs to: the matched group's, any overlapping ones, and separate ones it matches"""
+        owners = []
+        if match:
+            first = self.groups[match.lastgroup]
+            owners.append(first.name)
+            owners.extend(p.name for p in self.overlaps[first.name] if test(p))
+        owners.extend(p.name for p in self.separate if test(p))
+        return owners
+
+class ProfileMatcher:
+    """All profiles' matchers combined so each input is tested once"""
+
+    def __init__(self, profiles):
+        self.profiles = profiles
+        self.process_index = {}
+        for profile in profiles:
+            for process_name in profile.process_names:
+                self.process_index.setdefault(process_name.lower(), []).append(profile.name)
+
+        self.windows = CombinedPattern(profiles, 'window', lambda p: p.window_pattern)
+        self.registry = CombinedPattern(profiles, 'registry', lambda p: p.registry_pattern)
+
+    def match_processes(self, process_names):
+        """Return {profile name: process count}"""
+        counts = {}
+        index = self.process_index
+        for image_name in process_names:
+            owners = index.get(image_name.lower())
+            if owners:
+                for name in owners:
+                    counts[name] = counts.get(name, 0) + 1
+        return counts
+
+    def match_windows(self, windows):
+        """Return {profile name: [window info dicts]} for (hwnd, class, title) tuples"""
+        matched = {}
+        combined = self.windows
+        search = combined.search
+        separate = combined.separate
+        for hwnd, class_name, title in windows:
+            if not title:
+                continue
+            match = search(title) or search(class_name)
+            if match or separate:
+                window_info = {'hwnd': hwnd, 'title': title, 'class': class_name}
+                for name in combined.owners(match, lambda p: p.matches_window(class_name, title)):
+                    matched.setdefault(name, []).append(window_info)
+        return matched
+
+    def match_registry_keys(self, subkey_names):
+        """Return {profile name: [subkey names]}"""
+        matched = {}
+        combined = self.registry
+        search = combined.search
+        separate = combined.separate
+        for subkey_name in subkey_names:
+            match = search(subkey_name)
+            if match or separate:
+                for name in combined.owners(match, lambda p: p.matches_registry_key(subkey_name)):
+                    matched.setdefault(name, []).append(subkey_name)
+        return matched
+
+class CycleSnapshot:
+    """One process list, window enumeration and registry walk per cycle, shared by all profiles.
+
+    Each part is taken lazily the first time a profile needs it and reused
+    until reset() at the start of the next cycle.
+    """
+
+    def __init__(self, backend, matcher, metrics=NULL_METRICS):
+        self.backend = backend
+        self.matcher = matcher
+        self.metrics = metrics
+        self.reset()
+
+    def reset(self):
+        self._process_counts = None
+        self._windows = None
+        self._profile_windows = None
+        self._registry_keys = None
+
+    def process_counts(self):
+        if self._process_counts is None:
+            with self.metrics.stage(STAGE_PROCESS_SCAN):
+                self._process_counts = self.matcher.match_processes(self.backend.list_processes())
+        return self._process_counts
+
+    def windows(self):
+        if self._windows is None:
+            with self.metrics.stage(STAGE_WINDOW_ENUM):
+                self._windows = self.backend.enum_windows()
+        return self._windows
+
+    def profile_windows(self, profile_name):
+        if self._profile_windows is None:
+            self._profile_windows = self.matcher.match_windows(self.windows())
+        return self._profile_windows.get(profile_name, [])
+
+    def observed_windows(self, profile_name):
+        """A profile's windows if this cycle enumerated windows anyway, otherwise None"""
+        if self._windows is None:
+            return None
+        return self.profile_windows(profile_name)
+
+    def registry_keys(self, profile_name):
+        """A profile's NotifyIconSettings keys, walking the registry once for everyone"""
+        if self._registry_keys is None:
+            with self.metrics.stage(STAGE_REGISTRY):
+                subkey_names = self.backend.enum_notify_icon_keys()
+                logger.debug(f"Enumerated {len(subkey_names)} NotifyIconSettings registry keys")
+                self._registry_keys = self.matcher.match_registry_keys(subkey_names)
+        return self._registry_keys.get(profile_name, [])
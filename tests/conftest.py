@@ -0,0 +1,41 @@
+"""
+Shared fixtures: the flat modules on sys.path, app data (log, state cache) kept out of the real profile
+and a settable clock
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CONFIG_PATH = os.path.join(ROOT, 'config.json')
+
+@pytest.fixture(autouse=True)
+def app_data(tmp_path, monkeypatch):
+    monkeypatch.setenv('LOCALAPPDATA', str(tmp_path))
+    return tmp_path
+
+@pytest.fixture
+def make_manager():
+    """Build a DiscordTrayManager on the given backend from the shipped config"""
+    from discord_tray_manager import DiscordTrayManager
+
+    def make(backend):
+        return DiscordTrayManager(CONFIG_PATH, backend)
+    return make
+
+class FakeClock:
+    """Monotonic clock that only moves when a test sets or advances `now`"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
@@ -0,0 +1,70 @@
+from call_burst import CallDetector, BurstSchedule, SETTLE_CYCLES
+from cycle_metrics import CycleMetrics
+
+def test_call_window_title():
+    detector = CallDetector()
+    detector.update_windows([{'title': 'Friends - Discord'}, {'title': 'Voice Connected | General - Discord'}])
+
+    assert detector.detect(4) == ["window 'Voice Connected | General - Discord'"]
+
+    detector.update_windows([{'title': 'Friends - Discord'}])
+    assert detector.detect(4) == []
+
+def test_extra_processes_after_settling():
+    detector = CallDetector(process_delta=2)
+
+    # Discord spawns helpers while loading, its first cycles set no baseline
+    for _ in range(SETTLE_CYCLES):
+        assert detector.detect(9) == []
+    assert detector.detect(4) == []
+    assert detector.detect(5) == []
+    assert detector.detect(6) == ["6 Discord processes (baseline 4)"]
+
+    # Discord exiting forgets the baseline
+    assert detector.detect(0) == []
+    assert detector.baseline is None
+
+def make_schedule(clock, max_burst_cycles=20):
+    metrics = CycleMetrics()
+    return BurstSchedule(30, 5, max_burst_cycles, metrics, clock=clock), metrics
+
+def test_burst_while_in_a_call(clock):
+    schedule, metrics = make_schedule(clock)
+    assert schedule.interval() == 30
+
+    schedule.update(["window 'Voice Connected'"])
+    assert schedule.in_call
+    for _ in range(12):
+        assert schedule.interval() == 5
+        schedule.record_cycle(0.002)
+        clock.now += 5
+        schedule.update(["window 'Voice Connected'"])
+
+    schedule.update([])
+    assert not schedule.in_call
+    assert schedule.interval() == 30
+    assert metrics.counters['calls_detected'] == 1
+    assert metrics.counters['burst_cycles'] == 12
+    # 60 seconds of call would have had 2 normal checks
+    assert metrics.counters['burst_extra_cycles'] == 10
+
+def test_burst_cycles_are_capped_per_call(clock):
+    schedule, metrics = make_schedule(clock, max_burst_cycles=3)
+    schedule.update(['call'])
+    for _ in range(5):
+        schedule.record_cycle(0.001)
+
+    assert schedule.burst_cycles == 3
+    assert schedule.interval() == 30
+
+    # The next call gets a fresh allowance
+    schedule.update([])
+    schedule.update(['call'])
+    assert schedule.interval() == 5
+    assert metrics.counters['calls_detected'] == 2
+
+def test_burst_interval_never_slows_checks(clock):
+    schedule = BurstSchedule(3, 5, 20, CycleMetrics(), clock=clock)
+    schedule.update(['call'])
+
+    assert schedule.interval() == 3
@@ -0,0 +1,117 @@
+import threading
+
+from change_events import (EventBus, SnapshotDiffer, describe_event, EVENT_DISCORD_STARTED, EVENT_DISCORD_STOPPED,
+                           EVENT_WINDOW_APPEARED, EVENT_WINDOW_CLOSED, EVENT_PROMOTION_CHANGED, EVENT_STATUS_CHANGED)
+from cycle_metrics import CycleMetrics
+
+def changes(subscription):
+    return [(event.kind, event.subject, event.old, event.new) for event in subscription.drain()]
+
+def test_differ_publishes_each_difference():
+    bus = EventBus()
+    subscription = bus.subscribe('test')
+    differ = SnapshotDiffer(bus)
+
+    differ.update(True, windows=[{'hwnd': 1, 'title': 'Friends - Discord'}], promotion={'Discord.exe_1': 1})
+    assert changes(subscription) == [(EVENT_DISCORD_STARTED, None, None, True)]
+
+    differ.update(True, windows=[{'hwnd': 2, 'title': 'Voice Connected - Discord'}], promotion={'Discord.exe_1': 0})
+    assert sorted(changes(subscription)) == [
+        (EVENT_PROMOTION_CHANGED, 'Discord.exe_1', 1, 0),
+        (EVENT_WINDOW_APPEARED, 2, None, 'Voice Connected - Discord'),
+        (EVENT_WINDOW_CLOSED, 1, 'Friends - Discord', None),
+    ]
+
+    differ.update(False)
+    assert changes(subscription) == [(EVENT_DISCORD_STOPPED, None, True, False)]
+
+def test_unobserved_parts_keep_their_value():
+    bus = EventBus()
+    subscription = bus.subscribe('test')
+    differ = SnapshotDiffer(bus)
+    differ.update(True, windows=[{'hwnd': 1, 'title': 'Discord'}])
+    subscription.drain()
+
+    # A cycle that took no window list or registry read publishes nothing
+    differ.update(True)
+    differ.update(True, windows=[{'hwnd': 1, 'title': 'Discord'}])
+
+    assert changes(subscription) == []
+    assert differ.windows == {1: 'Discord'}
+
+def test_subscribers_only_get_their_kinds():
+    bus = EventBus()
+    status = bus.subscribe('status', kinds=[EVENT_STATUS_CHANGED])
+    everything = bus.subscribe('all')
+
+    bus.publish(EVENT_DISCORD_STARTED, new=True)
+    bus.publish(EVENT_STATUS_CHANGED, old='starting', new='ok')
+
+    assert [event.kind for event in status.drain()] == [EVENT_STATUS_CHANGED]
+    assert len(everything.drain()) == 2
+
+def test_full_queue_drops_the_oldest():
+    metrics = CycleMetrics()
+    bus = EventBus(metrics, queue_size=3)
+    slow = bus.subscribe('slow')
+    fast = bus.subscribe('fast', maxsize=10)
+
+    for i in range(5):
+        bus.publish(EVENT_PROMOTION_CHANGED, 'Discord.exe_1', i, i + 1)
+
+    assert [event.old for event in slow.drain()] == [2, 3, 4]
+    assert slow.dropped == 2
+    assert len(fast.drain()) == 5
+    assert metrics.counters['events_published'] == 5
+    assert metrics.counters['events_dropped'] == 2
+
+def test_nothing_is_built_without_subscribers():
+    metrics = CycleMetrics()
+    bus = EventBus(metrics)
+
+    bus.publish(EVENT_DISCORD_STARTED, new=True)
+
+    assert metrics.counters.get('events_published', 0) == 0
+
+def test_listen_delivers_on_its_own_thread():
+    bus = EventBus()
+    received = []
+    threads = set()
+    done = threading.Event()
+
+    def callback(event):
+        if event.kind == EVENT_DISCORD_STOPPED:
+            raise ValueError("subscriber bug")
+        received.append(event.kind)
+        threads.add(threading.current_thread().name)
+        if len(received) == 2:
+            done.set()
+
+    subscription = bus.listen('tray', callback)
+    bus.publish(EVENT_DISCORD_STOPPED, new=False)
+    bus.publish(EVENT_DISCORD_STARTED, new=True)
+    bus.publish(EVENT_STATUS_CHANGED, new='ok')
+
+    # A failing callback does not end the listener
+    assert done.wait(5)
+    assert received == [EVENT_DISCORD_STARTED, EVENT_STATUS_CHANGED]
+    assert threads == {'events-tray'}
+
+    bus.unsubscribe(subscription)
+    assert bus.subscriptions == []
+    # Closing the subscription ends the thread
+    for thread in threading.enumerate():
+        if thread.name == 'events-tray':
+            thread.join(5)
+            assert not thread.is_alive()
+
+def test_describe_event():
+    bus = EventBus(clock=lambda: 0.0)
+    subscription = bus.subscribe('log')
+    bus.publish(EVENT_WINDOW_CLOSED, 66748, old='Friends - Discord')
+    bus.publish(EVENT_STATUS_CHANGED, old='starting', new='ok')
+
+    assert [describe_event(event) for event in subscription.drain()] == [
+        "Discord window closed: 'Friends - Discord' (hwnd=66748)",
+        "Monitor state: Discord icon OK",
+    ]
@@ -0,0 +1,100 @@
+import os
+import socket
+import tempfile
+import time
+from multiprocessing import AuthenticationError
+
+import pytest
+
+from control_channel import (ControlServer, control_address, load_authkey, send_command, COMMAND_STATUS,
+                             COMMAND_STOP, COMMAND_RELOAD_CONFIG)
+from cycle_metrics import CycleMetrics
+from desktop_backend import SimulatedDesktop
+
+pytestmark = pytest.mark.skipif(os.name == 'nt', reason="uses the Unix socket transport")
+
+@pytest.fixture
+def channel():
+    """Socket address and key in a short directory, socket paths are limited to about 100 characters"""
+    with tempfile.TemporaryDirectory() as directory:
+        yield control_address(directory), load_authkey(directory)
+
+@pytest.fixture
+def server(channel):
+    address, authkey = channel
+    server = ControlServer.acquire(address, authkey, CycleMetrics())
+    server.start({COMMAND_STATUS: lambda: {'status': 'ok'}})
+    yield server
+    server.close()
+
+def test_second_instance_is_refused(channel, server):
+    assert ControlServer.acquire(*channel) is None
+    # The first instance keeps answering
+    assert send_command(*channel, COMMAND_STATUS) == {'ok': True, 'result': {'status': 'ok'}}
+
+def test_stale_socket_is_replaced(channel):
+    address, authkey = channel
+    # A socket file left behind by a crashed instance, nobody listens on it
+    stale = socket.socket(socket.AF_UNIX)
+    stale.bind(address)
+    stale.close()
+    assert os.path.exists(address)
+
+    server = ControlServer.acquire(address, authkey)
+    try:
+        assert server is not None
+        server.start({COMMAND_STATUS: lambda: 'ok'})
+        assert send_command(address, authkey, COMMAND_STATUS)['result'] == 'ok'
+    finally:
+        server.close()
+
+def test_wrong_key_is_rejected(channel, server):
+    address, _ = channel
+    with pytest.raises(AuthenticationError):
+        send_command(address, b'x' * 32, COMMAND_STATUS)
+    # A rejected client does not stop the server
+    assert send_command(*channel, COMMAND_STATUS)['ok']
+
+def test_unknown_command(channel, server):
+    reply = send_command(*channel, 'restart')
+
+    assert not reply['ok']
+    assert reply['commands'] == [COMMAND_STATUS]
+    assert server.metrics.counters['control_commands'] == 1
+
+def test_manager_commands(channel, make_manager):
+    manager = make_manager(SimulatedDesktop.generate())
+    manager.running = True
+    manager.run_cycle()
+    server = ControlServer.acquire(*channel)
+    server.start(manager.control_commands())
+    try:
+        status = send_command(*channel, COMMAND_STATUS)['result']
+        assert status['pid'] == os.getpid()
+        assert status['cycles'] == 1
+        assert status['discord_running']
+
+        assert send_command(*channel, COMMAND_RELOAD_CONFIG)['result']['reload'] == 'scheduled'
+        assert manager.reload_pending
+        assert manager.wake.is_set()
+
+        assert send_command(*channel, COMMAND_STOP) == {'ok': True, 'result': {'stopping': True}}
+        assert not manager.running
+    finally:
+        server.close()
+
+def test_close_wakes_the_listener(channel):
+    address, authkey = channel
+    server = ControlServer.acquire(address, authkey)
+    server.start({})
+
+    start = time.monotonic()
+    server.close()
+
+    assert time.monotonic() - start < 1
+    assert not server._thread.is_alive()
+    # The lock is released for the next instance
+    assert not os.path.exists(address)
+    again = ControlServer.acquire(address, authkey)
+    assert again is not None
+    again.listener.close()
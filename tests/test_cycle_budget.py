@@ -0,0 +1,58 @@
+from cycle_budget import CycleBudget, NULL_BUDGET, BUDGET_CALL_SCAN, BUDGET_TASKBAR_BROADCAST
+from cycle_metrics import CycleMetrics
+from desktop_backend import SimulatedDesktop, HWND_BROADCAST
+
+def test_allows_until_used_up(clock):
+    metrics = CycleMetrics()
+    budget = CycleBudget(2.0, metrics, clock)
+    budget.start()
+    clock.now = 1.5
+
+    assert budget.allow(BUDGET_CALL_SCAN)
+    clock.now = 2.0
+    assert not budget.allow(BUDGET_CALL_SCAN)
+    assert budget.skipped == [BUDGET_CALL_SCAN]
+    assert metrics.counters['budget_skipped_stages'] == 1
+    assert metrics.counters[f'budget_skipped_{BUDGET_CALL_SCAN}'] == 1
+
+def test_overrun_counted_once_per_cycle(clock):
+    metrics = CycleMetrics()
+    budget = CycleBudget(2.0, metrics, clock)
+    budget.start()
+    clock.now = 3.0
+    budget.finish()
+    budget.finish()
+
+    assert metrics.counters['budget_overruns'] == 1
+    # Outside a cycle nothing is skipped
+    assert budget.allow(BUDGET_CALL_SCAN)
+
+def test_new_cycle_starts_a_fresh_budget(clock):
+    budget = CycleBudget(2.0, clock=clock)
+    budget.start()
+    clock.now = 5.0
+    assert not budget.allow(BUDGET_CALL_SCAN)
+    budget.finish()
+
+    budget.start()
+    assert budget.allow(BUDGET_CALL_SCAN)
+    assert budget.skipped == []
+
+def test_null_budget_allows_everything():
+    assert not NULL_BUDGET.enabled
+    assert NULL_BUDGET.allow(BUDGET_TASKBAR_BROADCAST)
+
+def test_slow_fix_skips_the_broadcast(make_manager, clock):
+    def sleep(seconds):
+        clock.now += seconds
+
+    # Each message to Discord takes a second of the two second budget
+    desktop = SimulatedDesktop.generate(startallback=True, message_latency=1.0, broadcast_latency=0.0, sleep=sleep)
+    manager = make_manager(desktop)
+    manager.budget.clock = clock
+    desktop.demote()
+    manager.run_cycle()
+
+    assert desktop.message_count >= 2
+    assert all(hwnd != HWND_BROADCAST for hwnd, *_ in desktop.sent_messages)
+    assert manager.metrics.counters[f'budget_skipped_{BUDGET_TASKBAR_BROADCAST}'] == 1
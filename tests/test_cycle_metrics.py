@@ -0,0 +1,88 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+from cycle_metrics import CycleMetrics, RollingHistogram, StatsServer, write_stats_file
+
+def test_nearest_rank_percentiles():
+    histogram = RollingHistogram()
+    for value in range(1, 101):
+        histogram.observe(value)
+
+    assert (histogram.percentile(50), histogram.percentile(95), histogram.percentile(99)) == (50, 95, 99)
+    assert histogram.percentile(0) == 1
+    assert histogram.percentile(100) == 100
+    assert RollingHistogram().percentile(50) == 0.0
+
+def test_percentiles_cover_the_rolling_window_only():
+    histogram = RollingHistogram(size=10)
+    for value in [100] * 10 + [1] * 10:
+        histogram.observe(value)
+
+    summary = histogram.summary()
+    assert summary['p99'] == 1
+    # Count and sum are over every sample
+    assert (summary['count'], summary['sum']) == (20, 1010)
+
+def test_stage_timer(clock):
+    metrics = CycleMetrics(clock=clock)
+    with metrics.stage('registry'):
+        clock.now = 0.25
+
+    assert metrics.snapshot()['stages']['registry']['p50'] == 0.25
+
+def test_prometheus_text():
+    metrics = CycleMetrics()
+    for seconds in (0.001, 0.002, 0.003, 0.004):
+        metrics.observe('cycle', seconds)
+    metrics.increment('fixes', 2)
+
+    lines = metrics.render_prometheus().splitlines()
+
+    assert lines[:7] == [
+        '# HELP discord_tray_manager_stage_seconds Time spent per monitor stage (rolling window)',
+        '# TYPE discord_tray_manager_stage_seconds summary',
+        'discord_tray_manager_stage_seconds{stage="cycle",quantile="0.5"} 0.002000',
+        'discord_tray_manager_stage_seconds{stage="cycle",quantile="0.95"} 0.004000',
+        'discord_tray_manager_stage_seconds{stage="cycle",quantile="0.99"} 0.004000',
+        'discord_tray_manager_stage_seconds_sum{stage="cycle"} 0.010000',
+        'discord_tray_manager_stage_seconds_count{stage="cycle"} 4',
+    ]
+    assert '# TYPE discord_tray_manager_fixes_total counter' in lines
+    assert 'discord_tray_manager_fixes_total 2' in lines
+    assert 'discord_tray_manager_fix_failures_total 0' in lines
+
+def test_stats_file(tmp_path):
+    metrics = CycleMetrics()
+    metrics.increment('fixes')
+    path = str(tmp_path / 'stats.prom')
+
+    write_stats_file(metrics, path)
+
+    with open(path) as f:
+        assert f.read() == metrics.render_prometheus()
+
+@pytest.fixture(scope='module')
+def server():
+    """One endpoint for every request test, stopping it waits out serve_forever()'s poll"""
+    metrics = CycleMetrics()
+    metrics.increment('fixes')
+    server = StatsServer(metrics, 0)
+    server.start()
+    yield f"http://127.0.0.1:{server._server.server_port}"
+    server.stop()
+
+@pytest.mark.parametrize('path', ['/metrics', '/stats', '/metrics?format=text'])
+def test_server_answers_stats_paths(server, path):
+    with urllib.request.urlopen(server + path, timeout=5) as response:
+        assert response.status == 200
+        assert response.headers['Content-Type'] == 'text/plain; version=0.0.4'
+        assert b'discord_tray_manager_fixes_total 1' in response.read()
+
+@pytest.mark.parametrize('path', ['/', '/favicon.ico', '/metrics/extra'])
+def test_server_rejects_other_paths(server, path):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(server + path, timeout=5)
+
+    assert error.value.code == 404
@@ -0,0 +1,80 @@
+import json
+import threading
+
+import pytest
+
+from cycle_tracer import CycleTracer, traced
+
+class Worker:
+    def __init__(self, tracer):
+        self.tracer = tracer
+
+    @traced
+    def fail(self):
+        raise ValueError("no tray")
+
+def test_nested_spans(clock):
+    tracer = CycleTracer(clock=clock)
+    with tracer.span('cycle'):
+        clock.now = 0.001
+        with tracer.span('check', {'targets': 2}):
+            clock.now = 0.003
+        clock.now = 0.004
+
+    # The inner span ends, and is recorded, first
+    check, cycle = tracer.to_chrome_trace()['traceEvents']
+
+    assert (cycle['name'], cycle['ts'], cycle['dur']) == ('cycle', 0, pytest.approx(4000))
+    assert (check['name'], check['ts'], check['dur']) == ('check', pytest.approx(1000), pytest.approx(2000))
+    assert check['args'] == {'targets': 2}
+    assert 'args' not in cycle
+    assert {event['tid'] for event in (check, cycle)} == {threading.get_ident()}
+
+def test_traced_method_records_the_error(clock):
+    worker = Worker(CycleTracer(clock=clock))
+
+    with pytest.raises(ValueError):
+        worker.fail()
+
+    [event] = worker.tracer.to_chrome_trace()['traceEvents']
+    assert event['name'] == 'fail'
+    assert event['args'] == {'error': 'ValueError'}
+
+def test_only_the_latest_spans_are_kept(clock):
+    tracer = CycleTracer(capacity=3, clock=clock)
+    for i in range(5):
+        with tracer.span(f'cycle {i}'):
+            pass
+
+    assert [event['name'] for event in tracer.to_chrome_trace()['traceEvents']] == ['cycle 2', 'cycle 3', 'cycle 4']
+
+def test_dump_writes_chrome_trace_json(tmp_path, clock):
+    tracer = CycleTracer(clock=clock)
+    with tracer.span('cycle'):
+        clock.now = 0.002
+
+    path = tracer.dump(str(tmp_path / 'trace.json'))
+
+    with open(path) as f:
+        data = json.load(f)
+    assert data['displayTimeUnit'] == 'ms'
+    assert data['traceEvents'][0]['ph'] == 'X'
+    assert data['traceEvents'][0]['cat'] == 'monitor'
+
+def test_export_while_spans_are_recorded():
+    tracer = CycleTracer(capacity=1000)
+    stop = threading.Event()
+
+    def record():
+        while not stop.is_set():
+            with tracer.span('cycle'):
+                pass
+
+    thread = threading.Thread(target=record)
+    thread.start()
+    try:
+        for _ in range(200):
+            tracer.to_chrome_trace()
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,60 @@
+import time
+import threading
+
+from cycle_watchdog import Heartbeat, CycleWatchdog, MAX_BACKOFF_FACTOR
+from desktop_backend import SimulatedDesktop
+from discord_tray_manager import MAX_HUNG_THREADS
+
+def test_repeated_hangs_back_off(clock):
+    heartbeat = Heartbeat(clock)
+    hangs = []
+    watchdog = CycleWatchdog(heartbeat, 10, lambda: hangs.append(clock.now))
+
+    # Every replacement cycle hangs too, none completes
+    for _ in range(6):
+        heartbeat.begin()
+        while not watchdog.check():
+            clock.now += 1
+
+    started = [0, 10, 30, 70, 150, 230]
+    assert hangs == [s + 10 * min(2 ** i, MAX_BACKOFF_FACTOR) for i, s in enumerate(started)]
+
+def test_completed_cycle_resets_backoff(clock):
+    heartbeat = Heartbeat(clock)
+    watchdog = CycleWatchdog(heartbeat, 10, lambda: None)
+    heartbeat.begin()
+    clock.now = 10
+    assert watchdog.check()
+    assert watchdog.current_timeout() == 20
+
+    heartbeat.begin()
+    heartbeat.end()
+    heartbeat.begin()
+    clock.now = 20
+    assert watchdog.check()
+    assert watchdog.consecutive_hangs == 1
+
+def monitor_threads():
+    return [t for t in threading.enumerate() if t.name.startswith('monitor-')]
+
+def test_hung_backend_keeps_threads_bounded(make_manager):
+    desktop = SimulatedDesktop.generate()
+    manager = make_manager(desktop)
+    manager.running = True
+    desktop.hang('get_notify_icon_value')
+    manager.watchdog = CycleWatchdog(manager.heartbeat, 0.02, manager.restart_monitor, interval=0.005)
+    manager.watchdog.start()
+    try:
+        manager.start_monitor_thread()
+        deadline = time.monotonic() + 10
+        while manager.hang_count < MAX_HUNG_THREADS + 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert manager.hang_count >= MAX_HUNG_THREADS + 2
+        assert len(monitor_threads()) == MAX_HUNG_THREADS + 1
+    finally:
+        desktop.release()
+        manager.stop()
+    for thread in manager.hung_threads + [manager.monitor_thread]:
+        thread.join(5)
+    assert not monitor_threads()
@@ -0,0 +1,76 @@
+import threading
+
+from cycle_metrics import CycleMetrics
+from desktop_backend import SimulatedDesktop
+from fix_runner import ConcurrentFixRunner, conflict_chains
+from tray_icon_helper import (STRATEGY_STARTALLBACK, STRATEGY_SHELL_API, STRATEGY_REGISTRY, STRATEGY_CONFLICTS,
+                              FIX_STRATEGIES)
+
+DISCORD_SUBKEY = 'Discord.exe_7654321'
+
+def test_conflicting_strategies_share_a_chain():
+    chains = conflict_chains([STRATEGY_STARTALLBACK, STRATEGY_SHELL_API, STRATEGY_REGISTRY], STRATEGY_CONFLICTS)
+
+    assert chains == [[STRATEGY_STARTALLBACK, STRATEGY_SHELL_API], [STRATEGY_REGISTRY]]
+
+def test_unverified_success_does_not_win():
+    promoted = threading.Event()
+    checked = threading.Event()
+
+    def run_strategy(strategy):
+        if strategy == STRATEGY_REGISTRY:
+            # Only finishes once the shell strategy's claimed success has been checked
+            checked.wait(5)
+            promoted.set()
+        return True
+
+    def verify():
+        result = promoted.is_set()
+        checked.set()
+        return result
+
+    metrics = CycleMetrics()
+    runner = ConcurrentFixRunner(run_strategy, threading.Event(), STRATEGY_CONFLICTS, metrics, verify=verify)
+    try:
+        assert runner.run([STRATEGY_SHELL_API, STRATEGY_REGISTRY]) == STRATEGY_REGISTRY
+    finally:
+        runner.close()
+    assert metrics.counters['fix_unverified_successes'] == 1
+
+def test_chain_moves_on_after_an_unverified_success():
+    ran = []
+
+    def run_strategy(strategy):
+        ran.append(strategy)
+        return True
+
+    runner = ConcurrentFixRunner(run_strategy, threading.Event(), STRATEGY_CONFLICTS,
+                                 verify=lambda: ran[-1] == STRATEGY_SHELL_API)
+
+    assert runner.run([STRATEGY_STARTALLBACK, STRATEGY_SHELL_API]) == STRATEGY_SHELL_API
+    assert ran == [STRATEGY_STARTALLBACK, STRATEGY_SHELL_API]
+
+def test_nothing_verified_is_no_winner():
+    metrics = CycleMetrics()
+    runner = ConcurrentFixRunner(lambda strategy: True, threading.Event(), STRATEGY_CONFLICTS, metrics,
+                                 verify=lambda: False)
+
+    assert runner.run([STRATEGY_STARTALLBACK, STRATEGY_SHELL_API]) is None
+    assert metrics.counters['fix_unverified_successes'] == 2
+
+def test_concurrent_fix_keeps_the_strategy_that_promoted(make_manager):
+    desktop = SimulatedDesktop.generate(startallback=True)
+    manager = make_manager(desktop)
+    tray_manager = manager.tray_manager
+    tray_manager.fix_runner = ConcurrentFixRunner(tray_manager.run_fix_strategy, tray_manager.fix_cancel,
+                                                  STRATEGY_CONFLICTS, manager.metrics, len(FIX_STRATEGIES),
+                                                  tray_manager.is_promoted_now)
+    try:
+        desktop.demote()
+        assert tray_manager.promote_discord_to_main_tray()
+    finally:
+        tray_manager.fix_runner.close()
+
+    # Messages alone never set IsPromoted on the simulated desktop, only the registry strategy does
+    assert desktop.get_notify_icon_value(DISCORD_SUBKEY, 'IsPromoted') == 1
+    assert tray_manager.cache.last_strategy == STRATEGY_REGISTRY
@@ -0,0 +1,67 @@
+import logging
+
+from log_analyzer import analyze_log
+
+# Two incidents as older versions logged them: every result appears two or three times
+REPEATED_LOG = """\
+2026-01-01 10:00:00,000 - INFO - ===== DISCORD TRAY MANAGER STARTING =====
+2026-01-01 10:00:30,000 - WARNING - Discord tray issue detected: Icon not visible
+2026-01-01 10:00:30,010 - INFO - Step 1: Checking for StartAllBack...
+2026-01-01 10:00:30,020 - INFO - StartAllBack promotion result: False
+2026-01-01 10:00:30,021 - INFO - StartAllBack promotion result: False
+2026-01-01 10:00:30,030 - INFO - Step 2: Trying standard Windows Shell API approach...
+2026-01-01 10:00:30,040 - INFO - Shell API promotion result: True
+2026-01-01 10:00:30,041 - INFO - Shell API promotion result: True
+2026-01-01 10:00:30,050 - INFO - Successfully applied fix
+2026-01-01 10:05:00,000 - WARNING - Discord tray issue detected: Icon not visible
+2026-01-01 10:05:00,010 - INFO - Step 0: Trying last successful strategy first: shell_api
+2026-01-01 10:05:00,020 - INFO - Shell API promotion result: True
+2026-01-01 10:05:00,021 - INFO - Last successful strategy result: True
+2026-01-01 10:05:00,030 - INFO - Successfully applied fix
+"""
+
+# The same two incidents with one result line per attempt
+SINGLE_LOG = """\
+2026-01-01 10:00:00,000 - INFO - ===== DISCORD TRAY MANAGER STARTING =====
+2026-01-01 10:00:30,000 - WARNING - Discord tray issue detected: Icon not visible
+2026-01-01 10:00:30,020 - INFO - StartAllBack promotion result: False
+2026-01-01 10:00:30,040 - INFO - Shell API promotion result: True
+2026-01-01 10:00:30,050 - INFO - Successfully applied fix
+2026-01-01 10:05:00,000 - WARNING - Discord tray issue detected: Icon not visible
+2026-01-01 10:05:00,010 - INFO - Step 0: Trying last successful strategy first: shell_api
+2026-01-01 10:05:00,020 - INFO - Shell API promotion result: True
+2026-01-01 10:05:00,030 - INFO - Successfully applied fix
+"""
+
+def analyze(tmp_path, text):
+    path = tmp_path / 'discord_tray_manager.log'
+    path.write_text(text)
+    return analyze_log(str(path))
+
+def test_repeated_result_lines_count_once(tmp_path):
+    analysis = analyze(tmp_path, REPEATED_LOG)
+
+    assert analysis.strategies == {'startallback': [0, 1], 'shell_api': [2, 0]}
+    assert [i['strategies'] for i in analysis.incidents] == [
+        [('startallback', False), ('shell_api', True)],
+        [('shell_api', True)],
+    ]
+
+def test_single_result_lines(tmp_path):
+    analysis = analyze(tmp_path, SINGLE_LOG)
+
+    assert analysis.strategies == {'startallback': [0, 1], 'shell_api': [2, 0]}
+    assert [i['outcome'] for i in analysis.incidents] == ['fixed', 'fixed']
+
+def test_fix_logs_one_result_per_attempt(make_manager, caplog):
+    from desktop_backend import SimulatedDesktop
+
+    desktop = SimulatedDesktop.generate()
+    manager = make_manager(desktop)
+    desktop.demote()
+    with caplog.at_level(logging.INFO):
+        manager.run_cycle()
+
+    results = [r.getMessage() for r in caplog.records if 'promotion result: ' in r.getMessage()]
+    assert results and len(results) == len(set(results))
+    assert not any('Last successful strategy result' in r.getMessage() for r in caplog.records)
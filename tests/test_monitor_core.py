@@ -0,0 +1,30 @@
+from monitor_core import (Snapshot, INITIAL_STATE, STATE_OK, ACTION_FIX, ACTION_SUPPRESSED, ACTION_BACKOFF, decide,
+                          apply_fix_result)
+from tray_status import STATUS_MONITOR_ONLY, STATUS_DEGRADED, STATUS_FIXING, STATUS_TEXT, STATUS_COLORS
+
+HIDDEN = Snapshot(True, False)
+
+def test_hidden_icon_is_fixed():
+    state, actions = decide(HIDDEN, INITIAL_STATE)
+
+    assert state.status == STATUS_FIXING
+    assert actions == (ACTION_FIX,)
+
+def test_auto_fix_off_is_monitor_only_not_degraded():
+    state, actions = decide(HIDDEN, STATE_OK, auto_fix=False)
+
+    assert state.status == STATUS_MONITOR_ONLY
+    assert actions == (ACTION_SUPPRESSED,)
+    assert STATUS_TEXT[STATUS_MONITOR_ONLY] == 'Icon hidden (auto-fix off)'
+    assert STATUS_COLORS[STATUS_MONITOR_ONLY] not in (STATUS_COLORS[s] for s in STATUS_COLORS if s != STATUS_MONITOR_ONLY)
+
+def test_repeated_failures_degrade_then_back_off():
+    state = decide(HIDDEN, INITIAL_STATE)[0]
+    for _ in range(4):
+        state, actions = apply_fix_result(state, False, max_failures=5)
+        assert state.status == STATUS_DEGRADED
+        assert actions == ()
+
+    state, actions = apply_fix_result(state, False, max_failures=5)
+    assert actions == (ACTION_BACKOFF,)
+    assert state.consecutive_failures == 0
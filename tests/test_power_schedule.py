@@ -0,0 +1,68 @@
+import pytest
+
+from power_schedule import (PowerSchedule, PRESENCE_ACTIVE, PRESENCE_BATTERY, PRESENCE_LOCKED,
+                            PRESENCE_DISPLAY_OFF, PRESENCE_SUSPENDED)
+from shell_events import (EVENT_SESSION_LOCKED, EVENT_SESSION_UNLOCKED, EVENT_DISPLAY_OFF, EVENT_DISPLAY_ON,
+                          EVENT_ON_BATTERY, EVENT_ON_AC, EVENT_SUSPENDED, EVENT_RESUMED, EVENT_TASKBAR_CREATED)
+
+def test_intervals_by_presence():
+    power = PowerSchedule(hidden_interval=0, battery_factor=2)
+    assert power.interval(30) == 30
+
+    power.handle(EVENT_ON_BATTERY)
+    assert power.state == PRESENCE_BATTERY
+    assert power.interval(30) == 60
+
+    # Hidden wins over battery, and with no hidden_interval checks wait for a wake-up
+    power.handle(EVENT_SESSION_LOCKED)
+    assert power.state == PRESENCE_LOCKED
+    assert power.interval(30) is None
+
+def test_hidden_interval_keeps_slow_checks():
+    power = PowerSchedule(hidden_interval=300)
+    power.handle(EVENT_DISPLAY_OFF)
+
+    assert power.state == PRESENCE_DISPLAY_OFF
+    assert power.interval(30) == 300
+
+def test_most_restrictive_condition_wins_until_all_clear():
+    power = PowerSchedule()
+    assert not power.handle(EVENT_SESSION_LOCKED)
+    assert not power.handle(EVENT_SUSPENDED)
+    assert power.state == PRESENCE_SUSPENDED
+
+    # Resuming into a locked session does not make the tray visible
+    assert not power.handle(EVENT_RESUMED)
+    assert power.state == PRESENCE_LOCKED
+    assert power.handle(EVENT_SESSION_UNLOCKED)
+    assert power.state == PRESENCE_ACTIVE
+
+def test_visible_again_only_from_hidden():
+    power = PowerSchedule()
+    power.handle(EVENT_ON_BATTERY)
+
+    assert not power.handle(EVENT_ON_AC)
+    assert not power.handle(EVENT_DISPLAY_ON)
+    assert not power.handle(EVENT_TASKBAR_CREATED)
+
+def test_session_signals_ignored_in_multi_session_mode():
+    power = PowerSchedule(track_session=False)
+    power.handle(EVENT_SESSION_LOCKED)
+
+    assert power.state == PRESENCE_ACTIVE
+    assert power.visible()
+
+def test_wakeups_per_hour(clock):
+    power = PowerSchedule(clock=clock)
+    for _ in range(120):
+        power.record_wakeup()
+    clock.now = 3600
+    power.handle(EVENT_SESSION_LOCKED)
+    power.record_wakeup()
+    clock.now = 5400
+
+    report = power.wakeups_per_hour()
+
+    assert report[PRESENCE_ACTIVE] == (120, 3600, 120.0)
+    assert report[PRESENCE_LOCKED] == (1, 1800, pytest.approx(2.0))
+    assert "locked" in power.format_report()
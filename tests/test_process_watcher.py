@@ -0,0 +1,71 @@
+import time
+
+from desktop_backend import SimulatedDesktop
+from process_watcher import ProcessWatcher, EVENT_PROCESS_STARTED, EVENT_PROCESS_EXITED
+
+def make_watcher(desktop, interval=5):
+    events = []
+    watcher = ProcessWatcher(desktop, ['Discord.exe', 'DiscordPTB.exe'],
+                             lambda event, name: events.append((event, name)), interval)
+    return watcher, events
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+def test_start_and_last_exit_are_reported_once():
+    desktop = SimulatedDesktop.generate(discord=False)
+    watcher, events = make_watcher(desktop)
+
+    desktop.add_process('discord.exe')
+    desktop.add_process('Discord.exe')
+    assert watcher.poll() == (['Discord.exe'], [])
+    assert watcher.poll() == ([], [])
+    assert len(watcher.pids) == 2
+
+    desktop.remove_process('Discord.exe')
+    assert watcher.poll() == ([], ['Discord.exe'])
+    assert events == [(EVENT_PROCESS_STARTED, 'Discord.exe'), (EVENT_PROCESS_EXITED, 'Discord.exe')]
+    assert watcher.pids == []
+
+def test_running_at_start_is_the_baseline():
+    desktop = SimulatedDesktop.generate()
+    watcher, events = make_watcher(desktop, interval=0.01)
+    watcher.start()
+    try:
+        assert wait_until(lambda: watcher.polls >= 2)
+    finally:
+        watcher.stop()
+
+    assert watcher.running == {'Discord.exe'}
+    assert events == []
+
+def test_failing_callback_does_not_stop_the_watcher():
+    desktop = SimulatedDesktop()
+    watcher = ProcessWatcher(desktop, ['Discord.exe'], lambda event, name: 1 / 0)
+    desktop.add_process('Discord.exe')
+
+    assert watcher.poll() == (['Discord.exe'], [])
+    assert watcher.running == {'Discord.exe'}
+
+def test_paused_watcher_takes_no_snapshots():
+    desktop = SimulatedDesktop.generate(discord=False)
+    watcher, events = make_watcher(desktop, interval=0.01)
+    watcher.start()
+    try:
+        assert wait_until(lambda: watcher.polls >= 1)
+        watcher.pause()
+        # A wait already under way still finishes with one last snapshot
+        time.sleep(0.05)
+        polls = watcher.polls
+        desktop.add_process('DiscordPTB.exe')
+        time.sleep(0.05)
+        assert watcher.polls == polls
+        assert events == []
+
+        watcher.resume()
+        assert wait_until(lambda: events == [(EVENT_PROCESS_STARTED, 'DiscordPTB.exe')])
+    finally:
+        watcher.stop()
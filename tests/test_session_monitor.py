@@ -0,0 +1,59 @@
+from cycle_metrics import CycleMetrics
+from desktop_backend import SimulatedDesktop
+from session_monitor import SessionMonitor, FakeSessionSource, SESSION_BACKOFF_CYCLES
+from target_profiles import discord_profile
+from tray_status import STATUS_OK, STATUS_DEGRADED
+
+DISCORD_SUBKEY = 'Discord.exe_7654321'
+
+class ReadOnlyHive(SimulatedDesktop):
+    """A hive whose writes are refused, so every fix fails"""
+
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    def get_notify_icon_value(self, subkey, name):
+        self.reads += 1
+        return super().get_notify_icon_value(subkey, name)
+
+    def set_notify_icon_value(self, subkey, name, value):
+        raise PermissionError("access denied")
+
+def make_monitor(hives, max_failures=2):
+    source = FakeSessionSource()
+    processes = SimulatedDesktop()
+    for session_id, sid in enumerate(hives, 1):
+        source.add_session(session_id, f"CORP\\user{session_id}", sid)
+        processes.add_process("Discord.exe", session_id)
+    metrics = CycleMetrics()
+    monitor = SessionMonitor(source, processes, hives.__getitem__, discord_profile(["Discord.exe"]), metrics=metrics,
+                             max_failures=max_failures)
+    return monitor, metrics
+
+def test_failing_session_is_skipped_after_backing_off():
+    failing = ReadOnlyHive()
+    failing.add_notify_icon(DISCORD_SUBKEY, IsPromoted=0)
+    healthy = SimulatedDesktop()
+    healthy.add_notify_icon(DISCORD_SUBKEY, IsPromoted=0)
+    monitor, metrics = make_monitor({'S-1': failing, 'S-2': healthy})
+
+    # Two failed fixes reach max_failures
+    monitor.run_cycle()
+    monitor.run_cycle()
+    assert monitor.sessions[1].backoff == SESSION_BACKOFF_CYCLES
+    assert metrics.counters['session_fix_failures'] == 2
+
+    reads = failing.reads
+    for _ in range(SESSION_BACKOFF_CYCLES):
+        monitor.run_cycle()
+    assert failing.reads == reads
+    assert metrics.counters['session_fix_failures'] == 2
+    assert metrics.counters['session_backoff_skips'] == SESSION_BACKOFF_CYCLES
+    assert monitor.sessions[1].state.status == STATUS_DEGRADED
+
+    # The other session is unaffected, and the failing one is tried again afterwards
+    assert monitor.sessions[2].state.status == STATUS_OK
+    monitor.run_cycle()
+    assert failing.reads > reads
+    assert metrics.counters['session_fix_failures'] == 3
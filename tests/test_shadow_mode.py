@@ -0,0 +1,61 @@
+from desktop_backend import SimulatedDesktop, HWND_BROADCAST
+from shadow_mode import (cost_strategies, summarize_ops, describe_op, format_shadow_summary, STRATEGIES)
+
+DISCORD_SUBKEY = 'Discord.exe_7654321'
+
+def test_summarize_ops():
+    ops = [('send', 0x10, 'WM_SETTINGCHANGE', 0, 0), ('send', HWND_BROADCAST, 'TaskbarCreated', 0, 0),
+           ('invalidate', 0x20), ('update', 0x20), ('send', 0x20, 'WM_COMMAND', 419, 0),
+           ('registry', DISCORD_SUBKEY, 'IsPromoted', 1)]
+
+    assert summarize_ops(ops) == {'messages': 3, 'broadcasts': 1, 'windows': 2, 'registry_writes': 1}
+    assert describe_op(ops[1]) == "SendMessage TaskbarCreated to HWND_BROADCAST (wParam=0, lParam=0)"
+    assert describe_op(ops[5]) == f"Set NotifyIconSettings\\{DISCORD_SUBKEY}\\IsPromoted = 1"
+
+def test_every_strategy_is_costed_without_side_effects(make_manager):
+    desktop = SimulatedDesktop.generate(startallback=True)
+    manager = make_manager(desktop)
+    tray_manager = manager.tray_manager
+    manager.run_cycle()
+    desktop.demote()
+    desktop.sent_messages.clear()
+    cache = tray_manager.cache
+    last_strategy = cache.last_strategy
+
+    results = {result['strategy']: result for result in cost_strategies(tray_manager)}
+
+    assert list(results) == [name for name, _ in STRATEGIES]
+    assert (results['startallback']['messages'], results['startallback']['broadcasts']) == (3, 1)
+    assert results['registry']['ops'] == [('registry', DISCORD_SUBKEY, 'IsPromoted', 1)]
+    assert results['tray_refresh']['registry_writes'] == 0
+    # The full chain plans at least what its first strategy does
+    assert results['full_fix']['ops'][:3] == results['startallback']['ops']
+    assert all(result['error'] is None for result in results.values())
+
+    # Nothing was sent or written, and the manager is left as it was
+    assert desktop.get_notify_icon_value(DISCORD_SUBKEY, 'IsPromoted') == 0
+    assert not desktop.sent_messages
+    assert tray_manager.backend is desktop
+    assert tray_manager.cache is cache
+    assert cache.last_strategy == last_strategy
+
+def test_planning_error_is_reported(make_manager):
+    tray_manager = make_manager(SimulatedDesktop.generate()).tray_manager
+
+    def broken():
+        raise OSError("access denied")
+
+    tray_manager.broken_strategy = broken
+    [result] = cost_strategies(tray_manager, [('broken', 'broken_strategy')])
+
+    assert not result['success']
+    assert result['error'] == "access denied"
+
+def test_summary_table():
+    results = [{'strategy': 'registry', 'success': True, 'seconds': 0.0012, 'messages': 0, 'broadcasts': 0,
+                'windows': 0, 'registry_writes': 1}]
+
+    assert format_shadow_summary(results).splitlines() == [
+        "strategy           ok         ms  msgs bcast windows  reg",
+        "registry           yes     1.200     0     0       0    1",
+    ]
@@ -0,0 +1,63 @@
+import pytest
+
+from change_events import EVENT_TRAY_RECREATED
+from desktop_backend import SimulatedDesktop
+from shell_events import (FakeShellEvents, EVENT_TASKBAR_CREATED, EVENT_DISPLAY_CHANGED, EVENT_SESSION_LOCKED,
+                          EVENT_SESSION_UNLOCKED)
+
+@pytest.fixture
+def monitor(make_manager):
+    """A manager listening to a FakeShellEvents source, after one cycle has cached the tray topology"""
+    desktop = SimulatedDesktop.generate(promoted=True)
+    manager = make_manager(desktop)
+    manager.event_source = FakeShellEvents()
+    manager.start_shell_events()
+    manager.run_cycle()
+    manager.tray_manager.get_topology()
+    yield manager
+    manager.event_source.stop()
+
+def test_fake_source_delivers_only_while_started():
+    received = []
+    source = FakeShellEvents()
+    source.emit(EVENT_TASKBAR_CREATED)
+    source.start(received.append)
+    source.emit(EVENT_TASKBAR_CREATED)
+    source.stop()
+    source.emit(EVENT_TASKBAR_CREATED)
+
+    assert received == [EVENT_TASKBAR_CREATED]
+
+def test_taskbar_recreated_forgets_the_tray_and_checks(monitor):
+    subscription = monitor.events.subscribe('test', [EVENT_TRAY_RECREATED])
+    assert monitor.tray_manager.topology.topology is not None
+
+    monitor.event_source.emit(EVENT_TASKBAR_CREATED)
+
+    assert monitor.tray_manager.topology.topology is None
+    assert monitor.triggers.reasons == {'taskbar recreated': 1}
+    assert monitor.wake.is_set()
+    assert [event.kind for event in subscription.drain()] == [EVENT_TRAY_RECREATED]
+    assert monitor.metrics.counters['taskbar_restarts'] == 1
+
+def test_display_change_forgets_the_tray_and_checks(monitor):
+    monitor.event_source.emit(EVENT_DISPLAY_CHANGED)
+
+    assert monitor.tray_manager.topology.topology is None
+    assert monitor.triggers.reasons == {'display changed': 1}
+
+def test_unlock_checks_once_the_tray_is_visible(monitor):
+    monitor.event_source.emit(EVENT_SESSION_LOCKED)
+    assert monitor.triggers.count == 0
+
+    monitor.event_source.emit(EVENT_SESSION_UNLOCKED)
+    assert monitor.triggers.reasons == {'tray visible again (session unlocked)': 1}
+
+def test_burst_of_events_is_one_check(monitor):
+    for _ in range(3):
+        monitor.event_source.emit(EVENT_TASKBAR_CREATED)
+    monitor.event_source.emit(EVENT_DISPLAY_CHANGED)
+
+    batch = monitor.triggers.take()
+    assert batch.count == 4
+    assert monitor.triggers.take() is None
@@ -0,0 +1,73 @@
+import json
+
+from desktop_backend import SimulatedDesktop
+from state_cache import StateCache
+from state_trace import replay_trace, read_trace
+
+DISCORD_SUBKEY = 'Discord.exe_7654321'
+
+def record(make_manager, path, cycles=30, cache=None):
+    desktop = SimulatedDesktop.generate()
+    manager = make_manager(desktop)
+    manager.tray_manager.cache = cache or StateCache()
+    manager.start_recording(str(path))
+    for _ in range(cycles):
+        desktop.demote()
+        manager.run_cycle()
+    manager.recorder.close()
+
+def test_round_trip(make_manager, tmp_path):
+    path = tmp_path / 'cycles.jsonl'
+    record(make_manager, path)
+
+    result = replay_trace(str(path), make_manager)
+
+    assert result['cycles'] == 30
+    assert result['mismatches'] == []
+
+def test_repeated_actions_are_back_references(make_manager, tmp_path):
+    path = tmp_path / 'cycles.jsonl'
+    record(make_manager, path, cycles=3)
+
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    cycles = list(read_trace(str(path)))
+
+    # Header, one full cycle, then two cycles repeating its actions
+    assert 'v' in records[0]
+    assert records[2]['a'] == records[3]['a'] == 1
+    assert cycles[2][3] == cycles[0][3] != []
+
+def test_different_actions_are_reported(make_manager, tmp_path):
+    path = tmp_path / 'cycles.jsonl'
+    record(make_manager, path, cycles=3)
+
+    def make_monitor_only(backend):
+        manager = make_manager(backend)
+        manager.enable_auto_fix = False
+        return manager
+
+    result = replay_trace(str(path), make_monitor_only)
+
+    assert [mismatch['cycle'] for mismatch in result['mismatches']] == [0, 1, 2]
+    assert result['mismatches'][0]['actual'] == []
+
+def test_warm_cache_round_trip(make_manager, tmp_path):
+    path = tmp_path / 'cycles.jsonl'
+    # The registry strategy goes first only because the warm cache says it worked last time
+    record(make_manager, path, cache=StateCache([DISCORD_SUBKEY], last_strategy='registry'))
+
+    result = replay_trace(str(path), make_manager)
+
+    assert result['cycles'] == 30
+    assert result['mismatches'] == []
+
+def test_header_carries_the_cache(make_manager, tmp_path):
+    path = tmp_path / 'cycles.jsonl'
+    record(make_manager, path, cycles=1, cache=StateCache([DISCORD_SUBKEY], last_strategy='registry'))
+
+    headers = []
+    list(read_trace(str(path), headers.append))
+
+    assert headers[0]['cache']['last_strategy'] == 'registry'
+    assert headers[0]['cache']['discord_subkeys'] == [DISCORD_SUBKEY]
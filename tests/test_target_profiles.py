@@ -0,0 +1,83 @@
+import pytest
+
+from desktop_backend import SimulatedDesktop
+from process_watcher import ProcessWatcher
+from target_profiles import ProfileMatcher, load_profiles
+from tray_status import STATUS_NOT_RUNNING
+
+def make_matcher(*targets):
+    return ProfileMatcher(load_profiles(['Discord.exe'], targets))
+
+def window(hwnd, class_name, title):
+    return {'hwnd': hwnd, 'title': title, 'class': class_name}
+
+def test_each_input_goes_to_its_profile():
+    matcher = make_matcher({'name': 'Slack'}, {'name': 'Teams'})
+
+    assert matcher.match_processes(['Discord.exe', 'discord.exe', 'slack.exe', 'notepad.exe']) == {
+        'Discord': 2, 'Slack': 1}
+    assert matcher.match_registry_keys(['Discord.exe_1', 'slack.exe_2', 'Teams.exe_3', 'explorer.exe_4']) == {
+        'Discord': ['Discord.exe_1'], 'Slack': ['slack.exe_2'], 'Teams': ['Teams.exe_3']}
+    assert matcher.match_windows([(1, 'Chrome_WidgetWin_1', '#general - Discord'), (2, 'Notepad', 'notes'),
+                                  (3, 'TeamsWebView', 'Calendar')]) == {
+        'Discord': [window(1, 'Chrome_WidgetWin_1', '#general - Discord')],
+        'Teams': [window(3, 'TeamsWebView', 'Calendar')]}
+
+def test_contained_pattern_shares_an_input():
+    matcher = make_matcher({'name': 'Discord PTB', 'processes': ['DiscordPTB.exe']})
+
+    matched = matcher.match_windows([(1, 'Chrome_WidgetWin_1', 'Friends - Discord PTB'),
+                                     (2, 'Chrome_WidgetWin_1', 'Friends - Discord')])
+
+    assert [w['hwnd'] for w in matched['Discord']] == [1, 2]
+    assert [w['hwnd'] for w in matched['Discord PTB']] == [1]
+
+def test_mentioning_two_apps_is_not_an_overlap():
+    matcher = make_matcher({'name': 'Slack'}, {'name': 'Teams'})
+
+    matched = matcher.match_windows([(1, 'SlackWindow', 'Slack | moving calls to Teams')])
+
+    assert list(matched) == ['Slack']
+    # Plain-text patterns that do not contain one another are never re-tested
+    assert [p.name for p in matcher.windows.overlaps['Slack']] == []
+
+@pytest.mark.parametrize('pattern, text', [
+    ('(?i)slack', 'SLACK'),
+    ('(?P<t1>slack)', 'slack'),
+    (r'(ab)\1', 'abab'),
+])
+def test_patterns_with_groups_or_flags_match_on_their_own(pattern, text):
+    matcher = make_matcher({'name': 'Slack', 'window_match': pattern, 'registry_match': pattern})
+
+    assert [p.name for p in matcher.registry.separate] == ['Slack']
+    assert matcher.match_registry_keys([f'{text}.exe_1', 'Discord.exe_2', 'other.exe_3']) == {
+        'Slack': [f'{text}.exe_1'], 'Discord': ['Discord.exe_2']}
+    assert matcher.match_windows([(1, 'Window', f'{text} - main'), (2, 'Window', 'other')]) == {
+        'Slack': [window(1, 'Window', f'{text} - main')]}
+
+def test_invalid_pattern_is_ignored():
+    profiles = load_profiles(['Discord.exe'], [{'name': 'Slack', 'window_match': '(slack'}, {'name': 'Teams'}])
+
+    assert [p.name for p in profiles] == ['Discord', 'Teams']
+
+@pytest.mark.parametrize('targets, expected', [([], [None]), ([{'name': 'Slack'}], [30])])
+def test_sleeps_while_discord_is_closed_only_without_other_targets(make_manager, targets, expected):
+    desktop = SimulatedDesktop.generate(discord=False)
+    desktop.add_process('slack.exe')
+    manager = make_manager(desktop)
+    manager.check_interval = 30
+    manager.set_targets(targets)
+    manager.process_watcher = ProcessWatcher(desktop, manager.discord_processes, lambda event, name: None)
+    waits = []
+
+    def wait_for_next_cycle(seconds):
+        waits.append(seconds)
+        manager.running = False
+        return False
+
+    manager.wait_for_next_cycle = wait_for_next_cycle
+    manager.running = True
+    manager.monitor_loop(manager.generation)
+
+    assert manager.state.status == STATUS_NOT_RUNNING
+    assert waits == expected
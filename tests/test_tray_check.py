@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+import tray_check
+from desktop_backend import SimulatedDesktop
+from tray_check import check_tray, main, EXIT_OK, EXIT_NOT_RUNNING, EXIT_NOT_PROMOTED, EXIT_ERROR
+
+class BrokenDesktop(SimulatedDesktop):
+    def list_process_entries(self):
+        raise PermissionError("snapshot denied")
+
+def run(monkeypatch, capsys, desktop):
+    """Run the probe as an agent would, on the given desktop, and return (exit code, printed JSON)"""
+    monkeypatch.setattr(tray_check.SimulatedDesktop, 'generate', classmethod(lambda cls: desktop))
+    code = main(['--simulate', '--config', 'missing.json'])
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 1
+    return code, json.loads(lines[0])
+
+@pytest.mark.parametrize('desktop, code, status', [
+    (SimulatedDesktop.generate(promoted=True), EXIT_OK, 'ok'),
+    (SimulatedDesktop.generate(discord=False), EXIT_NOT_RUNNING, 'not_running'),
+    (SimulatedDesktop.generate(), EXIT_NOT_PROMOTED, 'not_promoted'),
+    (BrokenDesktop(), EXIT_ERROR, 'error'),
+])
+def test_exit_codes(monkeypatch, capsys, desktop, code, status):
+    exit_code, result = run(monkeypatch, capsys, desktop)
+
+    assert exit_code == code
+    assert result['status'] == status
+    assert result['elapsed_ms'] >= 0
+
+def test_json_fields(monkeypatch, capsys):
+    desktop = SimulatedDesktop.generate()
+    desktop.add_process('Discord.exe')
+
+    _, result = run(monkeypatch, capsys, desktop)
+
+    assert result == {'status': 'not_promoted', 'discord_running': True, 'processes': 3, 'entries': 1,
+                      'promoted': 0, 'elapsed_ms': result['elapsed_ms']}
+
+def test_error_is_reported_in_the_json(monkeypatch, capsys):
+    _, result = run(monkeypatch, capsys, BrokenDesktop())
+
+    assert result['error'] == "PermissionError: snapshot denied"
+
+def test_no_entries_yet_counts_as_ok():
+    desktop = SimulatedDesktop()
+    desktop.add_process('Discord.exe')
+
+    assert check_tray(desktop) == {'status': 'ok', 'discord_running': True, 'processes': 1, 'entries': 0,
+                                   'promoted': 0}
+
+def test_nothing_is_changed():
+    desktop = SimulatedDesktop.generate()
+
+    check_tray(desktop)
+
+    assert desktop.get_notify_icon_value('Discord.exe_7654321', 'IsPromoted') == 0
+    assert not desktop.sent_messages
@@ -0,0 +1,51 @@
+from tray_status import (TrayStatusPresenter, STATUS_STARTING, STATUS_OK, STATUS_FIXING, STATUS_DEGRADED,
+                         STATUS_COLORS)
+
+class FakeIcon:
+    """Stands in for pystray.Icon"""
+
+    def __init__(self):
+        self.icon = None
+        self.menu_updates = 0
+
+    def update_menu(self):
+        self.menu_updates += 1
+
+def make_presenter():
+    icon = FakeIcon()
+    # States sharing a colour share one image, as the GUI pre-renders them
+    rendered = {}
+    images = {status: rendered.setdefault(color, f"image {color}") for status, color in STATUS_COLORS.items()}
+    return TrayStatusPresenter(icon, images), icon, images
+
+def test_unchanged_state_is_not_redrawn():
+    presenter, icon, images = make_presenter()
+
+    assert presenter.set_status(STATUS_FIXING)
+    assert not presenter.set_status(STATUS_FIXING)
+    assert not presenter.set_status(STATUS_FIXING)
+
+    assert icon.icon is images[STATUS_FIXING]
+    assert presenter.icon_updates == 1
+    assert icon.menu_updates == 1
+
+def test_same_image_only_updates_the_menu():
+    presenter, icon, images = make_presenter()
+
+    # Starting and OK share Discord's colour
+    assert images[STATUS_STARTING] is images[STATUS_OK]
+    assert presenter.set_status(STATUS_OK)
+
+    assert icon.icon is None
+    assert icon.menu_updates == 1
+    assert presenter.menu_text() == "Status: Discord icon OK"
+
+def test_each_change_is_pushed():
+    presenter, icon, images = make_presenter()
+
+    for status in (STATUS_FIXING, STATUS_DEGRADED, STATUS_FIXING, STATUS_OK):
+        presenter.set_status(status)
+
+    assert presenter.icon_updates == 4
+    assert icon.menu_updates == presenter.menu_updates == 4
+    assert icon.icon is images[STATUS_OK]
@@ -0,0 +1,62 @@
+from cycle_metrics import CycleMetrics
+from desktop_backend import SimulatedDesktop
+from tray_topology import TopologyCache, discover_topology
+
+def make_desktop(**kwargs):
+    return SimulatedDesktop.generate(processes=0, windows=0, registry_keys=0, **kwargs)
+
+def test_discovers_every_tray_window():
+    desktop = make_desktop(monitors=3, startallback=True)
+    topology = discover_topology(desktop, desktop.enum_windows())
+
+    assert topology.primary and topology.notify_area
+    assert len(topology.secondary) == 2
+    assert len(topology.overflow) == 1
+    assert len(topology.startallback) == 1
+    assert topology.variant == 'startallback'
+
+def test_kept_while_every_window_exists():
+    metrics = CycleMetrics()
+    desktop = make_desktop()
+    cache = TopologyCache(metrics)
+    topology = cache.rebuild(desktop, desktop.enum_windows())
+
+    assert cache.current(desktop) is topology
+    assert cache.current(desktop) is topology
+    assert metrics.counters['topology_rebuilds'] == 1
+
+def test_dropped_when_a_window_goes():
+    desktop = make_desktop(monitors=2)
+    cache = TopologyCache()
+    topology = cache.rebuild(desktop, desktop.enum_windows())
+
+    # The second monitor is unplugged
+    desktop.remove_window(topology.secondary[0])
+
+    assert cache.current(desktop) is None
+    assert cache.topology is None
+
+def test_invalidate_forgets_it():
+    desktop = make_desktop()
+    cache = TopologyCache()
+    cache.rebuild(desktop, desktop.enum_windows())
+    cache.invalidate("taskbar recreated")
+
+    assert cache.current(desktop) is None
+
+def test_partial_topology_is_not_cached():
+    desktop = make_desktop(startallback=True)
+    cache = TopologyCache()
+
+    # Without a window list StartAllBack cannot be looked for
+    topology = cache.rebuild(desktop)
+
+    assert topology.startallback == []
+    assert cache.current(desktop) is None
+
+def test_no_taskbar():
+    desktop = SimulatedDesktop()
+    cache = TopologyCache()
+
+    assert cache.rebuild(desktop, desktop.enum_windows()) is None
+    assert cache.current(desktop) is None
@@ -0,0 +1,52 @@
+import pytest
+
+from cycle_metrics import CycleMetrics
+from trigger_coalescer import TriggerCoalescer, describe_batch
+
+def test_nothing_pending(clock):
+    coalescer = TriggerCoalescer(0.5, clock=clock)
+
+    assert coalescer.due_in() is None
+    assert coalescer.take_due() is None
+
+def test_released_after_quiet_window(clock):
+    coalescer = TriggerCoalescer(0.5, clock=clock)
+    coalescer.trigger('taskbar recreated')
+    clock.now = 0.3
+    coalescer.trigger('taskbar recreated')
+
+    # Each trigger restarts the quiet window
+    clock.now = 0.7
+    assert coalescer.due_in() == pytest.approx(0.1)
+    assert coalescer.take_due() is None
+    clock.now = 0.8
+    batch = coalescer.take_due()
+
+    assert batch.count == 2
+    assert batch.waited == 0.8
+    assert coalescer.due_in() is None
+
+def test_max_delay_caps_a_steady_stream(clock):
+    coalescer = TriggerCoalescer(0.5, max_delay=2.0, clock=clock)
+    batch = None
+    while batch is None:
+        coalescer.trigger('display changed')
+        clock.now += 0.25
+        batch = coalescer.take_due()
+
+    assert clock.now == 2.0
+    assert batch.count == 8
+
+def test_reasons_are_merged_in_arrival_order(clock):
+    metrics = CycleMetrics()
+    coalescer = TriggerCoalescer(0.5, metrics=metrics, clock=clock)
+    for reason in ('taskbar recreated', 'Discord.exe started', 'taskbar recreated'):
+        coalescer.trigger(reason)
+    clock.now = 0.5
+    batch = coalescer.take_due()
+
+    assert batch.reasons == {'taskbar recreated': 2, 'Discord.exe started': 1}
+    assert describe_batch(batch) == 'taskbar recreated x2, Discord.exe started'
+    assert (coalescer.batches, coalescer.absorbed, coalescer.largest) == (1, 2, 3)
+    assert metrics.counters['triggered_checks'] == 1
+    assert metrics.counters['coalesced_triggers'] == 2
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tray Check - One-shot headless probe of Discord's tray icon for monitoring agents
+
+Takes a single snapshot (Discord's processes and its NotifyIconSettings
+promotion), runs it through the monitor's decision core, prints one line of
+JSON and exits. Nothing is fixed, logged to file or left running, and only
+the backend and the detection core are imported, so an RMM agent can call it
+every few minutes:
+
+    python tray_check.py
+    {"status":"not_promoted","discord_running":true,"processes":2,"entries":1,"promoted":0,"elapsed_ms":3.1}
+
+Exit codes follow the Nagios plugin convention most agents understand.
+"""
+
+import sys
+import json
+import time
+import argparse
+
+from desktop_backend import Win32Backend, SimulatedDesktop
+from monitor_core import Snapshot, INITIAL_STATE, decide
+from target_profiles import discord_profile
+from tray_status import STATUS_OK, STATUS_NOT_RUNNING
+
+EXIT_OK = 0
+EXIT_NOT_RUNNING = 1
+EXIT_NOT_PROMOTED = 2
+EXIT_ERROR = 3
+
+RESULT_OK = 'ok'
+RESULT_NOT_RUNNING = 'not_running'
+RESULT_NOT_PROMOTED = 'not_promoted'
+RESULT_ERROR = 'error'
+
+EXIT_CODES = {
+    RESULT_OK: EXIT_OK,
+    RESULT_NOT_RUNNING: EXIT_NOT_RUNNING,
+    RESULT_NOT_PROMOTED: EXIT_NOT_PROMOTED,
+    RESULT_ERROR: EXIT_ERROR,
+}
+
+# Same as the monitor's defaults when config.json has no discord_processes
+DEFAULT_PROCESSES = ['Discord.exe', 'DiscordPTB.exe', 'DiscordCanary.exe']
+
+def load_process_names(config_path):
+    """Discord image names from the monitor's config, the defaults if it cannot be read"""
+    try:
+        with open(config_path, 'r') as f:
+            return json.load(f).get('discord_processes', DEFAULT_PROCESSES)
+    except (OSError, ValueError):
+        return DEFAULT_PROCESSES
+
+def check_tray(backend, process_names=DEFAULT_PROCESSES):
+    """Detect once and return the result dict, without changing anything"""
+    profile = discord_profile(process_names)
+    wanted = {name.lower() for name in profile.process_names}
+    # A Toolhelp32 snapshot, tasklist alone would take longer than the whole check
+    processes = sum(1 for _, image_name in backend.list_process_entries() if image_name.lower() in wanted)
+    result = {'discord_running': bool(processes), 'processes': processes}
+
+    icon_visible = False
+    if processes:
+        entries = [subkey for subkey in backend.enum_notify_icon_keys() if profile.matches_registry_key(subkey)]
+        promoted = sum(1 for subkey in entries if backend.get_notify_icon_value(subkey, 'IsPromoted') == 1)
+        result['entries'] = len(entries)
+        result['promoted'] = promoted
+        # Like the monitor: no entries yet (first run) counts as fine
+        icon_visible = promoted > 0 or not entries
+
+    state, _ = decide(Snapshot(bool(processes), icon_visible), INITIAL_STATE, auto_fix=False)
+    if state.status == STATUS_OK:
+        status = RESULT_OK
+    elif state.status == STATUS_NOT_RUNNING:
+        status = RESULT_NOT_RUNNING
+    else:
+        status = RESULT_NOT_PROMOTED
+    return dict(status=status, **result)
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Check Discord's tray icon once, print JSON and exit with "
+                                                 "0 ok, 1 not running, 2 not promoted, 3 error")
+    parser.add_argument('--config', default='config.json',
+                        help='Configuration file to read discord_processes from (default: config.json)')
+    parser.add_argument('--simulate', action='store_true',
+                        help='Check a simulated desktop instead of this one')
+    return parser
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    start = time.perf_counter()
+    try:
+        backend = SimulatedDesktop.generate() if args.simulate else Win32Backend()
+        result = check_tray(backend, load_process_names(args.config))
+    except Exception as e:
+        result = {'status': RESULT_ERROR, 'error': f"{type(e).__name__}: {e}"}
+    result['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    print(json.dumps(result, separators=(',', ':')))
+    return EXIT_CODES[result['status']]
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,7 +6,16 @@ import ctypes
 from ctypes import wintypes, Structure, POINTER, byref
 import struct
 import logging
-import winreg
+import subprocess
+import threading
+from desktop_backend import Win32Backend, HWND_BROADCAST
+from cycle_metrics import NULL_METRICS, STAGE_WINDOW_ENUM, STAGE_REGISTRY, STAGE_MESSAGE_SEND
+from cycle_tracer import NULL_TRACER, traced
+from cycle_budget import (NULL_BUDGET, BUDGET_STARTALLBACK_SCAN, BUDGET_TASKBAR_BROADCAST, BUDGET_OVERFLOW_REFRESH,
+                          BUDGET_REGISTRY_DUMP)
+from state_cache import StateCache
+from target_profiles import discord_profile
+from tray_topology import TopologyCache
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +36,23 @@ NIF_GUID = 0x00000020
 NIS_HIDDEN = 0x00000001
 NIS_SHAREDICON = 0x00000002
 
+WM_COMMAND = 0x0111
+WM_SETTINGCHANGE = 0x001A
+
+DEFAULT_DISCORD_PROCESSES = ['Discord.exe', 'DiscordPTB.exe', 'DiscordCanary.exe']
+
+# Fix strategies in the order they are tried, the last one that worked goes first
+STRATEGY_STARTALLBACK = 'startallback'
+STRATEGY_SHELL_API = 'shell_api'
+STRATEGY_REGISTRY = 'registry'
+FIX_STRATEGIES = (STRATEGY_STARTALLBACK, STRATEGY_SHELL_API, STRATEGY_REGISTRY)
+# As they appear in the "<name> promotion result" lines the log analyzer reads
+STRATEGY_LOG_NAMES = {STRATEGY_STARTALLBACK: 'StartAllBack', STRATEGY_SHELL_API: 'Shell API',
+                      STRATEGY_REGISTRY: 'Registry'}
+
+# Strategies that must not run at the same time: both make Discord re-add its icon via TaskbarCreated
+STRATEGY_CONFLICTS = {frozenset((STRATEGY_STARTALLBACK, STRATEGY_SHELL_API))}
+
 # Windows structures
 class NOTIFYICONDATA(Structure):
     _fields_ = [
@@ -45,65 +71,98 @@ class NOTIFYICONDATA(Structure):
         ("dwInfoFlags", wintypes.DWORD),
     ]
 
+def is_discord_registry_key(subkey_name):
+    """Check if a NotifyIconSettings subkey belongs to Discord"""
+    name = subkey_name.lower()
+    return 'discord' in name and ('exe' in name or 'app' in name)
+
+def find_discord_processes(backend, process_names=DEFAULT_DISCORD_PROCESSES):
+    """Return the configured Discord image names that are currently running"""
+    running = {name.lower() for name in backend.list_processes()}
+    return [name for name in process_names if name.lower() in running]
+
+def count_discord_processes(backend, process_names=DEFAULT_DISCORD_PROCESSES):
+    """Return {image_name: process count} for the configured Discord images that are running"""
+    wanted = {name.lower(): name for name in process_names}
+    counts = {}
+    for image_name in backend.list_processes():
+        name = wanted.get(image_name.lower())
+        if name:
+            counts[name] = counts.get(name, 0) + 1
+    return counts
+
 class TrayIconManager:
-    def __init__(self):
-        self.shell32 = ctypes.windll.shell32
-        self.user32 = ctypes.windll.user32
-        self.kernel32 = ctypes.windll.kernel32
+    def __init__(self, backend=None, profile=None):
+        self.backend = backend or Win32Backend()
+        # The app whose icon is kept visible, and the per-cycle snapshot shared with other targets
+        self.profile = profile or discord_profile(DEFAULT_DISCORD_PROCESSES)
+        self.shared = None
+        self.metrics = NULL_METRICS
+        self.tracer = NULL_TRACER
+        self.budget = NULL_BUDGET
+        self.cache = StateCache()
+        # Replaced by the monitor's so all targets share one topology
+        self.topology = TopologyCache()
+        self.discord_windows = []
+        # Last IsPromoted value read for each Discord entry
+        self.promotion_values = {}
+        # Set once a concurrently run strategy has won, the others stop at their next check
+        self.fix_cancel = threading.Event()
+        self.fix_runner = None
         
+    def send_message(self, hwnd, msg, wparam, lparam):
+        """SendMessage wrapper that records time spent in message sends"""
+        with self.metrics.stage(STAGE_MESSAGE_SEND), self.tracer.span('send_message', {'hwnd': hwnd, 'msg': msg}):
+            return self.backend.send_message(hwnd, msg, wparam, lparam)
+        
+    def enum_windows(self):
+        """Enumerate all top-level windows as (hwnd, class_name, title)"""
+        if self.shared:
+            return self.shared.windows()
+        with self.metrics.stage(STAGE_WINDOW_ENUM):
+            return self.backend.enum_windows()
+        
+    @traced
     def find_discord_windows(self):
         """Find all Discord application windows"""
         discord_windows = []
         
-        logger.debug("Starting Discord window enumeration...")
-        
-        def enum_windows_proc(hwnd, lparam):
-            # Get window class name
-            class_name = ctypes.create_unicode_buffer(256)
-            self.user32.GetClassNameW(hwnd, class_name, 256)
-            
-            # Get window title
-            title_length = self.user32.GetWindowTextLengthW(hwnd)
-            if title_length > 0:
-                title = ctypes.create_unicode_buffer(title_length + 1)
-                self.user32.GetWindowTextW(hwnd, title, title_length + 1)
-                
-                # Check if this is a Discord window
-                if ('discord' in title.value.lower() or 
-                    'discord' in class_name.value.lower()):
-                    
-                    window_info = {
-                        'hwnd': hwnd,
-                        'title': title.value,
-                        'class': class_name.value
-                    }
-                    discord_windows.append(window_info)
-                    logger.debug(f"Found Discord window: hwnd={hwnd}, title='{title.value}', class='{class_name.value}'")
-            
-            return True
-        
-        # Define the callback type
-        EnumWindowsProc = ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HWND, wintypes.LPARAM)
+        logger.debug(f"Starting {self.profile.name} window enumeration...")
         
-        # Enumerate all windows
         try:
-            self.user32.EnumWindows(EnumWindowsProc(enum_windows_proc), 0)
-            logger.debug(f"Discord window enumeration complete. Found {len(discord_windows)} Discord windows")
+            if self.shared:
+                # Matched for every target at once from the cycle's single enumeration
+                discord_windows = self.shared.profile_windows(self.profile.name)
+            else:
+                for hwnd, class_name, title in self.enum_windows():
+                    if title and self.profile.matches_window(class_name, title):
+                        discord_windows.append({
+                            'hwnd': hwnd,
+                            'title': title,
+                            'class': class_name
+                        })
+            # Only built at DEBUG, these lines would otherwise be formatted and dropped every cycle
+            if logger.isEnabledFor(logging.DEBUG):
+                for window in discord_windows:
+                    logger.debug(f"Found {self.profile.name} window: hwnd={window['hwnd']}, title='{window['title']}', class='{window['class']}'")
+                logger.debug(f"{self.profile.name} window enumeration complete. Found {len(discord_windows)} windows")
         except Exception as e:
             logger.error(f"Error during window enumeration: {e}")
         
+        # Kept for call detection, which reuses whatever the latest enumeration found
+        self.discord_windows = discord_windows
         return discord_windows
     
     def get_notification_area_icons(self):
         """Get information about current notification area icons"""
         try:
             # Find the notification area
-            tray_wnd = self.user32.FindWindowW("Shell_TrayWnd", None)
+            tray_wnd = self.backend.find_window("Shell_TrayWnd")
             if not tray_wnd:
                 logger.error("Could not find system tray window")
                 return []
             
-            notify_wnd = self.user32.FindWindowExW(tray_wnd, None, "TrayNotifyWnd", None)
+            notify_wnd = self.backend.find_window_ex(tray_wnd, None, "TrayNotifyWnd")
             if not notify_wnd:
                 logger.error("Could not find notification area window")
                 return []
@@ -128,157 +187,208 @@ class TrayIconManager:
             logger.error(f"Error checking Discord icon visibility: {e}")
             return False
     
+    @traced
     def is_discord_promoted_in_registry(self):
-        """Check if Discord is promoted to main tray in Windows registry"""
+        """Check if Discord is promoted to main tray, reading only the known entries when the cache is warm"""
+        if not self.cache.needs_full_scan():
+            promoted = self.check_cached_registry_entries()
+            if promoted is not None:
+                return promoted
+        if self.shared is None:
+            return self.scan_registry_promotion()
+        
+        # One registry walk per cycle serves every target
+        try:
+            subkey_names = self.shared.registry_keys(self.profile.name)
+        except Exception as e:
+            logger.error(f"Error checking {self.profile.name} registry promotion: {e}")
+            return True  # If we can't check, assume it's fine
+        
+        self.remember_discord_entries(subkey_names)
+        if not subkey_names:
+            logger.warning(f"No {self.profile.name} entries found in registry")
+            return True  # If no entries, assume it's fine (might be first run)
+        for subkey_name in subkey_names:
+            logger.info(f"Found {self.profile.name} registry entry: {subkey_name}")
+        
+        promoted = self.check_cached_registry_entries()
+        return True if promoted is None else promoted
+    
+    def check_cached_registry_entries(self):
+        """Check the cached Discord entries directly, None if the cache turned out stale"""
         try:
-            import winreg
+            promoted_found = False
+            with self.metrics.stage(STAGE_REGISTRY):
+                for subkey_name in self.cache.discord_subkeys:
+                    is_promoted = self.promotion_values[subkey_name] = self.backend.get_notify_icon_value(subkey_name, "IsPromoted")
+                    if is_promoted == 1:
+                        logger.debug(f"{self.profile.name} is promoted in registry: {subkey_name}")
+                        promoted_found = True
+                    elif is_promoted is None:
+                        logger.warning(f"IsPromoted value not found for: {subkey_name}")
+                        if self.budget.allow(BUDGET_REGISTRY_DUMP):
+                            self.log_registry_values(subkey_name)
+                    else:
+                        logger.warning(f"{self.profile.name} is not promoted in registry: {subkey_name} (value={is_promoted})")
             
+            self.cache.targeted_checks += 1
+            return promoted_found
+        except FileNotFoundError:
+            self.cache.invalidate("a cached Discord registry entry is gone")
+            return None
+        except Exception as e:
+            logger.error(f"Error checking cached Discord registry entries: {e}")
+            return None
+    
+    def is_promoted_now(self):
+        """Read IsPromoted again without touching the cycle's state, True like the check when there are no entries"""
+        subkey_names = self.cache.discord_subkeys or [
+            subkey_name for subkey_name in self.backend.enum_notify_icon_keys()
+            if self.profile.matches_registry_key(subkey_name)]
+        if not subkey_names:
+            return True
+        return any(self.backend.get_notify_icon_value(subkey_name, "IsPromoted") == 1 for subkey_name in subkey_names)
+    
+    @traced
+    def scan_registry_promotion(self):
+        """Check every NotifyIconSettings entry for Discord's promotion state"""
+        try:
             logger.debug("Checking Discord promotion status in Windows registry...")
             
-            registry_path = r"Control Panel\NotifyIconSettings"
-            
-            with winreg.OpenKey(winreg.HKEY_CURRENT_USER, registry_path) as main_key:
-                i = 0
-                discord_found = False
+            with self.metrics.stage(STAGE_REGISTRY):
+                subkey_names = self.backend.enum_notify_icon_keys()
+                discord_keys = []
                 promoted_found = False
                 
-                logger.debug(f"Enumerating registry keys in {registry_path}...")
+                logger.debug(f"Enumerating {len(subkey_names)} NotifyIconSettings registry keys...")
                 
-                while True:
+                for subkey_name in subkey_names:
+                    # Look for Discord with more specific matching
+                    if not self.profile.matches_registry_key(subkey_name):
+                        continue
+                    
+                    discord_keys.append(subkey_name)
+                    logger.info(f"Found Discord registry entry: {subkey_name}")
+                    
                     try:
-                        subkey_name = winreg.EnumKey(main_key, i)
-                        logger.debug(f"Registry subkey [{i}]: {subkey_name}")
-                        
-                        # Look for Discord with more specific matching
-                        if ('discord' in subkey_name.lower() and 
-                            ('exe' in subkey_name.lower() or 'app' in subkey_name.lower())):
-                            
-                            discord_found = True
-                            subkey_path = f"{registry_path}\\{subkey_name}"
-                            logger.info(f"Found Discord registry entry: {subkey_name}")
-                            
-                            try:
-                                with winreg.OpenKey(winreg.HKEY_CURRENT_USER, subkey_path) as discord_key:
-                                    try:
-                                        is_promoted, reg_type = winreg.QueryValueEx(discord_key, "IsPromoted")
-                                        logger.debug(f"IsPromoted value for {subkey_name}: {is_promoted} (type: {reg_type})")
-                                        if is_promoted == 1:
-                                            logger.info(f"Discord is promoted in registry: {subkey_name}")
-                                            promoted_found = True
-                                        else:
-                                            logger.warning(f"Discord is not promoted in registry: {subkey_name} (value={is_promoted})")
-                                    except FileNotFoundError:
-                                        logger.warning(f"IsPromoted value not found for: {subkey_name}")
-                                        # List all values in this key for debugging
-                                        try:
-                                            value_count = winreg.QueryInfoKey(discord_key)[1]
-                                            logger.debug(f"Registry key {subkey_name} has {value_count} values:")
-                                            for j in range(value_count):
-                                                value_name, value_data, value_type = winreg.EnumValue(discord_key, j)
-                                                logger.debug(f"  {value_name} = {value_data} (type: {value_type})")
-                                        except Exception as enum_e:
-                                            logger.debug(f"Could not enumerate values in {subkey_name}: {enum_e}")
-                            except Exception as key_e:
-                                logger.error(f"Could not open Discord registry key {subkey_name}: {key_e}")
+                        is_promoted = self.promotion_values[subkey_name] = self.backend.get_notify_icon_value(subkey_name, "IsPromoted")
+                        if is_promoted is None:
+                            logger.warning(f"IsPromoted value not found for: {subkey_name}")
+                            if self.budget.allow(BUDGET_REGISTRY_DUMP):
+                                self.log_registry_values(subkey_name)
+                        elif is_promoted == 1:
+                            logger.info(f"Discord is promoted in registry: {subkey_name}")
+                            promoted_found = True
                         else:
-                            logger.debug(f"Skipping non-Discord key: {subkey_name}")
-                        
-                        i += 1
-                    except OSError:
-                        logger.debug(f"Registry enumeration complete. Checked {i} keys total.")
-                        break
+                            logger.warning(f"Discord is not promoted in registry: {subkey_name} (value={is_promoted})")
+                    except Exception as key_e:
+                        logger.error(f"Could not open Discord registry key {subkey_name}: {key_e}")
                 
-                if not discord_found:
-                    logger.warning("No Discord entries found in registry")
-                    return True  # If no entries, assume it's fine (might be first run)
-                
-                logger.info(f"Discord registry check result: found={discord_found}, promoted={promoted_found}")
-                return promoted_found
+                logger.debug(f"Registry enumeration complete. Checked {len(subkey_names)} keys total.")
+                self.remember_discord_entries(discord_keys)
+            
+            discord_found = bool(discord_keys)
+            if not discord_found:
+                logger.warning("No Discord entries found in registry")
+                return True  # If no entries, assume it's fine (might be first run)
+            
+            logger.info(f"Discord registry check result: found={discord_found}, promoted={promoted_found}")
+            return promoted_found
                         
         except Exception as e:
             logger.error(f"Error checking Discord registry promotion: {e}")
             return True  # If we can't check, assume it's fine
     
+    def remember_discord_entries(self, subkey_names):
+        """Store the Discord entries and their executables found by a full scan"""
+        self.cache.set_discord_subkeys(subkey_names)
+        for subkey_name in subkey_names:
+            try:
+                executable = self.backend.get_notify_icon_value(subkey_name, "ExecutablePath")
+            except Exception:
+                continue
+            if executable:
+                self.cache.remember_executable(executable)
+    
+    def log_registry_values(self, subkey_name):
+        """List all values in a registry key for debugging"""
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        try:
+            values = self.backend.get_notify_icon_values(subkey_name)
+            logger.debug(f"Registry key {subkey_name} has {len(values)} values:")
+            for value_name, value_data in values.items():
+                logger.debug(f"  {value_name} = {value_data}")
+        except Exception as enum_e:
+            logger.debug(f"Could not enumerate values in {subkey_name}: {enum_e}")
+    
+    def get_topology(self):
+        """Cached tray topology, looked up again once a tray window has gone"""
+        topology = self.topology.current(self.backend)
+        if topology is None:
+            # Finding StartAllBack takes a window enumeration, skipped when out of time
+            scan = self.budget.allow(BUDGET_STARTALLBACK_SCAN)
+            topology = self.topology.rebuild(self.backend, self.enum_windows() if scan else None)
+            if topology is not None and scan:
+                self.cache.set_tray_variant(topology.variant)
+        return topology
+
+    @traced
     def find_startallback_tray(self):
-        """Find StartAllBack tray windows if present"""
+        """Return the StartAllBack tray window handles if present"""
         try:
-            startallback_windows = []
-            
-            logger.debug("Scanning for StartAllBack tray windows...")
-            
-            def enum_windows_proc(hwnd, lparam):
-                # Get window class name
-                class_name = ctypes.create_unicode_buffer(256)
-                self.user32.GetClassNameW(hwnd, class_name, 256)
-                
-                # Get window title
-                title_length = self.user32.GetWindowTextLengthW(hwnd)
-                title = ""
-                if title_length > 0:
-                    title_buffer = ctypes.create_unicode_buffer(title_length + 1)
-                    self.user32.GetWindowTextW(hwnd, title_buffer, title_length + 1)
-                    title = title_buffer.value
-                
-                # Check for StartAllBack tray windows
-                class_lower = class_name.value.lower()
-                if ('startallback' in class_lower or 
-                    'shell_traywnd' in class_lower or
-                    'traynotifywnd' in class_lower):
-                    
-                    window_info = {
-                        'hwnd': hwnd,
-                        'class': class_name.value,
-                        'title': title
-                    }
-                    startallback_windows.append(window_info)
-                    logger.debug(f"Found potential StartAllBack window: hwnd={hwnd}, class='{class_name.value}', title='{title}'")
-                
-                return True
-            
-            # Define the callback type
-            EnumWindowsProc = ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HWND, wintypes.LPARAM)
-            
-            # Enumerate all windows
-            self.user32.EnumWindows(EnumWindowsProc(enum_windows_proc), 0)
-            
-            logger.info(f"StartAllBack scan complete. Found {len(startallback_windows)} potential StartAllBack windows")
-            for window in startallback_windows:
-                logger.info(f"StartAllBack window: {window['class']} - {window['title']}")
-            
+            topology = self.get_topology()
+            startallback_windows = topology.startallback if topology else []
+            logger.debug(f"StartAllBack check complete. Found {len(startallback_windows)} StartAllBack windows")
             return startallback_windows
             
         except Exception as e:
             logger.error(f"Error finding StartAllBack windows: {e}")
             return []
 
+    @traced
     def promote_discord_to_main_tray(self):
         """Promote Discord icon to main system tray area using multiple methods"""
+        if self.fix_runner:
+            return self.promote_discord_concurrently()
         try:
             logger.info("======= STARTING DISCORD TRAY PROMOTION PROCESS =======")
             success = False
+            strategy = None
+            
+            # Go straight to whatever worked last time
+            last_strategy = self.cache.last_strategy
+            if last_strategy in FIX_STRATEGIES:
+                logger.info(f"Step 0: Trying last successful strategy first: {last_strategy}")
+                success = self.run_fix_strategy(last_strategy)
+                if success:
+                    strategy = last_strategy
             
             # Method 1: Check for StartAllBack and use alternative approach
-            logger.info("Step 1: Checking for StartAllBack...")
-            startallback_windows = self.find_startallback_tray()
-            if startallback_windows:
-                logger.info(f"StartAllBack detected with {len(startallback_windows)} windows, using alternative tray approach")
-                success = self.promote_discord_startallback_compatible()
-                logger.info(f"StartAllBack promotion result: {success}")
-            else:
-                logger.info("No StartAllBack windows detected, will use standard Windows API")
+            if not success and last_strategy != STRATEGY_STARTALLBACK:
+                logger.info("Step 1: Checking for StartAllBack...")
+                startallback_windows = self.find_startallback_tray()
+                if startallback_windows:
+                    logger.info(f"StartAllBack detected with {len(startallback_windows)} windows, using alternative tray approach")
+                    success = self.run_fix_strategy(STRATEGY_STARTALLBACK)
+                    strategy = STRATEGY_STARTALLBACK
+                else:
+                    logger.info("No StartAllBack windows detected, will use standard Windows API")
             
             # Method 2: Standard Windows Shell API
-            if not success:
+            if not success and last_strategy != STRATEGY_SHELL_API:
                 logger.info("Step 2: Trying standard Windows Shell API approach...")
-                success = self.promote_discord_shell_api()
-                logger.info(f"Shell API promotion result: {success}")
+                success = self.run_fix_strategy(STRATEGY_SHELL_API)
+                strategy = STRATEGY_SHELL_API
             
             # Method 3: Registry approach as fallback
-            if not success:
+            if not success and last_strategy != STRATEGY_REGISTRY:
                 logger.info("Step 3: Trying registry-based approach as fallback...")
-                success = self.registry_promote_discord()
-                logger.info(f"Registry promotion result: {success}")
-                
+                success = self.run_fix_strategy(STRATEGY_REGISTRY)
+                strategy = STRATEGY_REGISTRY
+            
+            if success:
+                self.cache.set_last_strategy(strategy)
             logger.info(f"======= DISCORD TRAY PROMOTION PROCESS COMPLETE: {success} =======")
             return success
             
@@ -286,6 +396,43 @@ class TrayIconManager:
             logger.error(f"Error promoting Discord to main tray: {e}")
             return False
     
+    @traced
+    def promote_discord_concurrently(self):
+        """Run the applicable strategies side by side, keeping whichever succeeds first"""
+        try:
+            logger.info("======= STARTING CONCURRENT DISCORD TRAY PROMOTION =======")
+            # Fill the cycle's window list and tray topology before the strategies race for them
+            self.find_discord_windows()
+            strategies = [STRATEGY_SHELL_API, STRATEGY_REGISTRY]
+            if self.find_startallback_tray():
+                strategies.insert(0, STRATEGY_STARTALLBACK)
+            last_strategy = self.cache.last_strategy
+            if last_strategy in FIX_STRATEGIES:
+                strategies = [last_strategy] + [s for s in strategies if s != last_strategy]
+            
+            strategy = self.fix_runner.run(strategies)
+            if strategy:
+                self.cache.set_last_strategy(strategy)
+            logger.info(f"======= CONCURRENT DISCORD TRAY PROMOTION COMPLETE: {strategy or False} =======")
+            return strategy is not None
+            
+        except Exception as e:
+            logger.error(f"Error promoting Discord to main tray: {e}")
+            return False
+    
+    def run_fix_strategy(self, strategy):
+        """Run one promotion strategy by name, the only place its result line is logged"""
+        if strategy == STRATEGY_STARTALLBACK:
+            success = self.promote_discord_startallback_compatible()
+        elif strategy == STRATEGY_SHELL_API:
+            success = self.promote_discord_shell_api()
+        else:
+            success = self.registry_promote_discord()
+        # One line per attempt, the log analyzer counts these
+        logger.info(f"{STRATEGY_LOG_NAMES[strategy]} promotion result: {success}")
+        return success
+    
+    @traced
     def promote_discord_startallback_compatible(self):
         """StartAllBack-compatible Discord promotion"""
         try:
@@ -305,19 +452,20 @@ class TrayIconManager:
             
             # Method 1: Send Explorer restart simulation to Discord
             for window in discord_windows:
+                if self.fix_cancel.is_set():
+                    break
                 hwnd = window['hwnd']
-                if 'discord' in window['title'].lower():
+                if self.profile.matches_title(window['title']):
                     logger.debug(f"Sending StartAllBack messages to Discord window: {window['title']} (hwnd={hwnd})")
                     
                     # Send messages that simulate explorer restart
-                    WM_SETTINGCHANGE = 0x001A
-                    result1 = self.user32.SendMessageW(hwnd, WM_SETTINGCHANGE, 0, 0)
+                    result1 = self.send_message(hwnd, WM_SETTINGCHANGE, 0, 0)
                     logger.debug(f"WM_SETTINGCHANGE result: {result1}")
                     
                     # Also try the taskbar created message
-                    WM_TASKBARCREATED = self.user32.RegisterWindowMessageW("TaskbarCreated")
+                    WM_TASKBARCREATED = self.backend.register_window_message("TaskbarCreated")
                     logger.debug(f"Registered WM_TASKBARCREATED message ID: {WM_TASKBARCREATED}")
-                    result2 = self.user32.SendMessageW(hwnd, WM_TASKBARCREATED, 0, 0)
+                    result2 = self.send_message(hwnd, WM_TASKBARCREATED, 0, 0)
                     logger.debug(f"WM_TASKBARCREATED result: {result2}")
                     
                     logger.info(f"Sent StartAllBack-compatible messages to Discord: {window['title']}")
@@ -326,22 +474,21 @@ class TrayIconManager:
                     logger.debug(f"Skipping non-main Discord window: {window['title']}")
             
             # Method 2: Try to refresh all tray icons via broadcast
-            if success:
+            if success and not self.fix_cancel.is_set() and self.budget.allow(BUDGET_TASKBAR_BROADCAST):
                 logger.debug("Broadcasting taskbar recreation message system-wide...")
                 # Broadcast to all windows that taskbar was recreated
-                HWND_BROADCAST = 0xFFFF
-                WM_TASKBARCREATED = self.user32.RegisterWindowMessageW("TaskbarCreated")
-                broadcast_result = self.user32.SendMessageW(HWND_BROADCAST, WM_TASKBARCREATED, 0, 0)
+                WM_TASKBARCREATED = self.backend.register_window_message("TaskbarCreated")
+                broadcast_result = self.send_message(HWND_BROADCAST, WM_TASKBARCREATED, 0, 0)
                 logger.debug(f"Broadcast WM_TASKBARCREATED result: {broadcast_result}")
                 logger.info("Broadcasted taskbar recreation message for StartAllBack")
             
-            logger.info(f"StartAllBack promotion result: {success}")
             return success
             
         except Exception as e:
             logger.error(f"Error in StartAllBack-compatible promotion: {e}")
             return False
     
+    @traced
     def promote_discord_shell_api(self):
         """Standard Windows Shell API approach"""
         try:
@@ -358,87 +505,71 @@ class TrayIconManager:
             logger.info(f"Found {len(discord_windows)} Discord windows for Shell API promotion")
             
             # Send WM_TASKBARCREATED to Discord to refresh its tray icon
-            WM_TASKBARCREATED = self.user32.RegisterWindowMessageW("TaskbarCreated")
+            WM_TASKBARCREATED = self.backend.register_window_message("TaskbarCreated")
             logger.debug(f"Registered WM_TASKBARCREATED message ID: {WM_TASKBARCREATED}")
             
             for window in discord_windows:
+                if self.fix_cancel.is_set():
+                    break
                 hwnd = window['hwnd']
-                if 'discord' in window['title'].lower():
+                if self.profile.matches_title(window['title']):
                     logger.debug(f"Sending TaskbarCreated to Discord window: {window['title']} (hwnd={hwnd})")
                     
                     # Send taskbar created message to force tray icon refresh
-                    result = self.user32.SendMessageW(hwnd, WM_TASKBARCREATED, 0, 0)
+                    result = self.send_message(hwnd, WM_TASKBARCREATED, 0, 0)
                     logger.debug(f"WM_TASKBARCREATED result: {result}")
                     logger.info(f"Sent TaskbarCreated message to Discord window: {window['title']}")
                     success = True
                 else:
                     logger.debug(f"Skipping non-main Discord window: {window['title']}")
                     
-            logger.info(f"Shell API promotion result: {success}")
             return success
             
         except Exception as e:
             logger.error(f"Error in Shell API promotion: {e}")
             return False
     
+    @traced
     def registry_promote_discord(self):
         """Fallback registry method to promote Discord"""
         try:
             logger.info("=== Starting registry-based Discord promotion ===")
             
-            import winreg
-            
-            # Registry path for notification icon settings
-            registry_path = r"Control Panel\NotifyIconSettings"
-            
             promoted_count = 0
             
-            logger.debug(f"Opening registry path: HKEY_CURRENT_USER\\{registry_path}")
-            
-            # Open the main registry key
-            with winreg.OpenKey(winreg.HKEY_CURRENT_USER, registry_path) as main_key:
+            with self.metrics.stage(STAGE_REGISTRY):
                 # Enumerate all subkeys (each represents a tray icon)
-                i = 0
-                while True:
+                subkey_names = self.backend.enum_notify_icon_keys()
+                
+                for subkey_name in subkey_names:
+                    if self.fix_cancel.is_set():
+                        break
+                    # Check if this subkey is related to Discord (more specific matching)
+                    if not self.profile.matches_registry_key(subkey_name):
+                        continue
+                    
+                    logger.info(f"Found Discord registry entry for promotion: {subkey_name}")
+                    
                     try:
-                        subkey_name = winreg.EnumKey(main_key, i)
-                        logger.debug(f"Checking registry key [{i}]: {subkey_name}")
+                        # Check current promotion status
+                        current_value = self.backend.get_notify_icon_value(subkey_name, "IsPromoted")
+                        logger.debug(f"Current IsPromoted value: {current_value}")
+                        if current_value == 1:
+                            logger.info(f"Discord already promoted: {subkey_name}")
+                            continue
+                        if current_value is None:
+                            logger.debug(f"IsPromoted doesn't exist for {subkey_name}, will create it")
                         
-                        # Check if this subkey is related to Discord (more specific matching)
-                        if ('discord' in subkey_name.lower() and 
-                            ('exe' in subkey_name.lower() or 'app' in subkey_name.lower())):
-                            
-                            subkey_path = f"{registry_path}\\{subkey_name}"
-                            logger.info(f"Found Discord registry entry for promotion: {subkey_name}")
-                            
-                            try:
-                                # Open the Discord-related subkey
-                                with winreg.OpenKey(winreg.HKEY_CURRENT_USER, subkey_path, 0, winreg.KEY_SET_VALUE | winreg.KEY_QUERY_VALUE) as discord_key:
-                                    # Check current promotion status
-                                    try:
-                                        current_value, reg_type = winreg.QueryValueEx(discord_key, "IsPromoted")
-                                        logger.debug(f"Current IsPromoted value: {current_value} (type: {reg_type})")
-                                        if current_value == 1:
-                                            logger.info(f"Discord already promoted: {subkey_name}")
-                                            continue
-                                    except FileNotFoundError:
-                                        logger.debug(f"IsPromoted doesn't exist for {subkey_name}, will create it")
-                                    
-                                    # Set IsPromoted to 1 to show in main tray
-                                    logger.debug(f"Setting IsPromoted=1 for {subkey_name}")
-                                    winreg.SetValueEx(discord_key, "IsPromoted", 0, winreg.REG_DWORD, 1)
-                                    logger.info(f"Successfully promoted Discord icon to main tray: {subkey_name}")
-                                    promoted_count += 1
-                                    
-                            except (FileNotFoundError, PermissionError) as e:
-                                logger.error(f"Could not access Discord registry key {subkey_name}: {e}")
-                        else:
-                            logger.debug(f"Skipping non-Discord registry key: {subkey_name}")
+                        # Set IsPromoted to 1 to show in main tray
+                        logger.debug(f"Setting IsPromoted=1 for {subkey_name}")
+                        self.backend.set_notify_icon_value(subkey_name, "IsPromoted", 1)
+                        logger.info(f"Successfully promoted Discord icon to main tray: {subkey_name}")
+                        promoted_count += 1
                         
-                        i += 1
-                    except OSError:
-                        logger.debug(f"Registry enumeration complete. Processed {i} keys total.")
-                        break
+                    except (FileNotFoundError, PermissionError) as e:
+                        logger.error(f"Could not access Discord registry key {subkey_name}: {e}")
+                
+                logger.debug(f"Registry enumeration complete. Processed {len(subkey_names)} keys total.")
                         
             if promoted_count > 0:
                 logger.info(f"Successfully promoted {promoted_count} Discord icon(s) via registry")
@@ -451,6 +582,7 @@ class TrayIconManager:
             logger.error(f"Error promoting Discord via registry: {e}")
             return False
     
+    @traced
     def refresh_notification_area(self):
         """Force refresh of the notification area and promote Discord"""
         try:
@@ -462,57 +594,7 @@ class TrayIconManager:
             if promoted:
                 logger.info("Discord promotion successful, now refreshing tray areas...")
                 
-                # Check if StartAllBack is running for compatible refresh
-                startallback_windows = self.find_startallback_tray()
-                
-                if startallback_windows:
-                    # StartAllBack-specific refresh
-                    logger.info(f"Refreshing {len(startallback_windows)} StartAllBack tray areas")
-                    refresh_count = 0
-                    for sb_window in startallback_windows:
-                        hwnd = sb_window['hwnd']
-                        logger.debug(f"Refreshing StartAllBack window: {sb_window['class']} (hwnd={hwnd})")
-                        
-                        # Refresh StartAllBack tray windows
-                        invalidate_result = self.user32.InvalidateRect(hwnd, None, True)
-                        update_result = self.user32.UpdateWindow(hwnd)
-                        logger.debug(f"InvalidateRect result: {invalidate_result}, UpdateWindow result: {update_result}")
-                        
-                        # Send refresh message
-                        WM_COMMAND = 0x0111
-                        command_result = self.user32.SendMessageW(hwnd, WM_COMMAND, 419, 0)
-                        logger.debug(f"WM_COMMAND refresh result: {command_result}")
-                        refresh_count += 1
-                    
-                    logger.info(f"Refreshed {refresh_count} StartAllBack tray windows")
-                else:
-                    # Standard Windows tray refresh
-                    logger.info("Refreshing standard Windows tray areas")
-                    
-                    tray_wnd = self.user32.FindWindowW("Shell_TrayWnd", None)
-                    if tray_wnd:
-                        logger.debug(f"Found Shell_TrayWnd: {tray_wnd}")
-                        
-                        notify_wnd = self.user32.FindWindowExW(tray_wnd, None, "TrayNotifyWnd", None)
-                        if notify_wnd:
-                            logger.debug(f"Found TrayNotifyWnd: {notify_wnd}")
-                            invalidate_result = self.user32.InvalidateRect(notify_wnd, None, True)
-                            update_result = self.user32.UpdateWindow(notify_wnd)
-                            logger.debug(f"TrayNotifyWnd refresh - InvalidateRect: {invalidate_result}, UpdateWindow: {update_result}")
-                        else:
-                            logger.warning("Could not find TrayNotifyWnd")
-                        
-                        # Also try overflow area
-                        overflow_wnd = self.user32.FindWindowExW(None, None, "NotifyIconOverflowWindow", None)
-                        if overflow_wnd:
-                            logger.debug(f"Found NotifyIconOverflowWindow: {overflow_wnd}")
-                            overflow_invalidate = self.user32.InvalidateRect(overflow_wnd, None, True)
-                            overflow_update = self.user32.UpdateWindow(overflow_wnd)
-                            logger.debug(f"Overflow refresh - InvalidateRect: {overflow_invalidate}, UpdateWindow: {overflow_update}")
-                        else:
-                            logger.debug("No NotifyIconOverflowWindow found")
-                    else:
-                        logger.error("Could not find Shell_TrayWnd - Windows tray may not be available")
+                self.refresh_tray_windows()
                 
                 logger.info("======= NOTIFICATION AREA REFRESH COMPLETE: SUCCESS =======")
                 return True
@@ -526,6 +608,48 @@ class TrayIconManager:
             logger.info("======= NOTIFICATION AREA REFRESH COMPLETE: ERROR =======")
             return False
     
+    @traced
+    def refresh_tray_windows(self):
+        """Repaint the tray windows that can show Discord's icon, True if the tray was found"""
+        topology = self.get_topology()
+        if topology is None:
+            return False
+        
+        if topology.startallback:
+            # StartAllBack-specific refresh, its own windows plus the notification areas it hosts
+            hosts = topology.startallback + [hwnd for hwnd in topology.icon_hosts() if hwnd not in topology.overflow]
+            logger.info(f"Refreshing {len(hosts)} StartAllBack tray areas")
+            for hwnd in hosts:
+                logger.debug(f"Refreshing StartAllBack tray window (hwnd={hwnd})")
+                
+                # Refresh StartAllBack tray windows
+                invalidate_result = self.backend.invalidate_rect(hwnd)
+                update_result = self.backend.update_window(hwnd)
+                logger.debug(f"InvalidateRect result: {invalidate_result}, UpdateWindow result: {update_result}")
+                
+                # Send refresh message
+                command_result = self.send_message(hwnd, WM_COMMAND, 419, 0)
+                logger.debug(f"WM_COMMAND refresh result: {command_result}")
+            
+            logger.info(f"Refreshed {len(hosts)} StartAllBack tray windows")
+            return True
+        
+        # Standard Windows tray refresh. Secondary taskbars without a notification area are left alone
+        logger.info("Refreshing standard Windows tray areas")
+        if not topology.notify_area:
+            logger.warning("Could not find TrayNotifyWnd")
+        for hwnd in topology.icon_hosts():
+            if hwnd in topology.overflow and not self.budget.allow(BUDGET_OVERFLOW_REFRESH):
+                break
+            invalidate_result = self.backend.invalidate_rect(hwnd)
+            update_result = self.backend.update_window(hwnd)
+            logger.debug(f"Tray refresh (hwnd={hwnd}) - InvalidateRect: {invalidate_result}, UpdateWindow: {update_result}")
+        return True
+    
+    def forget_window_handles(self, reason="taskbar recreated"):
+        """Drop the cached tray windows after Explorer restarts or the displays change"""
+        self.topology.invalidate(reason)
+    
     def simulate_discord_tray_action(self):
         """Simulate actions that might make Discord appear in tray - DISABLED"""
         # This method is disabled as it causes unwanted window minimization
@@ -538,36 +662,12 @@ def refresh_notification_area():
     manager = TrayIconManager()
     return manager.refresh_notification_area()
 
-def is_discord_running():
+def is_discord_running(backend=None):
     """Check if Discord is running by looking for Discord processes"""
-    import subprocess
     try:
         logger.debug("Checking if Discord is running...")
         
-        # Hide console window for subprocess
-        startupinfo = subprocess.STARTUPINFO()
-        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-        startupinfo.wShowWindow = subprocess.SW_HIDE
-        
-        logger.debug("Running tasklist command to check for Discord processes...")
-        result = subprocess.run(
-            ['tasklist', '/FO', 'CSV'], 
-            capture_output=True, 
-            text=True, 
-            check=True,
-            startupinfo=startupinfo,
-            creationflags=subprocess.CREATE_NO_WINDOW
-        )
-        
-        logger.debug(f"Tasklist command completed, output length: {len(result.stdout)} chars")
-        
-        discord_processes = ['Discord.exe', 'DiscordPTB.exe', 'DiscordCanary.exe']
-        found_processes = []
-        
-        for process_name in discord_processes:
-            if process_name.lower() in result.stdout.lower():
-                logger.info(f"Found running Discord process: {process_name}")
-                found_processes.append(process_name)
+        found_processes = find_discord_processes(backend or Win32Backend())
         
         if found_processes:
             logger.info(f"Discord is running - found processes: {', '.join(found_processes)}")
@@ -583,32 +683,12 @@ def is_discord_running():
         logger.error(f"Unexpected error checking Discord processes: {e}")
         return False
 
-def get_discord_processes():
+def get_discord_processes(backend=None):
     """Get list of running Discord processes"""
-    import subprocess
-    processes = []
     try:
         logger.debug("Getting detailed list of Discord processes...")
         
-        # Hide console window for subprocess
-        startupinfo = subprocess.STARTUPINFO()
-        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-        startupinfo.wShowWindow = subprocess.SW_HIDE
-        
-        result = subprocess.run(
-            ['tasklist', '/FO', 'CSV'], 
-            capture_output=True, 
-            text=True, 
-            check=True,
-            startupinfo=startupinfo,
-            creationflags=subprocess.CREATE_NO_WINDOW
-        )
-        
-        discord_processes = ['Discord.exe', 'DiscordPTB.exe', 'DiscordCanary.exe']
-        for process_name in discord_processes:
-            if process_name.lower() in result.stdout.lower():
-                processes.append(process_name)
-                logger.debug(f"Added Discord process to list: {process_name}")
+        processes = find_discord_processes(backend or Win32Backend())
         
         logger.info(f"Found {len(processes)} Discord processes: {', '.join(processes) if processes else 'none'}")
         return processes
@@ -618,4 +698,4 @@ def get_discord_processes():
         return []
     except Exception as e:
         logger.error(f"Unexpected error getting Discord processes: {e}")
-        return [] 
\ No newline at end of file
+        return []
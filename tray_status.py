@@ -0,0 +1,91 @@
+"""
+Tray Status - Keeps the tray icon and menu text in sync with the monitor state
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Monitor states shown in the tray
+STATUS_STARTING = 'starting'
+STATUS_OK = 'ok'
+STATUS_FIXING = 'fixing'
+STATUS_NOT_RUNNING = 'not_running'
+STATUS_DEGRADED = 'degraded'
+# Icon hidden with auto-fix off, nothing is wrong with the monitor itself
+STATUS_MONITOR_ONLY = 'monitor_only'
+
+STATUS_TEXT = {
+    STATUS_STARTING: 'Starting...',
+    STATUS_OK: 'Discord icon OK',
+    STATUS_FIXING: 'Fixing Discord icon...',
+    STATUS_NOT_RUNNING: 'Discord not running',
+    STATUS_DEGRADED: 'Fix failing, retrying',
+    STATUS_MONITOR_ONLY: 'Icon hidden (auto-fix off)',
+}
+
+# Same states for the extra apps in the `targets` config
+TARGET_STATUS_TEXT = {
+    STATUS_STARTING: 'starting',
+    STATUS_OK: 'icon OK',
+    STATUS_FIXING: 'fixing icon',
+    STATUS_NOT_RUNNING: 'not running',
+    STATUS_DEGRADED: 'fix failing, retrying',
+    STATUS_MONITOR_ONLY: 'icon hidden (auto-fix off)',
+}
+
+# Icon fill colour for each state
+STATUS_COLORS = {
+    STATUS_STARTING: (88, 101, 242, 255),    # Discord blurple
+    STATUS_OK: (88, 101, 242, 255),
+    STATUS_FIXING: (250, 166, 26, 255),      # Amber
+    STATUS_NOT_RUNNING: (116, 127, 141, 255), # Grey
+    STATUS_DEGRADED: (237, 66, 69, 255),     # Red
+    STATUS_MONITOR_ONLY: (254, 231, 92, 255), # Yellow
+}
+
+class TrayStatusPresenter:
+    """Pushes monitor state changes to a tray icon backend.
+
+    The backend is anything with an ``icon`` attribute and an ``update_menu()``
+    method (a ``pystray.Icon`` in the GUI). Images are pre-rendered once and
+    handed in, one per colour and shared by the states that use it, so the
+    monitor thread never draws, and only swaps the icon or rebuilds the menu
+    when the state actually changed.
+    """
+
+    def __init__(self, backend, images, status=STATUS_STARTING):
+        self.backend = backend
+        self.images = images
+        self.status = status
+        self.icon_updates = 0
+        self.menu_updates = 0
+        self._lock = threading.Lock()
+
+    def menu_text(self, item=None):
+        """Menu text callback for the status entry"""
+        return f"Status: {self.status_text()}"
+
+    def status_text(self):
+        """Human readable text for the current state"""
+        return STATUS_TEXT.get(self.status, 'Unknown')
+
+    def set_status(self, status):
+        """Apply a new monitor state, returns True if anything was pushed"""
+        with self._lock:
+            if status == self.status:
+                return False
+            previous = self.status
+            self.status = status
+
+            image = self.images.get(status)
+            if image is not None and image is not self.images.get(previous):
+                self.backend.icon = image
+                self.icon_updates += 1
+
+            self.backend.update_menu()
+            self.menu_updates += 1
+
+        logger.debug(f"Tray status changed: {previous} -> {status}")
+        return True
@@ -0,0 +1,138 @@
+"""
+Tray Topology - The windows that can show tray icons, found once and reused until the taskbar changes
+
+A desktop has one primary taskbar (Shell_TrayWnd) with its notification area
+(TrayNotifyWnd), a Shell_SecondaryTrayWnd per extra monitor, the overflow
+flyout and, with StartAllBack, StartAllBack's own tray windows. TrayTopology
+records those handles; TopologyCache keeps it while every handle still passes
+IsWindow and drops it when the taskbar is recreated or the displays change,
+so fixes stop looking the tray up again every time.
+"""
+
+import logging
+
+from cycle_metrics import NULL_METRICS
+from state_cache import TRAY_STOCK, TRAY_STARTALLBACK
+
+logger = logging.getLogger(__name__)
+
+PRIMARY_TRAY_CLASS = "Shell_TrayWnd"
+SECONDARY_TRAY_CLASS = "Shell_SecondaryTrayWnd"
+NOTIFY_AREA_CLASS = "TrayNotifyWnd"
+# The Windows 10 overflow flyout and its Windows 11 replacement
+OVERFLOW_CLASSES = ("NotifyIconOverflowWindow", "TopLevelWindowForOverflowXamlIsland")
+STARTALLBACK_CLASS_MATCH = 'startallback'
+
+# Guards the secondary taskbar walk against a backend that keeps returning windows
+MAX_SECONDARY_TRAYS = 16
+
+class TrayTopology:
+    """Handles of every taskbar, notification area and overflow window on the desktop"""
+
+    def __init__(self, primary=0, notify_area=0, secondary=(), secondary_notify_areas=(), overflow=(),
+                 startallback=()):
+        self.primary = primary
+        self.notify_area = notify_area
+        self.secondary = list(secondary)
+        # Stock secondary taskbars have no notification area, StartAllBack can add one
+        self.secondary_notify_areas = list(secondary_notify_areas)
+        self.overflow = list(overflow)
+        self.startallback = list(startallback)
+
+    @property
+    def variant(self):
+        return TRAY_STARTALLBACK if self.startallback else TRAY_STOCK
+
+    def handles(self):
+        """Every window this topology depends on"""
+        handles = [self.primary, self.notify_area] if self.notify_area else [self.primary]
+        return handles + self.secondary + self.secondary_notify_areas + self.overflow + self.startallback
+
+    def icon_hosts(self):
+        """Windows that can show Discord's icon: notification areas first, then the overflow"""
+        hosts = [self.notify_area] if self.notify_area else []
+        return hosts + self.secondary_notify_areas + self.overflow
+
+    def valid(self, backend):
+        return all(backend.is_window(hwnd) for hwnd in self.handles())
+
+    def describe(self):
+        parts = [f"primary tray {self.primary}"]
+        if self.secondary:
+            parts.append(f"{len(self.secondary)} secondary ({len(self.secondary_notify_areas)} with icons)")
+        if self.overflow:
+            parts.append("overflow")
+        if self.startallback:
+            parts.append(f"{len(self.startallback)} StartAllBack")
+        return ", ".join(parts)
+
+def discover_topology(backend, windows=None):
+    """Look the tray windows up, or return None if there is no taskbar.
+
+    `windows` is a top-level window list to find StartAllBack's windows in;
+    without it StartAllBack is not looked for and the topology is partial.
+    """
+    primary = backend.find_window(PRIMARY_TRAY_CLASS)
+    if not primary:
+        return None
+    notify_area = backend.find_window_ex(primary, None, NOTIFY_AREA_CLASS)
+
+    secondary = []
+    secondary_notify_areas = []
+    hwnd = backend.find_window_ex(None, None, SECONDARY_TRAY_CLASS)
+    while hwnd and len(secondary) < MAX_SECONDARY_TRAYS:
+        secondary.append(hwnd)
+        secondary_notify = backend.find_window_ex(hwnd, None, NOTIFY_AREA_CLASS)
+        if secondary_notify:
+            secondary_notify_areas.append(secondary_notify)
+        hwnd = backend.find_window_ex(None, hwnd, SECONDARY_TRAY_CLASS)
+
+    overflow = [hwnd for hwnd in (backend.find_window_ex(None, None, class_name) for class_name in OVERFLOW_CLASSES)
+                if hwnd]
+
+    startallback = []
+    for hwnd, class_name, title in windows or ():
+        if STARTALLBACK_CLASS_MATCH in class_name.lower():
+            logger.debug(f"Found StartAllBack window: hwnd={hwnd}, class='{class_name}', title='{title}'")
+            startallback.append(hwnd)
+
+    return TrayTopology(primary, notify_area, secondary, secondary_notify_areas, overflow, startallback)
+
+class TopologyCache:
+    """Last complete topology, rebuilt only once a handle has gone or it was invalidated.
+
+    Shared by every TrayIconManager of a monitor; invalidate() may be called
+    from the shell event thread.
+    """
+
+    def __init__(self, metrics=NULL_METRICS):
+        self.metrics = metrics
+        self.topology = None
+
+    def current(self, backend):
+        """The cached topology if all its windows still exist, otherwise None"""
+        topology = self.topology
+        if topology is None:
+            return None
+        if not topology.valid(backend):
+            logger.info("A tray window has gone, looking the tray up again")
+            self.topology = None
+            return None
+        return topology
+
+    def rebuild(self, backend, windows=None):
+        """Discover the topology, caching it only when complete"""
+        topology = discover_topology(backend, windows)
+        self.metrics.increment('topology_rebuilds')
+        if topology is None:
+            logger.error(f"Could not find {PRIMARY_TRAY_CLASS} - Windows tray may not be available")
+            return None
+        if windows is not None:
+            self.topology = topology
+            logger.info(f"Tray topology: {topology.describe()}")
+        return topology
+
+    def invalidate(self, reason):
+        if self.topology is not None:
+            logger.debug(f"Forgetting tray topology: {reason}")
+        self.topology = None
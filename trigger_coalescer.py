@@ -0,0 +1,87 @@
+"""
+Trigger Coalescer - Folds bursts of check triggers into a single check
+
+Taskbar restarts, display changes, Discord starting or exiting, unlocks and
+control commands tend to arrive together. Each trigger is recorded here
+instead of starting a check; once no new trigger has arrived for `window`
+seconds (or `max_delay` after the first, so a steady stream cannot postpone
+the check forever) the burst is released as one TriggerBatch with its merged
+reasons. The clock is injectable so bursts can be replayed without sleeping.
+"""
+
+import time
+import logging
+import threading
+from collections import namedtuple
+
+from cycle_metrics import NULL_METRICS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 0.5
+# Longest a burst can hold its check back, in windows
+MAX_DELAY_WINDOWS = 4
+
+# One released burst: {reason: times triggered} in arrival order, trigger count, seconds since the first
+TriggerBatch = namedtuple('TriggerBatch', ['reasons', 'count', 'waited'])
+
+def describe_batch(batch):
+    """'taskbar recreated x2, Discord.exe started' for the log"""
+    return ", ".join(reason if times == 1 else f"{reason} x{times}" for reason, times in batch.reasons.items())
+
+class TriggerCoalescer:
+    """Pending triggers of the next check, released once the burst has gone quiet"""
+
+    def __init__(self, window=DEFAULT_WINDOW, max_delay=None, metrics=NULL_METRICS, clock=time.monotonic):
+        self.window = window
+        self.max_delay = window * MAX_DELAY_WINDOWS if max_delay is None else max_delay
+        self.metrics = metrics
+        self.clock = clock
+        self.reasons = {}
+        self.count = 0
+        self.first = None
+        self.last = None
+        self.batches = 0
+        self.absorbed = 0
+        self.largest = 0
+        self._lock = threading.Lock()
+
+    def trigger(self, reason):
+        """Record a trigger, called from any thread"""
+        now = self.clock()
+        with self._lock:
+            self.reasons[reason] = self.reasons.get(reason, 0) + 1
+            self.count += 1
+            if self.first is None:
+                self.first = now
+            self.last = now
+
+    def due_in(self):
+        """Seconds until the pending burst is released, 0 if it is due, None if nothing is pending"""
+        with self._lock:
+            if not self.count:
+                return None
+            now = self.clock()
+            due = min(self.last + self.window, self.first + self.max_delay)
+            return max(0.0, due - now)
+
+    def take(self):
+        """Release the pending burst as a TriggerBatch, or None if nothing is pending"""
+        with self._lock:
+            if not self.count:
+                return None
+            batch = TriggerBatch(self.reasons, self.count, self.clock() - self.first)
+            self.reasons = {}
+            self.count = 0
+            self.first = self.last = None
+            self.batches += 1
+            self.absorbed += batch.count - 1
+            self.largest = max(self.largest, batch.count)
+        self.metrics.increment('triggered_checks')
+        self.metrics.increment('coalesced_triggers', batch.count - 1)
+        self.metrics.observe('trigger_delay', batch.waited)
+        return batch
+
+    def take_due(self):
+        """take() if the pending burst is due, otherwise None"""
+        return self.take() if self.due_in() == 0 else None